@@ -0,0 +1,333 @@
+"""
+Ratings activity over time.
+UserGamePlatform only holds each user's current rating, so rating writes also
+append a RatingEvent row (user, game, platform, new rating or NULL for a
+delete, UTC time) in the same transaction. A background job folds settled
+events into hourly and daily buckets per dimension (all ratings, game,
+platform, genre); each bucket keeps counts and the rating sum, so any range
+of buckets merges into a volume and an average. Hourly buckets are kept for
+RATING_HOURLY_RETENTION_DAYS, daily ones for RATING_DAILY_RETENTION_DAYS,
+raw events for RATING_EVENT_RETENTION_DAYS: older history survives only at
+daily resolution. Range queries read one primary-key range of a rollup table,
+so their cost follows the number of buckets, not the number of ratings.
+"""
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from app.cache import query_cache
+from app.changes import change_feed, record_changes, table_changes
+from app.config import settings
+from app.database import execute_query, get_db_cursor
+from app.deadlines import without_deadline
+RATING_ACTIVITY_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS RatingEvent (
+        EventID BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        User_Email_Address VARCHAR(255) NOT NULL,
+        GameID INT NOT NULL,
+        PlatformName VARCHAR(255) NOT NULL,
+        Rating DECIMAL(3,1) NULL,
+        Operation CHAR(1) NOT NULL,
+        OccurredAt DATETIME(6) NOT NULL,
+        KEY idx_ratingevent_occurred_at (OccurredAt)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS RatingActivityHourly (
+        Dimension VARCHAR(16) NOT NULL,
+        DimensionKey VARCHAR(255) NOT NULL,
+        BucketStart DATETIME NOT NULL,
+        Ratings INT NOT NULL DEFAULT 0,
+        NewRatings INT NOT NULL DEFAULT 0,
+        Removed INT NOT NULL DEFAULT 0,
+        RatingSum DECIMAL(14,1) NOT NULL DEFAULT 0,
+        PRIMARY KEY (Dimension, DimensionKey, BucketStart),
+        KEY idx_ratingactivityhourly_bucket (BucketStart)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS RatingActivityDaily (
+        Dimension VARCHAR(16) NOT NULL,
+        DimensionKey VARCHAR(255) NOT NULL,
+        BucketStart DATETIME NOT NULL,
+        Ratings INT NOT NULL DEFAULT 0,
+        NewRatings INT NOT NULL DEFAULT 0,
+        Removed INT NOT NULL DEFAULT 0,
+        RatingSum DECIMAL(14,1) NOT NULL DEFAULT 0,
+        PRIMARY KEY (Dimension, DimensionKey, BucketStart),
+        KEY idx_ratingactivitydaily_bucket (BucketStart)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS RatingRollupState (
+        Name VARCHAR(64) NOT NULL PRIMARY KEY,
+        LastEventID BIGINT NOT NULL,
+        UpdatedAt DATETIME(6) NULL
+    )
+    """,
+    "INSERT IGNORE INTO RatingRollupState (Name, LastEventID) VALUES ('rating_activity', 0)"
+)
+#Written after the rating statement in the same transaction; ROW_COUNT() skips deletes of
+#missing rows and updates that left the rating unchanged.
+RATING_EVENT_INSERT = """
+    INSERT INTO RatingEvent (User_Email_Address, GameID, PlatformName, Rating, Operation, OccurredAt)
+    SELECT %s, %s, %s, %s, %s, UTC_TIMESTAMP(6) FROM DUAL WHERE ROW_COUNT() > 0
+"""
+#Dimension -> (key expression, join), over RatingEvent e.
+DIMENSIONS = {
+    "all": ("''", ""),
+    "game": ("CAST(e.GameID AS CHAR)", ""),
+    "platform": ("e.PlatformName", ""),
+    "genre": ("ga.AttributeName", "JOIN GameAttributes ga ON ga.GameID = e.GameID AND ga.AttributeType = 'Genre'")
+}
+#Granularity -> (rollup table, bucket start expression, bucket width).
+GRANULARITIES = {
+    "hour": ("RatingActivityHourly", "TIMESTAMP(DATE(e.OccurredAt), MAKETIME(HOUR(e.OccurredAt), 0, 0))", timedelta(hours=1)),
+    "day": ("RatingActivityDaily", "TIMESTAMP(DATE(e.OccurredAt))", timedelta(days=1))
+}
+ROLLUP_TABLES = ("ratingactivityhourly", "ratingactivitydaily")
+#Ranges up to this long default to hourly buckets (granularity=auto).
+_HOURLY_SPAN = timedelta(days=2)
+_ROLLUP_BATCH = 10000
+_PRUNE_INTERVAL = 3600
+_ready = False
+_ready_lock = threading.Lock()
+def ensure_rating_activity():
+    """Create the RatingEvent and rollup tables if needed (once per process)."""
+    global _ready
+    if _ready or not settings.RATING_ACTIVITY_ENABLED:
+        return
+    with _ready_lock:
+        if not _ready:
+            with get_db_cursor(commit=True) as cursor:
+                for statement in RATING_ACTIVITY_DDL:
+                    cursor.execute(statement)
+            _ready = True
+def rating_events(user_email, game_id, platform_name, rating, operation):
+    """The RatingEvent insert for a rating write, to pass as execute_query(statements=...)."""
+    if not settings.RATING_ACTIVITY_ENABLED:
+        return []
+    ensure_rating_activity()
+    return [(RATING_EVENT_INSERT, (user_email, game_id, platform_name, rating, operation))]
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+def _utc(value):
+    """Naive UTC datetime (buckets and events are stored in UTC)."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+def _floor(value, granularity):
+    value = value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0) if granularity == "day" else value
+class RatingActivity:
+    """
+    Rolls RatingEvent rows up into time buckets and answers range queries
+    from the buckets. Every worker runs the job; the rollup position lives in
+    RatingRollupState and is locked for the duration of a rollup, so each
+    event is folded in exactly once.
+    """
+    def __init__(self, rollup_seconds, settle_seconds, event_retention_days, hourly_retention_days, daily_retention_days, max_buckets):
+        self.rollup_seconds = rollup_seconds
+        self.settle_seconds = settle_seconds
+        self.event_retention_days = event_retention_days
+        self.hourly_retention_days = hourly_retention_days
+        self.daily_retention_days = daily_retention_days
+        self.max_buckets = max_buckets
+        self._thread = None
+        self._pruned_at = 0
+        self.position = None
+        self.rollups = 0
+        self.events_rolled_up = 0
+        self.pruned = 0
+        self.last_rollup_at = None
+        self.rollup_seconds_taken = None
+        self.last_error = None
+    def start(self):
+        if settings.RATING_ACTIVITY_ENABLED and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="rating-activity", daemon=True)
+            self._thread.start()
+    def _run(self):
+        while True:
+            try:
+                while self.rollup() >= _ROLLUP_BATCH:
+                    pass
+                if time.time() - self._pruned_at > _PRUNE_INTERVAL:
+                    self.prune()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Rating activity rollup failed: {str(e)}")
+            time.sleep(self.rollup_seconds)
+    def rollup(self):
+        """
+        Fold the next batch of settled events into the hourly and daily buckets.
+        Events younger than RATING_ROLLUP_SETTLE_SECONDS wait for the next run, so
+        a transaction holding a lower EventID has committed before its range is read.
+        Returns the number of events folded in.
+        """
+        ensure_rating_activity()
+        started = time.monotonic()
+        with without_deadline():
+            with get_db_cursor(commit=True) as cursor:
+                cursor.execute("SELECT LastEventID FROM RatingRollupState WHERE Name = 'rating_activity' FOR UPDATE")
+                last = cursor.fetchone()["LastEventID"]
+                cursor.execute(
+                    """
+                    SELECT COUNT(*) AS Events, MAX(EventID) AS LastEventID
+                    FROM (
+                        SELECT EventID FROM RatingEvent
+                        WHERE EventID > %s AND OccurredAt < UTC_TIMESTAMP(6) - INTERVAL %s SECOND
+                        ORDER BY EventID
+                        LIMIT %s
+                    ) e
+                    """,
+                    (last, self.settle_seconds, _ROLLUP_BATCH)
+                )
+                batch = cursor.fetchone()
+                self.position = last
+                if not batch["Events"]:
+                    self.last_rollup_at = time.time()
+                    return 0
+                for table, bucket, _ in GRANULARITIES.values():
+                    for dimension, (key, join) in DIMENSIONS.items():
+                        cursor.execute(
+                            f"""
+                            INSERT INTO {table} (Dimension, DimensionKey, BucketStart, Ratings, NewRatings, Removed, RatingSum)
+                            SELECT %s, {key} AS RollupKey, {bucket} AS RollupBucket,
+                                SUM(e.Operation <> 'D'), SUM(e.Operation = 'I'), SUM(e.Operation = 'D'), COALESCE(SUM(e.Rating), 0)
+                            FROM RatingEvent e
+                            {join}
+                            WHERE e.EventID > %s AND e.EventID <= %s
+                            GROUP BY RollupKey, RollupBucket
+                            ON DUPLICATE KEY UPDATE
+                                {table}.Ratings = {table}.Ratings + VALUES(Ratings),
+                                {table}.NewRatings = {table}.NewRatings + VALUES(NewRatings),
+                                {table}.Removed = {table}.Removed + VALUES(Removed),
+                                {table}.RatingSum = {table}.RatingSum + VALUES(RatingSum)
+                            """,
+                            (dimension, last, batch["LastEventID"])
+                        )
+                cursor.execute(
+                    "UPDATE RatingRollupState SET LastEventID = %s, UpdatedAt = UTC_TIMESTAMP(6) WHERE Name = 'rating_activity'",
+                    (batch["LastEventID"],)
+                )
+                changes = table_changes(ROLLUP_TABLES)
+                record_changes(cursor, changes)
+        query_cache.invalidate(ROLLUP_TABLES)
+        change_feed.wrote(changes)
+        self.position = batch["LastEventID"]
+        self.rollups += 1
+        self.events_rolled_up += batch["Events"]
+        self.last_rollup_at = time.time()
+        self.rollup_seconds_taken = round(time.monotonic() - started, 3)
+        return batch["Events"]
+    def prune(self):
+        """Drop raw events and buckets past their retention, in bounded batches."""
+        self._pruned_at = time.time()
+        statements = (
+            ("DELETE FROM RatingEvent WHERE OccurredAt < UTC_TIMESTAMP() - INTERVAL %s DAY AND EventID <= %s LIMIT 10000", (self.event_retention_days, self.position or 0)),
+            ("DELETE FROM RatingActivityHourly WHERE BucketStart < UTC_TIMESTAMP() - INTERVAL %s DAY LIMIT 10000", (self.hourly_retention_days,)),
+            ("DELETE FROM RatingActivityDaily WHERE BucketStart < UTC_TIMESTAMP() - INTERVAL %s DAY LIMIT 10000", (self.daily_retention_days,))
+        )
+        for query, params in statements:
+            while True:
+                with without_deadline():
+                    with get_db_cursor(commit=True) as cursor:
+                        deleted = cursor.execute(query, params)
+                self.pruned += deleted
+                if deleted < 10000:
+                    break
+    def series(self, dimension, key=None, granularity="auto", start=None, end=None):
+        """
+        Dense bucket series of one dimension key over [start, end) in UTC.
+        Raises ValueError for an unknown dimension, a missing key, a range
+        wider than RATING_ACTIVITY_MAX_BUCKETS or hourly buckets past retention.
+        """
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension: {dimension}. Allowed: {', '.join(DIMENSIONS)}")
+        if dimension == "all":
+            key = ""
+        elif not key:
+            raise ValueError(f"key is required for dimension={dimension}")
+        now = _utcnow()
+        end = _utc(end) if end else now
+        if granularity == "auto":
+            if start is None or (end - _utc(start) <= _HOURLY_SPAN and _utc(start) >= now - timedelta(days=self.hourly_retention_days)):
+                granularity = "hour"
+            else:
+                granularity = "day"
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity: {granularity}. Allowed: auto, {', '.join(GRANULARITIES)}")
+        table, _, width = GRANULARITIES[granularity]
+        if start is None:
+            start = end - (24 if granularity == "hour" else 30) * width
+        start = _utc(start)
+        if end <= start:
+            raise ValueError("end must be after start")
+        first = _floor(start, granularity)
+        count = math.ceil((end - first) / width)
+        if count > self.max_buckets:
+            raise ValueError(f"The range spans {count} {granularity} buckets; at most {self.max_buckets} are allowed")
+        if granularity == "hour" and first < _floor(now - timedelta(days=self.hourly_retention_days), "hour"):
+            raise ValueError(f"Hourly buckets are kept for {self.hourly_retention_days} days; use granularity=day")
+        ensure_rating_activity()
+        rows = execute_query(
+            f"""
+            SELECT BucketStart, Ratings, NewRatings, Removed, RatingSum
+            FROM {table}
+            WHERE Dimension = %s AND DimensionKey = %s AND BucketStart >= %s AND BucketStart < %s
+            ORDER BY BucketStart
+            """,
+            (dimension, str(key), first, end)
+        )
+        by_start = {row["BucketStart"]: row for row in rows}
+        buckets = []
+        totals = {"ratings": 0, "new_ratings": 0, "removed": 0, "rating_sum": 0.0}
+        for i in range(count):
+            bucket_start = first + i * width
+            row = by_start.get(bucket_start)
+            ratings = row["Ratings"] if row else 0
+            rating_sum = float(row["RatingSum"]) if row else 0.0
+            buckets.append({
+                "bucket_start": bucket_start,
+                "ratings": ratings,
+                "new_ratings": row["NewRatings"] if row else 0,
+                "removed": row["Removed"] if row else 0,
+                "average_rating": round(rating_sum / ratings, 3) if ratings else None
+            })
+            totals["ratings"] += ratings
+            totals["new_ratings"] += buckets[-1]["new_ratings"]
+            totals["removed"] += buckets[-1]["removed"]
+            totals["rating_sum"] += rating_sum
+        rating_sum = totals.pop("rating_sum")
+        totals["average_rating"] = round(rating_sum / totals["ratings"], 3) if totals["ratings"] else None
+        return {
+            "dimension": dimension,
+            "key": key if dimension != "all" else None,
+            "granularity": granularity,
+            "start": first,
+            "end": end,
+            "buckets": buckets,
+            "totals": totals
+        }
+    def stats(self):
+        return {
+            "enabled": settings.RATING_ACTIVITY_ENABLED,
+            "running": self._thread is not None,
+            "position": self.position,
+            "rollups": self.rollups,
+            "events_rolled_up": self.events_rolled_up,
+            "pruned": self.pruned,
+            "last_rollup_at": self.last_rollup_at,
+            "rollup_seconds": self.rollup_seconds_taken,
+            "last_error": self.last_error
+        }
+rating_activity = RatingActivity(
+    settings.RATING_ROLLUP_SECONDS,
+    settings.RATING_ROLLUP_SETTLE_SECONDS,
+    settings.RATING_EVENT_RETENTION_DAYS,
+    settings.RATING_HOURLY_RETENTION_DAYS,
+    settings.RATING_DAILY_RETENTION_DAYS,
+    settings.RATING_ACTIVITY_MAX_BUCKETS
+)
\ No newline at end of file
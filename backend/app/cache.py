@@ -0,0 +1,158 @@
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from app.changes import change_feed
+from app.config import settings
+_READ_TABLES = re.compile(r"\b(?:FROM|JOIN)\s+`?(\w+)`?", re.IGNORECASE)
+_WRITE_TABLES = re.compile(
+    r"^\s*(?:INSERT\s+(?:IGNORE\s+)?INTO|REPLACE\s+INTO|UPDATE|DELETE\s+FROM|LOAD\s+DATA\s+.*?\bINTO\s+TABLE)\s+`?(\w+)`?",
+    re.IGNORECASE | re.DOTALL
+)
+def read_tables(query):
+    """Tables a statement reads, lower-cased (e.g. {'game', 'release'})."""
+    return frozenset(name.lower() for name in _READ_TABLES.findall(query))
+def write_tables(query):
+    """Tables a statement writes to, lower-cased."""
+    return frozenset(name.lower() for name in _WRITE_TABLES.findall(query))
+def _estimate_size(value):
+    """Rough recursive byte size of a query result."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for item in value.values():
+            size += _estimate_size(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += _estimate_size(item)
+    return size
+def make_key(query, params, fetch_one):
+    """Cache key for a (query, params) pair, or None if params are unhashable."""
+    if isinstance(params, dict):
+        params = tuple(sorted(params.items()))
+    elif isinstance(params, list):
+        params = tuple(params)
+    key = (" ".join(query.split()), params or (), fetch_one)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+class QueryCache:
+    """
+    Byte-bounded LRU cache of read query results keyed on SQL text and params.
+    Every entry remembers the tables its statement reads; a committed write to
+    one of them drops the entry. Each table also carries a generation counter so
+    a read that raced with a write is not stored with stale rows.
+    Cached results are shared between callers and must not be mutated.
+    """
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._by_table = {}
+        self._generations = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+    def get(self, key):
+        """Return (hit, result) for a key."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            if entry[3] < time.monotonic():
+                self._drop(key)
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+    def generations(self, tables):
+        with self._lock:
+            return tuple(self._generations.get(table, 0) for table in tables)
+    def put(self, key, result, tables, generations):
+        """
+        Store a result read while the tables were at the given generations.
+        Skipped if any of those tables has been written to since.
+        """
+        size = _estimate_size(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generations != tuple(self._generations.get(table, 0) for table in tables):
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (result, size, tables, time.monotonic() + self.ttl)
+            self._bytes += size
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while self._bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+    def invalidate(self, tables):
+        """Drop every entry that reads any of the given tables."""
+        with self._lock:
+            for table in tables:
+                table = table.lower()
+                self._generations[table] = self._generations.get(table, 0) + 1
+                for key in self._by_table.pop(table, ()):
+                    if key in self._entries:
+                        self._drop(key)
+                        self.invalidations += 1
+    def apply_changes(self, changes):
+        """Change feed subscriber: drop entries reading the tables other processes wrote."""
+        self.invalidate({change.table for change in changes})
+    def clear(self):
+        with self._lock:
+            for table in list(self._by_table):
+                self._generations[table] = self._generations.get(table, 0) + 1
+            self._entries.clear()
+            self._by_table.clear()
+            self._bytes = 0
+    def _drop(self, key):
+        result, size, tables, expires_at = self._entries.pop(key)
+        self._bytes -= size
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+query_cache = QueryCache(settings.QUERY_CACHE_MAX_BYTES, settings.QUERY_CACHE_TTL)
+def invalidate_tables(*tables):
+    """Invalidate cached results for tables changed outside execute_query (e.g. imports)."""
+    query_cache.invalidate(tables)
+def dataset_version(tables):
+    """
+    Version of the data behind the given tables, the same in every worker: the
+    last ChangeID logged for each of them, as read by the change feed, plus a
+    QUERY_CACHE_TTL epoch. The epoch stays on the configured TTL even when the
+    change feed lengthens the cache TTL, so writes that bypass the ChangeLog
+    still reach clients within QUERY_CACHE_TTL.
+    None while the change feed cannot vouch for the tables (not running, or
+    still waiting to read a change back).
+    """
+    versions = change_feed.versions(tables)
+    if versions is None:
+        return None
+    return versions, int(time.time() // settings.QUERY_CACHE_TTL)
\ No newline at end of file
@@ -0,0 +1,483 @@
+"""
+Compact columnar catalogue and its snapshot file.
+The game documents are stored struct-of-arrays instead of one dict per row:
+    - games sorted by GameID, one array per column (int32 counts, float32
+      scores with NaN / INT_MIN for NULL),
+    - text columns packed into one UTF-8 blob plus an offsets array,
+    - genre, setting, platform and company names stored once and referred to by code,
+    - one row bitmap per genre / setting / platform / release year for filters,
+    - postings (company -> rows, row -> names, row -> releases) in CSR form:
+      an offsets array into one flat values array,
+    - pre-aggregated analytics (the developer ranking per genre).
+Every section is a flat buffer of fixed-width values, so the whole catalogue
+is written to a snapshot file and memory-mapped by every worker process,
+which then share one copy through the page cache.
+Snapshot layout: MAGIC, a 4-byte header length, a JSON header (format
+version, meta, and the type, offset, size and CRC32 of every section), then
+the sections, each aligned to 8 bytes. map() rejects files of another
+version or whose checksums do not match.
+"""
+import array
+import bisect
+import json
+import math
+import mmap
+import os
+import sys
+import tempfile
+import zlib
+GAME_COLUMNS = (
+    "GameID",
+    "Title",
+    "Description",
+    "CoverPhoto",
+    "overallCriticsCount",
+    "overallCriticsScore",
+    "overallPlayersCount",
+    "overallPlayersScore",
+    "overallMobyScore"
+)
+TEXT_COLUMNS = ("Title", "Description", "CoverPhoto")
+COUNT_COLUMNS = ("overallCriticsCount", "overallPlayersCount")
+SCORE_COLUMNS = ("overallCriticsScore", "overallPlayersScore", "overallMobyScore")
+NULL_INT = -2 ** 31
+NO_CODE = -1
+NO_YEAR = 0
+#Longest developer ranking kept per genre (the top-developers limit).
+RANKING_SIZE = 20
+MAGIC = b"FGCATLG\x00"
+FORMAT_VERSION = 2
+_ALIGN = 8
+class StringColumn:
+    """Strings packed into one UTF-8 blob: value i is blob[offsets[i]:offsets[i + 1]]."""
+    def __init__(self, offsets, blob, nulls, haystack=None, base=0):
+        self.offsets = offsets
+        self.blob = blob
+        self.nulls = nulls
+        #Object with a C-level find() over the blob: the bytes themselves or the mmap holding them.
+        self._haystack = blob if haystack is None else haystack
+        self._base = base
+    @classmethod
+    def build(cls, values):
+        offsets = array.array("I", [0])
+        nulls = bytearray()
+        parts = []
+        position = 0
+        for value in values:
+            nulls.append(value is None)
+            if value is not None:
+                data = value.encode("utf-8")
+                parts.append(data)
+                position += len(data)
+            offsets.append(position)
+        return cls(offsets, b"".join(parts), bytes(nulls))
+    def __len__(self):
+        return len(self.nulls)
+    def __getitem__(self, i):
+        if self.nulls[i]:
+            return None
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+    def find_rows(self, needle):
+        """Rows whose value contains the given bytes, in row order."""
+        rows = []
+        start = 0
+        end = self.offsets[len(self)]
+        while True:
+            position = self._haystack.find(needle, self._base + start, self._base + end)
+            if position < 0:
+                return rows
+            position -= self._base
+            row = bisect.bisect_right(self.offsets, position) - 1
+            if position + len(needle) <= self.offsets[row + 1]:
+                rows.append(row)
+                start = self.offsets[row + 1]
+            else:
+                start = position + 1 #The match straddles two values.
+class Postings:
+    """CSR lists: entry k is values[offsets[k]:offsets[k + 1]]."""
+    def __init__(self, offsets, values):
+        self.offsets = offsets
+        self.values = values
+    @classmethod
+    def build(cls, lists, typecode="i"):
+        offsets = array.array("I", [0])
+        values = array.array(typecode)
+        for items in lists:
+            values.extend(items)
+            offsets.append(len(values))
+        return cls(offsets, values)
+    def __len__(self):
+        return len(self.offsets) - 1
+    def __getitem__(self, k):
+        return self.values[self.offsets[k]:self.offsets[k + 1]]
+#Set bit positions of every byte value.
+_BITS = tuple(tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256))
+def bitmap_rows(mask, width):
+    """Rows whose bit is set in an int bitmap, in row order."""
+    rows = []
+    for i, value in enumerate(mask.to_bytes(width, "little")):
+        if value:
+            rows.extend(i * 8 + bit for bit in _BITS[value])
+    return rows
+class Bitmaps:
+    """One row bitmap per term, width bytes each, packed back to back."""
+    def __init__(self, blob, rows):
+        self.blob = blob
+        self.rows = rows
+        self.width = (rows + 7) // 8
+    @staticmethod
+    def build(count, rows, row_codes):
+        width = (rows + 7) // 8
+        blob = bytearray(count * width)
+        for row, codes in enumerate(row_codes):
+            for code in codes:
+                blob[code * width + row // 8] |= 1 << (row % 8)
+        return bytes(blob)
+    def __getitem__(self, code):
+        """Bitmap of one term as an int (bit i set = row i in it)."""
+        return int.from_bytes(self.blob[code * self.width:(code + 1) * self.width], "little")
+    def any_of(self, codes):
+        mask = 0
+        for code in codes:
+            mask |= self[code]
+        return mask
+class Terms:
+    """Interned names (genres, platforms, companies) and their codes."""
+    def __init__(self, column):
+        self.column = column
+        self.names = [sys.intern(column[i] or "") for i in range(len(column))]
+        #Company names are not unique, so a name maps to every code carrying it.
+        self.codes = {}
+        for code, name in enumerate(self.names):
+            self.codes.setdefault(name, []).append(code)
+    def __len__(self):
+        return len(self.names)
+class CatalogueColumns:
+    """One immutable, columnar copy of the game documents."""
+    def __init__(self, sections, source=None):
+        self.sections = sections
+        self.source = source
+        self.game_ids = sections["game_ids"]
+        self.text = {
+            name: StringColumn(
+                sections[f"{name}.offsets"],
+                sections[f"{name}.blob"],
+                sections[f"{name}.nulls"],
+                *self._haystack(f"{name}.blob")
+            )
+            for name in TEXT_COLUMNS + ("folded_title",)
+        }
+        self.counts = {name: sections[name] for name in COUNT_COLUMNS}
+        self.scores = {name: sections[name] for name in SCORE_COLUMNS}
+        self.title_order = sections["title_order"]
+        self.genres = Terms(self._strings("genre_names"))
+        self.settings = Terms(self._strings("setting_names"))
+        self.platforms = Terms(self._strings("platform_names"))
+        self.companies = Terms(self._strings("company_names"))
+        self.company_ids = sections["company_ids"]
+        self.years = sections["years"]
+        self.year_codes = {year: code for code, year in enumerate(self.years)}
+        self.bitmaps = {
+            name: Bitmaps(sections[f"{name}_bitmaps"], len(self.game_ids))
+            for name in ("genre", "setting", "platform", "year")
+        }
+        self.postings = {
+            name: Postings(sections[f"{name}.offsets"], sections[f"{name}.values"])
+            for name in ("developer_rows", "publisher_rows", "row_genres", "row_settings", "row_platforms", "developer_ranking")
+        }
+        self.release_offsets = sections["release_offsets"]
+        self.release_developer = sections["release_developer"]
+        self.release_publisher = sections["release_publisher"]
+        self.release_year = sections["release_year"]
+        self.developer_groups = self._strings("developer_group_names")
+        self.developer_countries = self._strings("developer_group_countries")
+        self.developer_ranking_scores = sections["developer_ranking_scores"]
+        self.developer_ranking_games = sections["developer_ranking_games"]
+    def _haystack(self, name):
+        if self.source is None:
+            return ()
+        mapped, offsets = self.source
+        return (mapped, offsets[name])
+    def _strings(self, name):
+        return StringColumn(
+            self.sections[f"{name}.offsets"],
+            self.sections[f"{name}.blob"],
+            self.sections[f"{name}.nulls"],
+            *self._haystack(f"{name}.blob")
+        )
+    @classmethod
+    def build(cls, games, attributes, platforms, companies, releases):
+        """Build from query rows (Game, Genre and Setting GameAttributes, GamePlatform, Company, Release)."""
+        games = sorted(games, key=lambda g: g["GameID"])
+        row_of = {game["GameID"]: row for row, game in enumerate(games)}
+        n = len(games)
+        sections = {"game_ids": array.array("i", (g["GameID"] for g in games))}
+        def add_strings(name, values):
+            column = StringColumn.build(values)
+            sections[f"{name}.offsets"] = column.offsets
+            sections[f"{name}.blob"] = column.blob
+            sections[f"{name}.nulls"] = column.nulls
+        def add_postings(name, lists, typecode="i"):
+            postings = Postings.build(lists, typecode)
+            sections[f"{name}.offsets"] = postings.offsets
+            sections[f"{name}.values"] = postings.values
+        for name in TEXT_COLUMNS:
+            add_strings(name, [g.get(name) for g in games])
+        folded = [(g.get("Title") or "").casefold() for g in games]
+        add_strings("folded_title", folded)
+        for name in COUNT_COLUMNS:
+            sections[name] = array.array("i", (NULL_INT if g.get(name) is None else int(g[name]) for g in games))
+        for name in SCORE_COLUMNS:
+            sections[name] = array.array("f", (math.nan if g.get(name) is None else float(g[name]) for g in games))
+        sections["title_order"] = array.array("i", sorted(range(n), key=folded.__getitem__))
+        def intern_terms(name, values):
+            names = sorted(set(values))
+            add_strings(name, names)
+            return {value: code for code, value in enumerate(names)}
+        genres = [r for r in attributes if r["AttributeType"] == "Genre" and r["GameID"] in row_of]
+        settings = [r for r in attributes if r["AttributeType"] == "Setting" and r["GameID"] in row_of]
+        genre_codes = intern_terms("genre_names", (r["AttributeName"] for r in genres))
+        setting_codes = intern_terms("setting_names", (r["AttributeName"] for r in settings))
+        platform_codes = intern_terms("platform_names", (r["PlatformName"] for r in platforms if r["GameID"] in row_of))
+        companies = sorted(companies, key=lambda c: c["CompanyID"])
+        add_strings("company_names", [c["CompanyName"] for c in companies])
+        sections["company_ids"] = array.array("i", (c["CompanyID"] for c in companies))
+        company_codes = {c["CompanyID"]: code for code, c in enumerate(companies)}
+        row_genres = [set() for _ in range(n)]
+        for r in genres:
+            row_genres[row_of[r["GameID"]]].add(genre_codes[r["AttributeName"]])
+        row_settings = [set() for _ in range(n)]
+        for r in settings:
+            row_settings[row_of[r["GameID"]]].add(setting_codes[r["AttributeName"]])
+        row_platforms = [set() for _ in range(n)]
+        for r in platforms:
+            if r["GameID"] in row_of:
+                row_platforms[row_of[r["GameID"]]].add(platform_codes[r["PlatformName"]])
+        row_releases = [set() for _ in range(n)]
+        for r in releases:
+            if r["GameID"] in row_of:
+                row_releases[row_of[r["GameID"]]].add((
+                    company_codes.get(r.get("DeveloperCompanyID"), NO_CODE),
+                    company_codes.get(r.get("PublisherCompanyID"), NO_CODE),
+                    _year(r.get("ReleaseDate")) or NO_YEAR
+                ))
+        row_releases = [sorted(items) for items in row_releases]
+        years = sorted({year for items in row_releases for _, _, year in items if year != NO_YEAR})
+        year_codes = {year: code for code, year in enumerate(years)}
+        sections["years"] = array.array("h", years)
+        add_postings("row_genres", (sorted(items) for items in row_genres))
+        add_postings("row_settings", (sorted(items) for items in row_settings))
+        add_postings("row_platforms", (sorted(items) for items in row_platforms))
+        sections["genre_bitmaps"] = Bitmaps.build(len(genre_codes), n, row_genres)
+        sections["setting_bitmaps"] = Bitmaps.build(len(setting_codes), n, row_settings)
+        sections["platform_bitmaps"] = Bitmaps.build(len(platform_codes), n, row_platforms)
+        sections["year_bitmaps"] = Bitmaps.build(
+            len(years), n, ({year_codes[y] for d, p, y in items if y != NO_YEAR} for items in row_releases)
+        )
+        def invert(count, code_lists):
+            lists = [[] for _ in range(count)]
+            for row, codes in enumerate(code_lists):
+                for code in set(codes):
+                    if code != NO_CODE:
+                        lists[code].append(row)
+            return lists
+        add_postings("developer_rows", invert(len(companies), ([d for d, p, y in items] for items in row_releases)))
+        add_postings("publisher_rows", invert(len(companies), ([p for d, p, y in items] for items in row_releases)))
+        sections["release_offsets"] = array.array("I", [0])
+        sections["release_developer"] = array.array("i")
+        sections["release_publisher"] = array.array("i")
+        sections["release_year"] = array.array("h")
+        for items in row_releases:
+            for developer, publisher, year in items:
+                sections["release_developer"].append(developer)
+                sections["release_publisher"].append(publisher)
+                sections["release_year"].append(year)
+            sections["release_offsets"].append(len(sections["release_developer"]))
+        cls._rank_developers(sections, games, row_genres, companies, releases, row_of, company_codes, len(genre_codes))
+        return cls(sections)
+    @staticmethod
+    def _rank_developers(sections, games, row_genres, companies, releases, row_of, company_codes, genre_count):
+        """
+        The top-developers aggregate for all genres (slot 0) and each genre
+        (slot code + 1): per (CompanyName, Country) of a distinct (game,
+        developer) pair, SUM(critics score * count) / SUM(count) and the
+        number of distinct games, best RANKING_SIZE groups first.
+        """
+        totals = {}
+        pairs = {(r["GameID"], r.get("DeveloperCompanyID")) for r in releases if r["GameID"] in row_of}
+        for game_id, company_id in pairs:
+            if company_id not in company_codes:
+                continue
+            row = row_of[game_id]
+            company = companies[company_codes[company_id]]
+            group = (company["CompanyName"], company.get("Country"))
+            score = games[row].get("overallCriticsScore")
+            count = games[row].get("overallCriticsCount")
+            for slot in [0] + [code + 1 for code in row_genres[row]]:
+                total = totals.setdefault(slot, {}).setdefault(group, [None, None, set()])
+                if score is not None and count is not None:
+                    total[0] = (total[0] or 0) + float(score) * count
+                if count is not None:
+                    total[1] = (total[1] or 0) + count
+                total[2].add(game_id)
+        groups = {}
+        rankings = []
+        scores = array.array("d")
+        game_counts = array.array("i")
+        for slot in range(genre_count + 1):
+            ranked = []
+            for group, (weighted, count, game_ids) in totals.get(slot, {}).items():
+                average = weighted / count if weighted is not None and count else None
+                ranked.append((average is not None, average or 0, len(game_ids), group))
+            ranked.sort(key=lambda entry: entry[:3], reverse=True)
+            codes = []
+            for has_average, average, game_count, group in ranked[:RANKING_SIZE]:
+                codes.append(groups.setdefault(group, len(groups)))
+                scores.append(average if has_average else math.nan)
+                game_counts.append(game_count)
+            rankings.append(codes)
+        ranking = Postings.build(rankings)
+        sections["developer_ranking.offsets"] = ranking.offsets
+        sections["developer_ranking.values"] = ranking.values
+        sections["developer_ranking_scores"] = scores
+        sections["developer_ranking_games"] = game_counts
+        for name, column in (("developer_group_names", 0), ("developer_group_countries", 1)):
+            built = StringColumn.build([group[column] for group in groups])
+            sections[f"{name}.offsets"] = built.offsets
+            sections[f"{name}.blob"] = built.blob
+            sections[f"{name}.nulls"] = built.nulls
+    def __len__(self):
+        return len(self.game_ids)
+    def row_of(self, game_id):
+        """Row of a game, or None if it is not in this catalogue."""
+        row = bisect.bisect_left(self.game_ids, game_id)
+        if row < len(self.game_ids) and self.game_ids[row] == game_id:
+            return row
+        return None
+    def company_name(self, company_id):
+        if company_id is None:
+            return None
+        code = bisect.bisect_left(self.company_ids, company_id)
+        if code < len(self.company_ids) and self.company_ids[code] == company_id:
+            return self.companies.names[code]
+        return None
+    def value(self, row, column):
+        if column == "GameID":
+            return self.game_ids[row]
+        if column in self.scores:
+            score = self.scores[column][row]
+            return None if math.isnan(score) else round(score, 4)
+        if column in self.counts:
+            count = self.counts[column][row]
+            return None if count == NULL_INT else count
+        return self.text[column][row]
+    def sort_value(self, row, column):
+        if column == "Title":
+            return self.text["folded_title"][row]
+        return self.value(row, column)
+    def project(self, row, columns):
+        return {column: self.value(row, column) for column in columns}
+    def releases(self, row):
+        """(developer code, publisher code, year) of each release of a row."""
+        for i in range(self.release_offsets[row], self.release_offsets[row + 1]):
+            yield self.release_developer[i], self.release_publisher[i], self.release_year[i]
+    def document(self, row):
+        """Materialize a row as a plain document dict (for rows about to be modified)."""
+        doc = self.project(row, GAME_COLUMNS)
+        doc["Genres"] = {self.genres.names[code] for code in self.postings["row_genres"][row]}
+        doc["Settings"] = {self.settings.names[code] for code in self.postings["row_settings"][row]}
+        doc["Platforms"] = {self.platforms.names[code] for code in self.postings["row_platforms"][row]}
+        doc["Releases"] = {
+            (
+                self.companies.names[d] if d != NO_CODE else None,
+                self.companies.names[p] if p != NO_CODE else None,
+                y if y != NO_YEAR else None
+            )
+            for d, p, y in self.releases(row)
+        }
+        return doc
+    def developer_ranking(self, genre, limit):
+        """The best developers overall (genre None) or within a genre, as top-developers returns them."""
+        if genre is None:
+            slot = 0
+        elif genre in self.genres.codes:
+            slot = self.genres.codes[genre][0] + 1
+        else:
+            return []
+        start = self.postings["developer_ranking"].offsets[slot]
+        end = min(self.postings["developer_ranking"].offsets[slot + 1], start + limit)
+        ranking = []
+        for i in range(start, end):
+            group = self.postings["developer_ranking"].values[i]
+            score = self.developer_ranking_scores[i]
+            ranking.append({
+                "CompanyName": self.developer_groups[group],
+                "Country": self.developer_countries[group],
+                "AvgCriticsScore": None if math.isnan(score) else round(score, 4),
+                "GameCount": self.developer_ranking_games[i]
+            })
+        return ranking
+    def nbytes(self):
+        return sum(_nbytes(buffer) for buffer in self.sections.values())
+    def write(self, path, meta=None):
+        """Write a snapshot of every section (atomically replacing path) that map() can load."""
+        layout = {}
+        position = 0
+        for name, buffer in self.sections.items():
+            size = _nbytes(buffer)
+            layout[name] = [_typecode(buffer), position, size, zlib.crc32(memoryview(buffer).cast("B"))]
+            position += size + (-size % _ALIGN)
+        header = json.dumps({"version": FORMAT_VERSION, "meta": meta or {}, "sections": layout}).encode("utf-8")
+        header += b" " * (-(len(MAGIC) + 4 + len(header)) % _ALIGN)
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".catalogue-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            f.write(len(header).to_bytes(4, "little"))
+            f.write(header)
+            for name, buffer in self.sections.items():
+                data = memoryview(buffer).cast("B")
+                f.write(data)
+                f.write(b"\x00" * (-len(data) % _ALIGN))
+        os.replace(tmp, path)
+    @classmethod
+    def map(cls, path):
+        """
+        Load a snapshot written by write() without copying: every section is
+        a memoryview over a shared, read-only mmap of the file. Raises
+        ValueError for a file of another format version, a truncated file or
+        a checksum mismatch. Returns (catalogue, meta).
+        """
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapped[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a catalogue file")
+        header_size = int.from_bytes(mapped[len(MAGIC):len(MAGIC) + 4], "little")
+        start = len(MAGIC) + 4 + header_size
+        header = json.loads(bytes(mapped[len(MAGIC) + 4:start]))
+        if header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{path} has snapshot format {header.get('version')}, expected {FORMAT_VERSION}")
+        view = memoryview(mapped)
+        sections = {}
+        offsets = {}
+        for name, (typecode, offset, size, checksum) in header["sections"].items():
+            if start + offset + size > len(mapped):
+                raise ValueError(f"{path} is truncated")
+            offsets[name] = start + offset
+            section = view[start + offset:start + offset + size]
+            if zlib.crc32(section) != checksum:
+                raise ValueError(f"{path} failed its checksum in section {name}")
+            sections[name] = section if typecode == "B" else section.cast(typecode)
+        return cls(sections, source=(mapped, offsets)), header["meta"]
+def _nbytes(buffer):
+    return memoryview(buffer).nbytes
+def _typecode(buffer):
+    if isinstance(buffer, array.array):
+        return buffer.typecode
+    return memoryview(buffer).format
+def _year(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return int(value[:4]) if value[:4].isdigit() else None
+    return value.year
\ No newline at end of file
@@ -0,0 +1,280 @@
+"""
+Change-data feed.
+Every committed write through execute_query, and every import chunk, appends
+rows to the ChangeLog table in the same transaction: the table, the key of
+the changed row (NULL for a bulk / whole-table change), its GameID when it
+has one, and the process that wrote it. A poller thread in each worker reads
+the log past its high-water mark every CHANGE_FEED_POLL_SECONDS and hands the
+changes made by other processes to its subscribers (query cache, credits
+graph, game documents, recommender), which invalidate exactly what changed.
+The feed also keeps the last ChangeID of every table it has read, own writes
+included: the same in every worker, so it versions the data for ETags.
+ChangeIDs are AUTO_INCREMENT values, so a transaction can commit after one
+with a higher ID; IDs skipped over are re-checked for CHANGE_FEED_GAP_SECONDS
+before they are taken for rolled-back inserts.
+Rows older than CHANGE_LOG_RETENTION_HOURS are pruned.
+"""
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from app.config import settings
+from app.deadlines import without_deadline
+CHANGE_LOG_DDL = """
+    CREATE TABLE IF NOT EXISTS ChangeLog (
+        ChangeID BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        TableName VARCHAR(64) NOT NULL,
+        RowKey VARCHAR(512) NULL,
+        GameID INT NULL,
+        Operation CHAR(1) NOT NULL,
+        Origin VARCHAR(64) NOT NULL,
+        ChangedAt TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+        KEY idx_changelog_changed_at (ChangedAt)
+    )
+"""
+#Gaps wider than this are not tracked id by id (e.g. AUTO_INCREMENT jumps after a failed bulk insert).
+_MAX_GAP_SPAN = 100000
+_PRUNE_INTERVAL = 3600
+#Versions are only vouched for while the feed keeps polling (in poll intervals).
+_MAX_POLL_DELAY = 5
+class Change:
+    """One changed row (key None: any number of rows of the table); change_id is set once it is read back from the log."""
+    def __init__(self, table, key=None, game_id=None, operation="U", change_id=None):
+        self.table = table.lower()
+        self.key = key
+        self.game_id = game_id
+        self.operation = operation
+        self.change_id = change_id
+def row_key(*parts):
+    """ChangeLog key of a row from its primary key columns."""
+    return json.dumps(parts, default=str)
+def table_changes(tables):
+    """Whole-table changes for the tables a statement writes (the default for execute_query writes)."""
+    return [Change(table) for table in tables if table != "changelog"]
+_origin = (None, None)
+def origin():
+    """Identity of this process in the ChangeLog (computed after fork, so every worker has its own)."""
+    global _origin
+    if _origin[0] != os.getpid():
+        _origin = (os.getpid(), f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"[-64:])
+    return _origin[1]
+_ready = False
+_ready_lock = threading.Lock()
+def ensure_change_log():
+    """Create the ChangeLog table if needed (once per process)."""
+    global _ready
+    if _ready or not settings.CHANGE_FEED_ENABLED:
+        return
+    from app.database import get_db_cursor
+    with _ready_lock:
+        if not _ready:
+            with get_db_cursor() as cursor:
+                cursor.execute(CHANGE_LOG_DDL)
+            _ready = True
+def record_changes(cursor, changes):
+    """Append changes to the ChangeLog inside the caller's transaction."""
+    if not settings.CHANGE_FEED_ENABLED or not changes:
+        return
+    cursor.executemany(
+        "INSERT INTO ChangeLog (TableName, RowKey, GameID, Operation, Origin) VALUES (%s, %s, %s, %s, %s)",
+        [(change.table, change.key, change.game_id, change.operation, origin()) for change in changes]
+    )
+def latest_change_id():
+    """Highest ChangeID written so far (0 for an empty log), or None when the feed is disabled."""
+    if not settings.CHANGE_FEED_ENABLED:
+        return None
+    from app.database import execute_query
+    ensure_change_log()
+    with without_deadline():
+        row = execute_query("SELECT COALESCE(MAX(ChangeID), 0) AS ChangeID FROM ChangeLog", fetch_one=True, primary=True)
+    return int(row["ChangeID"])
+class ChangeFeed:
+    """
+    Polls the ChangeLog by high-water mark and dispatches batches of Change
+    records to subscribers (callables taking a list of changes).
+    """
+    def __init__(self, poll_seconds, batch_size, gap_seconds, retention_hours):
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self.gap_seconds = gap_seconds
+        self.retention_hours = retention_hours
+        self.subscribers = []
+        self.high_water_mark = None
+        self._gaps = {}
+        self._since = None
+        self._thread = None
+        self._pruned_at = 0
+        self.polls = 0
+        self.applied = 0
+        self.own = 0
+        self.pruned = 0
+        self.last_poll_at = None
+        self.last_change_at = None
+        self.last_error = None
+        self._versions = {}
+        self._written = {}
+        self._lock = threading.Lock()
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+    def start(self, since=None):
+        """Poll in the background from ChangeID since (default: the current end of the log)."""
+        if settings.CHANGE_FEED_ENABLED and self._thread is None:
+            self._since = since
+            self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+            self._thread.start()
+    @property
+    def running(self):
+        return self.high_water_mark is not None
+    def _run(self):
+        from app.cache import query_cache
+        while True:
+            try:
+                if self.high_water_mark is None:
+                    latest = latest_change_id()
+                    self._load_versions()
+                    self.high_water_mark = latest if self._since is None else min(self._since, latest)
+                    #Remote writes now invalidate cached results directly, so the TTL only bounds memory.
+                    query_cache.ttl = max(query_cache.ttl, settings.CHANGE_FEED_CACHE_TTL)
+                started = time.monotonic()
+                while self.poll() >= self.batch_size:
+                    pass
+                with self._lock:
+                    #Writes committed before this catch-up started have now been read back.
+                    self._written = {table: at for table, at in self._written.items() if at >= started}
+                if time.time() - self._pruned_at > _PRUNE_INTERVAL:
+                    self.prune()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Change feed poll failed: {str(e)}")
+            time.sleep(self.poll_seconds)
+    def poll(self):
+        """Read and dispatch one batch of new changes; returns the number of new log rows read."""
+        from app.database import execute_query
+        columns = "ChangeID, TableName, RowKey, GameID, Operation, Origin"
+        with without_deadline():
+            rows = execute_query(
+                f"SELECT {columns} FROM ChangeLog WHERE ChangeID > %s ORDER BY ChangeID LIMIT %s",
+                (self.high_water_mark, self.batch_size),
+                primary=True
+            )
+            late = []
+            if self._gaps:
+                gaps = sorted(self._gaps)[:self.batch_size]
+                late = execute_query(
+                    f"SELECT {columns} FROM ChangeLog WHERE ChangeID IN ({', '.join(['%s'] * len(gaps))})",
+                    tuple(gaps),
+                    primary=True
+                )
+        now = time.monotonic()
+        for row in late:
+            self._gaps.pop(row["ChangeID"], None)
+        if rows:
+            seen = {row["ChangeID"] for row in rows}
+            first = self.high_water_mark + 1
+            if rows[-1]["ChangeID"] - first <= _MAX_GAP_SPAN:
+                for change_id in range(first, rows[-1]["ChangeID"]):
+                    if change_id not in seen:
+                        self._gaps[change_id] = now
+            self.high_water_mark = rows[-1]["ChangeID"]
+        for change_id, first_seen in list(self._gaps.items()):
+            if now - first_seen > self.gap_seconds:
+                del self._gaps[change_id]
+        me = origin()
+        changes = [
+            Change(row["TableName"], row["RowKey"], row["GameID"], row["Operation"], row["ChangeID"])
+            for row in late + rows if row["Origin"] != me
+        ]
+        self.own += len(late) + len(rows) - len(changes)
+        self.polls += 1
+        self.last_poll_at = time.time()
+        if changes:
+            self.applied += len(changes)
+            self.last_change_at = self.last_poll_at
+            for callback in self.subscribers:
+                try:
+                    callback(changes)
+                except Exception as e:
+                    print(f"Change feed subscriber {getattr(callback, '__qualname__', callback)} failed: {str(e)}")
+        #Bumped only after the subscribers ran, so a new version never labels data they have not dropped yet.
+        with self._lock:
+            for row in late + rows:
+                table = row["TableName"]
+                self._versions[table] = max(self._versions.get(table, 0), row["ChangeID"])
+        return len(rows)
+    def _load_versions(self):
+        """Seed the table versions from the log (read after the starting position, so none is missed)."""
+        from app.database import execute_query
+        with without_deadline():
+            rows = execute_query(
+                "SELECT TableName, MAX(ChangeID) AS ChangeID FROM ChangeLog GROUP BY TableName",
+                primary=True
+            )
+        with self._lock:
+            for row in rows:
+                table = row["TableName"]
+                self._versions[table] = max(self._versions.get(table, 0), row["ChangeID"])
+    def wrote(self, changes):
+        """Note changes this process has just committed; their tables have no version until the feed reads them back."""
+        if not self.running or not changes:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for change in changes:
+                self._written[change.table] = now
+    def settled(self, tables):
+        """
+        Whether this worker has read every change to the tables that other
+        workers may have read: the feed is polling, no skipped ChangeID can
+        still commit, and no write of this process is waiting to be read back.
+        """
+        if not self.running or self._gaps or self.last_poll_at is None:
+            return False
+        if time.time() - self.last_poll_at > self.poll_seconds * _MAX_POLL_DELAY + 1:
+            return False
+        with self._lock:
+            return not any(table in self._written for table in tables)
+    def versions(self, tables):
+        """Last ChangeID logged for each table (0 for none), or None when the feed is not settled for them."""
+        if not self.settled(tables):
+            return None
+        with self._lock:
+            return tuple(self._versions.get(table, 0) for table in tables)
+    def prune(self):
+        """Delete log rows past the retention window, in bounded batches."""
+        from app.database import get_db_cursor
+        self._pruned_at = time.time()
+        while True:
+            with without_deadline():
+                with get_db_cursor(commit=True) as cursor:
+                    deleted = cursor.execute(
+                        "DELETE FROM ChangeLog WHERE ChangedAt < NOW(6) - INTERVAL %s HOUR LIMIT 10000",
+                        (self.retention_hours,)
+                    )
+            self.pruned += deleted
+            if deleted < 10000:
+                return
+    def stats(self):
+        return {
+            "enabled": settings.CHANGE_FEED_ENABLED,
+            "running": self.running,
+            "origin": origin(),
+            "high_water_mark": self.high_water_mark,
+            "pending_gaps": len(self._gaps),
+            "tables_versioned": len(self._versions),
+            "polls": self.polls,
+            "applied": self.applied,
+            "own_changes_skipped": self.own,
+            "pruned": self.pruned,
+            "last_poll_at": self.last_poll_at,
+            "last_change_at": self.last_change_at,
+            "last_error": self.last_error
+        }
+change_feed = ChangeFeed(
+    settings.CHANGE_FEED_POLL_SECONDS,
+    settings.CHANGE_FEED_BATCH_SIZE,
+    settings.CHANGE_FEED_GAP_SECONDS,
+    settings.CHANGE_LOG_RETENTION_HOURS
+)
\ No newline at end of file
@@ -8,4 +8,69 @@ class Settings:
     DB_PASSWORD: str = os.getenv("DB_PASSWORD")
     DB_NAME: str = os.getenv("DB_NAME")
     FRONTEND_URL: str = os.getenv("FRONTEND_URL", "http://localhost:5173")
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+    DB_POOL_RECYCLE: float = float(os.getenv("DB_POOL_RECYCLE", "300"))
+    DB_READ_TIMEOUT: float = float(os.getenv("DB_READ_TIMEOUT", "60"))
+    DB_WRITE_TIMEOUT: float = float(os.getenv("DB_WRITE_TIMEOUT", "60"))
+    QUERY_DEADLINE_SECONDS: float = float(os.getenv("QUERY_DEADLINE_SECONDS", "10"))
+    QUERY_DEADLINE_ANALYTICS_SECONDS: float = float(os.getenv("QUERY_DEADLINE_ANALYTICS_SECONDS", "20"))
+    QUERY_KILL_GRACE_SECONDS: float = float(os.getenv("QUERY_KILL_GRACE_SECONDS", "0.5"))
+    DB_REPLICA_HOSTS: str = os.getenv("DB_REPLICA_HOSTS", "")
+    DB_REPLICA_STRATEGY: str = os.getenv("DB_REPLICA_STRATEGY", "round_robin")
+    DB_REPLICA_MAX_LAG: float = float(os.getenv("DB_REPLICA_MAX_LAG", "5"))
+    DB_REPLICA_LAG_CHECK_SECONDS: float = float(os.getenv("DB_REPLICA_LAG_CHECK_SECONDS", "10"))
+    DB_STICKY_SECONDS: float = float(os.getenv("DB_STICKY_SECONDS", "10"))
+    QUERY_CACHE_MAX_BYTES: int = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    QUERY_CACHE_TTL: float = float(os.getenv("QUERY_CACHE_TTL", "300"))
+    COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    COMPRESSION_GZIP_LEVEL: int = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+    COMPRESSION_BROTLI_QUALITY: int = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+    GRAPH_REBUILD_SECONDS: float = float(os.getenv("GRAPH_REBUILD_SECONDS", "3600"))
+    DOCUMENTS_REBUILD_SECONDS: float = float(os.getenv("DOCUMENTS_REBUILD_SECONDS", "3600"))
+    DOCUMENTS_SHARED_PATH: str = os.getenv("DOCUMENTS_SHARED_PATH", "/tmp/faresgames-catalogue.bin")
+    RECOMMEND_REFRESH_SECONDS: float = float(os.getenv("RECOMMEND_REFRESH_SECONDS", "3600"))
+    RECOMMEND_RATING_WEIGHT: float = float(os.getenv("RECOMMEND_RATING_WEIGHT", "0.7"))
+    RECOMMEND_NEIGHBORS: int = int(os.getenv("RECOMMEND_NEIGHBORS", "50"))
+    PASSWORD_SCRYPT_N: int = int(os.getenv("PASSWORD_SCRYPT_N", "16384"))
+    PASSWORD_SCRYPT_R: int = int(os.getenv("PASSWORD_SCRYPT_R", "8"))
+    PASSWORD_SCRYPT_P: int = int(os.getenv("PASSWORD_SCRYPT_P", "1"))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+    PASSWORD_HASH_EXECUTOR: str = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+    SESSION_SECRET: str = os.getenv("SESSION_SECRET", "")
+    SESSION_SECRET_FILE: str = os.getenv("SESSION_SECRET_FILE", "/tmp/faresgames-session.key")
+    SESSION_TTL_SECONDS: int = int(os.getenv("SESSION_TTL_SECONDS", str(12 * 3600)))
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_REDIS_URL: str = os.getenv("RATE_LIMIT_REDIS_URL", "")
+    RATE_LIMIT_TRUST_FORWARDED: bool = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+    RATE_LIMIT_RATE: float = float(os.getenv("RATE_LIMIT_RATE", "20"))
+    RATE_LIMIT_BURST: float = float(os.getenv("RATE_LIMIT_BURST", "40"))
+    RATE_LIMIT_ROUTE_RATE: float = float(os.getenv("RATE_LIMIT_ROUTE_RATE", "500"))
+    RATE_LIMIT_ROUTE_BURST: float = float(os.getenv("RATE_LIMIT_ROUTE_BURST", "1000"))
+    RATE_LIMIT_HEAVY_RATE: float = float(os.getenv("RATE_LIMIT_HEAVY_RATE", "0.5"))
+    RATE_LIMIT_HEAVY_BURST: float = float(os.getenv("RATE_LIMIT_HEAVY_BURST", "5"))
+    RATE_LIMIT_HEAVY_ROUTE_RATE: float = float(os.getenv("RATE_LIMIT_HEAVY_ROUTE_RATE", "5"))
+    RATE_LIMIT_HEAVY_ROUTE_BURST: float = float(os.getenv("RATE_LIMIT_HEAVY_ROUTE_BURST", "10"))
+    ADMISSION_CONCURRENCY: int = int(os.getenv("ADMISSION_CONCURRENCY", "64"))
+    ADMISSION_HEAVY_CONCURRENCY: int = int(os.getenv("ADMISSION_HEAVY_CONCURRENCY", "4"))
+    ADMISSION_QUEUE_SIZE: int = int(os.getenv("ADMISSION_QUEUE_SIZE", "32"))
+    ADMISSION_QUEUE_TIMEOUT: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+    BATCH_MAX_REQUESTS: int = int(os.getenv("BATCH_MAX_REQUESTS", "20"))
+    CHANGE_FEED_ENABLED: bool = os.getenv("CHANGE_FEED_ENABLED", "true").lower() == "true"
+    CHANGE_FEED_POLL_SECONDS: float = float(os.getenv("CHANGE_FEED_POLL_SECONDS", "1"))
+    CHANGE_FEED_BATCH_SIZE: int = int(os.getenv("CHANGE_FEED_BATCH_SIZE", "1000"))
+    CHANGE_FEED_GAP_SECONDS: float = float(os.getenv("CHANGE_FEED_GAP_SECONDS", "10"))
+    CHANGE_FEED_CACHE_TTL: float = float(os.getenv("CHANGE_FEED_CACHE_TTL", "3600"))
+    CHANGE_LOG_RETENTION_HOURS: int = int(os.getenv("CHANGE_LOG_RETENTION_HOURS", "24"))
+    RATING_ACTIVITY_ENABLED: bool = os.getenv("RATING_ACTIVITY_ENABLED", "true").lower() == "true"
+    RATING_ROLLUP_SECONDS: float = float(os.getenv("RATING_ROLLUP_SECONDS", "60"))
+    RATING_ROLLUP_SETTLE_SECONDS: float = float(os.getenv("RATING_ROLLUP_SETTLE_SECONDS", "5"))
+    RATING_EVENT_RETENTION_DAYS: int = int(os.getenv("RATING_EVENT_RETENTION_DAYS", "7"))
+    RATING_HOURLY_RETENTION_DAYS: int = int(os.getenv("RATING_HOURLY_RETENTION_DAYS", "31"))
+    RATING_DAILY_RETENTION_DAYS: int = int(os.getenv("RATING_DAILY_RETENTION_DAYS", "730"))
+    RATING_ACTIVITY_MAX_BUCKETS: int = int(os.getenv("RATING_ACTIVITY_MAX_BUCKETS", "1000"))
+    HEALTH_CHECK_TIMEOUT: float = float(os.getenv("HEALTH_CHECK_TIMEOUT", "2"))
+    HEALTH_CACHE_SECONDS: float = float(os.getenv("HEALTH_CACHE_SECONDS", "5"))
+    HEALTH_DETAILS_ENABLED: bool = os.getenv("HEALTH_DETAILS_ENABLED", "true").lower() == "true"
 settings = Settings()
\ No newline at end of file
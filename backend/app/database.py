@@ -1,64 +1,470 @@
+import itertools
+import threading
+import time
 import pymysql
+from pymysql.constants import FIELD_TYPE
+from pymysql.converters import conversions
 from pymysql.cursors import DictCursor
 from contextlib import contextmanager
+from contextvars import ContextVar
 from app.config import settings
-def get_db_connection():
+from app.cache import query_cache, make_key, read_tables, write_tables
+from app.changes import change_feed, ensure_change_log, record_changes, table_changes
+from app.deadlines import QueryTimeout, current_deadline, watchdog, with_max_execution_time
+_conversions = conversions.copy()
+_conversions[FIELD_TYPE.DECIMAL] = float
+_conversions[FIELD_TYPE.NEWDECIMAL] = float
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available in time."""
+def get_db_connection(host=None, port=None, **options):
     """
     Create a database connection to Aiven MySQL.
     Returns a connection object with dictionary cursor.
+    Reads and writes on the socket time out after DB_READ_TIMEOUT /
+    DB_WRITE_TIMEOUT seconds.
+    DECIMAL columns are decoded straight to float so rows can be serialized
+    without a per-value Decimal conversion. Extra options and overrides (e.g.
+    local_infile, connect_timeout) are passed through to pymysql.connect.
+    Pooled connections run in autocommit mode; writes open an explicit
+    transaction in get_db_cursor so reads never hold a stale snapshot.
     """
+    arguments = dict(
+        host=host or settings.DB_HOST,
+        port=port or settings.DB_PORT,
+        user=settings.DB_USER,
+        password=settings.DB_PASSWORD,
+        database=settings.DB_NAME,
+        charset='utf8mb4',
+        cursorclass=DictCursor,
+        conv=_conversions,
+        connect_timeout=30,
+        read_timeout=settings.DB_READ_TIMEOUT,
+        write_timeout=settings.DB_WRITE_TIMEOUT,
+        autocommit=True
+    )
+    arguments.update(options)
     try:
-        connection = pymysql.connect(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            database=settings.DB_NAME,
-            charset='utf8mb4',
-            cursorclass=DictCursor,
-            connect_timeout=30,
-            autocommit=False  
-        )
+        connection = pymysql.connect(**arguments)
         return connection
     except Exception as e:
         print(f"Database connection error: {str(e)}")
         raise
+class ConnectionPool:
+    """
+    Thread-safe pool of connections to a single MySQL host.
+    Connections are created lazily up to max_size and reused LIFO so the
+    most recently used (warmest) connection is handed out first.
+    """
+    def __init__(self, host, port, max_size, timeout, recycle):
+        self.host = host
+        self.port = port
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self._idle = []
+        self._size = 0
+        self._cond = threading.Condition()
+        self.in_use = 0
+        self.acquired = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.discarded = 0
+    def acquire(self, timeout=None):
+        """
+        Check out a connection, waiting up to timeout seconds when the pool is full.
+        Raises PoolTimeout if none becomes available.
+        """
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    connection, released_at = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    connection, released_at = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(f"No database connection available for {self.host} within {self.timeout}s")
+                if not waited:
+                    self.waits += 1
+                    waited = True
+                self._cond.wait(remaining)
+            self.in_use += 1
+            self.acquired += 1
+        try:
+            if connection is None:
+                connection = get_db_connection(self.host, self.port)
+            elif time.monotonic() - released_at > self.recycle:
+                connection.ping(reconnect=True)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self.in_use -= 1
+                self._cond.notify()
+            raise
+        return connection
+    def release(self, connection, discard=False):
+        """Return a connection to the pool, closing it instead if it is broken."""
+        with self._cond:
+            self.in_use -= 1
+            if discard or not connection.open:
+                self._size -= 1
+                self.discarded += 1
+            else:
+                self._idle.append((connection, time.monotonic()))
+                connection = None
+            self._cond.notify()
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+    def stats(self):
+        with self._cond:
+            return {
+                "host": self.host,
+                "port": self.port,
+                "size": self._size,
+                "max_size": self.max_size,
+                "in_use": self.in_use,
+                "idle": len(self._idle),
+                "saturation": round(self.in_use / self.max_size, 3) if self.max_size else 0,
+                "acquired": self.acquired,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "discarded": self.discarded
+            }
+_pools = {}
+_pools_lock = threading.Lock()
+def get_pool(host=None, port=None):
+    """Return the connection pool for a host, creating it on first use."""
+    key = (host or settings.DB_HOST, port or settings.DB_PORT)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(
+                    key[0],
+                    key[1],
+                    max_size=settings.DB_POOL_SIZE,
+                    timeout=settings.DB_POOL_TIMEOUT,
+                    recycle=settings.DB_POOL_RECYCLE
+                )
+                _pools[key] = pool
+    return pool
+def pool_stats():
+    """Snapshot of every connection pool, for diagnostics."""
+    return [pool.stats() for pool in list(_pools.values())]
+class StickySession:
+    """
+    Read-your-writes state of one request (see ReadYourWritesMiddleware): the
+    sticky key its client wrote under recently, on any worker, and the key
+    this request writes under.
+    """
+    def __init__(self, key=None):
+        self.key = key
+        self.written = None
+current_session = ContextVar("current_session", default=None)
+class ReplicaRouter:
+    """
+    Routes read-only queries to replica hosts.
+    Replicas whose replication lag exceeds DB_REPLICA_MAX_LAG (or that fail) are
+    skipped until their next lag check; with no usable replica reads go to the
+    primary. Keys written within DB_STICKY_SECONDS read from the primary so a
+    user always sees their own writes: on the worker that wrote from its own
+    record, on every other one from the token the write handed to the client
+    (carried in the request's StickySession).
+    """
+    def __init__(self, replicas, strategy, max_lag, lag_check_interval, sticky_seconds):
+        self.replicas = replicas
+        self.strategy = strategy
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self.sticky_seconds = sticky_seconds
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._latency = {key: None for key in replicas}
+        self._lag = {key: (0.0, None, False) for key in replicas}
+        self._sticky = {}
+        self.reads = {key: 0 for key in replicas}
+        self.primary_reads = 0
+        self.sticky_reads = 0
+        self.fallbacks = 0
+    def _check_lag(self, key):
+        """Measure replication lag in seconds; None means the replica is unusable."""
+        try:
+            with get_db_cursor(pool=get_pool(*key)) as cursor:
+                try:
+                    cursor.execute("SHOW REPLICA STATUS")
+                    row = cursor.fetchone()
+                    column = "Seconds_Behind_Source"
+                except pymysql.err.ProgrammingError:
+                    cursor.execute("SHOW SLAVE STATUS")
+                    row = cursor.fetchone()
+                    column = "Seconds_Behind_Master"
+        except pymysql.err.OperationalError as e:
+            if e.args and e.args[0] == 1227:
+                return 0.0 #No REPLICATION CLIENT privilege: lag is unknown, so trust the replica.
+            return None
+        except Exception:
+            return None
+        if not row:
+            return 0.0
+        lag = row.get(column)
+        return float(lag) if lag is not None else None
+    def _usable(self, key):
+        now = time.monotonic()
+        with self._lock:
+            checked_at, lag, checking = self._lag[key]
+            due = not checking and now - checked_at >= self.lag_check_interval
+            if due:
+                self._lag[key] = (checked_at, lag, True)
+        if due:
+            lag = self._check_lag(key)
+            with self._lock:
+                self._lag[key] = (time.monotonic(), lag, False)
+        return lag is not None and lag <= self.max_lag
+    def choose(self, sticky_key=None):
+        """Pick a replica pool for a read, or None to read from the primary."""
+        if not self.replicas:
+            return None
+        if sticky_key is not None and self.is_sticky(sticky_key):
+            with self._lock:
+                self.sticky_reads += 1
+            return None
+        candidates = [key for key in self.replicas if self._usable(key)]
+        if not candidates:
+            with self._lock:
+                self.primary_reads += 1
+            return None
+        with self._lock:
+            if self.strategy == "least_latency":
+                key = min(candidates, key=lambda k: self._latency[k] if self._latency[k] is not None else 0.0)
+            else:
+                key = candidates[next(self._counter) % len(candidates)]
+            self.reads[key] += 1
+        return get_pool(*key)
+    def record_latency(self, pool, elapsed_ms):
+        key = (pool.host, pool.port)
+        with self._lock:
+            previous = self._latency.get(key)
+            self._latency[key] = elapsed_ms if previous is None else previous * 0.8 + elapsed_ms * 0.2
+    def mark_failed(self, pool):
+        """Take a replica out of rotation until its next lag check."""
+        with self._lock:
+            self._lag[(pool.host, pool.port)] = (time.monotonic(), None, False)
+            self.fallbacks += 1
+    def mark_write(self, sticky_key):
+        if sticky_key is None or not self.replicas:
+            return
+        session = current_session.get()
+        if session is not None:
+            session.written = sticky_key
+        now = time.monotonic()
+        with self._lock:
+            if len(self._sticky) > 10000:
+                self._sticky = {k: t for k, t in self._sticky.items() if t > now}
+            self._sticky[sticky_key] = now + self.sticky_seconds
+    def is_sticky(self, sticky_key):
+        session = current_session.get()
+        if session is not None and session.key == sticky_key:
+            return True
+        expires_at = self._sticky.get(sticky_key)
+        return expires_at is not None and expires_at > time.monotonic()
+    def stats(self):
+        with self._lock:
+            return {
+                "strategy": self.strategy,
+                "replicas": [
+                    {
+                        "host": key[0],
+                        "port": key[1],
+                        "reads": self.reads[key],
+                        "latency_ms": round(self._latency[key], 2) if self._latency[key] is not None else None,
+                        "lag_seconds": self._lag[key][1],
+                        "usable": self._lag[key][1] is not None and self._lag[key][1] <= self.max_lag
+                    }
+                    for key in self.replicas
+                ],
+                "primary_reads": self.primary_reads,
+                "sticky_reads": self.sticky_reads,
+                "fallbacks": self.fallbacks
+            }
+def _parse_hosts(value):
+    hosts = []
+    for item in (value or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.partition(":")
+        hosts.append((host, int(port) if port else settings.DB_PORT))
+    return hosts
+replicas = ReplicaRouter(
+    _parse_hosts(settings.DB_REPLICA_HOSTS),
+    strategy=settings.DB_REPLICA_STRATEGY,
+    max_lag=settings.DB_REPLICA_MAX_LAG,
+    lag_check_interval=settings.DB_REPLICA_LAG_CHECK_SECONDS,
+    sticky_seconds=settings.DB_STICKY_SECONDS
+)
+_CONNECTION_ERRORS = {2003, 2006, 2013, 2055}
 @contextmanager
-def get_db_cursor(commit=False):
+def get_db_cursor(commit=False, pool=None):
     """
     Context manager for database operations.
+    Uses the primary pool unless another pool is given.
     Usage:
         with get_db_cursor(commit=True) as cursor:
             cursor.execute("INSERT ...")
     """
-    connection = get_db_connection()
+    pool = pool or get_pool()
+    connection = pool.acquire()
     cursor = connection.cursor()
+    broken = False
     try:
+        if commit:
+            connection.begin()
         yield cursor
         if commit:
             connection.commit()
     except Exception as e:
-        connection.rollback()
+        broken = isinstance(e, (pymysql.err.OperationalError, pymysql.err.InterfaceError))
+        try:
+            connection.rollback()
+        except Exception:
+            broken = True
         raise e
     finally:
         cursor.close()
-        connection.close()
-def execute_query(query, params=None, fetch_one=False, commit=False):
+        pool.release(connection, discard=broken)
+def ping_database(timeout=None):
+    """
+    Constant-time liveness check of the primary: SELECT 1 on a pooled connection.
+    Returns the round-trip latency in milliseconds.
+    """
+    started = time.monotonic()
+    pool = get_pool()
+    connection = pool.acquire(timeout=timeout)
+    broken = False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+    except Exception:
+        broken = True
+        raise
+    finally:
+        pool.release(connection, discard=broken)
+    return round((time.monotonic() - started) * 1000, 2)
+#Errors raised by a statement stopped by MAX_EXECUTION_TIME, by KILL QUERY, and by a read timeout.
+_MAX_EXECUTION_TIME_EXCEEDED = 3024
+_QUERY_INTERRUPTED = 1317
+_LOST_CONNECTION = 2013
+def _fetch(pool, query, params, fetch_one):
+    request = current_deadline.get()
+    with get_db_cursor(pool=pool) as cursor:
+        if request is None:
+            cursor.execute(query, params or ())
+        else:
+            _execute_with_deadline(cursor, request, query, params)
+        if fetch_one:
+            return cursor.fetchone()
+        else:
+            return cursor.fetchall()
+def _execute_with_deadline(cursor, request, query, params):
+    """
+    Run a read within what is left of the request deadline: server-side
+    MAX_EXECUTION_TIME, a matching driver read timeout, and a watchdog that
+    sends KILL QUERY if the statement outlives both.
+    """
+    remaining = request.remaining()
+    connection = cursor.connection
+    connection._read_timeout = min(settings.DB_READ_TIMEOUT, remaining + 2 * settings.QUERY_KILL_GRACE_SECONDS + 1)
+    in_flight = watchdog.watch(connection.host, connection.port, connection.thread_id(), request)
+    try:
+        cursor.execute(with_max_execution_time(query, remaining), params or ())
+    except pymysql.err.OperationalError as e:
+        code = e.args[0] if e.args else None
+        if code == _MAX_EXECUTION_TIME_EXCEEDED:
+            reason = "max_execution_time"
+        elif code == _QUERY_INTERRUPTED and in_flight.killed:
+            reason = in_flight.killed
+        elif code == _LOST_CONNECTION and request.expired():
+            reason = "read_timeout"
+        else:
+            raise
+        watchdog.record(reason)
+        raise QueryTimeout(reason) from e
+    finally:
+        watchdog.finish(in_flight)
+        connection._read_timeout = settings.DB_READ_TIMEOUT
+def execute_query(query, params=None, fetch_one=False, commit=False, primary=False, sticky_key=None, cache=True, changes=None, statements=None):
     """
     Execute a SQL query and return results.
+    Reads are memoized in the query cache and routed to a replica when
+    DB_REPLICA_HOSTS is set; writes always go to the primary, invalidate
+    cached results for the tables they touch in this process, and are logged
+    to the ChangeLog in the same transaction for the other workers.
     Args:
         query: SQL query string
         params: Query parameters (tuple or dict)
         fetch_one: If True, return single row; else return all rows
         commit: If True, commit the transaction
+        primary: If True, read from the primary (e.g. checks before a write)
+        sticky_key: Identity (e.g. user email) whose reads follow its recent writes to the primary
+        cache: If False, bypass the query cache
+        changes: The rows a write changes, as app.changes.Change records
+                 (default: one whole-table change per table written)
+        statements: Further (query, params) writes committed in the same transaction
+                    (e.g. the RatingEvent row of a rating write)
     Returns:
         Query results as dictionary or list of dictionaries
     """
-    with get_db_cursor(commit=commit) as cursor:
-        cursor.execute(query, params or ())
-        if commit:
-            return cursor.lastrowid 
-        if fetch_one:
-            return cursor.fetchone()
+    if commit:
+        tables = write_tables(query)
+        if tables:
+            ensure_change_log()
+        if changes is None:
+            changes = table_changes(tables)
+        with get_db_cursor(commit=True) as cursor:
+            cursor.execute(query, params or ())
+            lastrowid = cursor.lastrowid
+            for statement, statement_params in statements or ():
+                cursor.execute(statement, statement_params)
+            record_changes(cursor, changes)
+        query_cache.invalidate(tables)
+        change_feed.wrote(changes)
+        replicas.mark_write(sticky_key)
+        return lastrowid
+    key = None
+    sticky = sticky_key is not None and replicas.is_sticky(sticky_key)
+    if cache and query_cache.enabled and not primary and not sticky:
+        key = make_key(query, params, fetch_one)
+    if key is not None:
+        hit, result = query_cache.get(key)
+        if hit:
+            return result
+        tables = read_tables(query)
+        generations = query_cache.generations(tables)
+    result = _read(query, params, fetch_one, primary, sticky_key)
+    if key is not None:
+        query_cache.put(key, result, tables, generations)
+    return result
+def _read(query, params, fetch_one, primary, sticky_key):
+    pool = None if primary else replicas.choose(sticky_key)
+    if pool is not None:
+        started = time.monotonic()
+        try:
+            result = _fetch(pool, query, params, fetch_one)
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError, PoolTimeout) as e:
+            if isinstance(e, pymysql.err.OperationalError) and e.args and e.args[0] not in _CONNECTION_ERRORS:
+                raise
+            replicas.mark_failed(pool)
         else:
-            return cursor.fetchall()
\ No newline at end of file
+            replicas.record_latency(pool, (time.monotonic() - started) * 1000)
+            return result
+    return _fetch(None, query, params, fetch_one)
\ No newline at end of file
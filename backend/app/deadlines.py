@@ -0,0 +1,229 @@
+"""
+Statement deadlines and query cancellation.
+Each /api request gets a deadline (QUERY_DEADLINE_SECONDS, longer for
+/api/analytics) carried in a context variable, so every read it runs shares
+what is left of the budget:
+    - SELECTs get a /*+ MAX_EXECUTION_TIME(ms) */ hint so the server stops them,
+    - the driver read timeout is cut to the remaining time plus a grace period,
+    - a watchdog thread sends KILL QUERY from a separate connection if a query
+      is still running QUERY_KILL_GRACE_SECONDS after the deadline, or as soon
+      as the HTTP client disconnects.
+An interrupted query raises QueryTimeout, answered with 504.
+"""
+import asyncio
+import heapq
+import itertools
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from app.config import settings
+#Longest prefix wins.
+ROUTE_DEADLINES = {
+    "/api": settings.QUERY_DEADLINE_SECONDS,
+    "/api/analytics": settings.QUERY_DEADLINE_ANALYTICS_SECONDS
+}
+_EXEMPT_PREFIXES = ("/api/health",)
+_SELECT = re.compile(r"^(\s*SELECT)\b", re.IGNORECASE)
+class QueryTimeout(Exception):
+    """Raised when a query is stopped by its deadline or because the client went away."""
+    def __init__(self, reason):
+        super().__init__(f"Query stopped: {reason.replace('_', ' ')}")
+        self.reason = reason
+def route_deadline(path):
+    """Deadline in seconds for a request path, or None if it has none."""
+    if path.startswith(_EXEMPT_PREFIXES):
+        return None
+    matches = [prefix for prefix in ROUTE_DEADLINES if path == prefix or path.startswith(prefix + "/")]
+    if not matches:
+        return None
+    return ROUTE_DEADLINES[max(matches, key=len)]
+def with_max_execution_time(query, seconds):
+    """Add a MAX_EXECUTION_TIME optimizer hint to a SELECT (other statements are returned as is)."""
+    return _SELECT.sub(lambda m: f"{m.group(1)} /*+ MAX_EXECUTION_TIME({max(1, int(seconds * 1000))}) */", query, count=1)
+class RequestDeadline:
+    """The deadline of one request and the queries it has in flight."""
+    def __init__(self, seconds):
+        self.deadline = time.monotonic() + seconds
+        self.cancelled = None
+        self.queries = set()
+    def remaining(self):
+        """Seconds left; raises QueryTimeout when none are left or the request was cancelled."""
+        if self.cancelled:
+            raise QueryTimeout(self.cancelled)
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            watchdog.record("expired_before_start")
+            raise QueryTimeout("deadline_exceeded")
+        return remaining
+    def expired(self):
+        return self.cancelled is not None or time.monotonic() >= self.deadline
+    def cancel(self, reason):
+        """Stop every query of this request (e.g. the client disconnected)."""
+        self.cancelled = reason
+        watchdog.cancel_request(self)
+current_deadline = ContextVar("current_deadline", default=None)
+@contextmanager
+def without_deadline():
+    """Run work that must not inherit the request deadline (e.g. building a shared in-memory index)."""
+    token = current_deadline.set(None)
+    try:
+        yield
+    finally:
+        current_deadline.reset(token)
+class InFlightQuery:
+    def __init__(self, host, port, thread_id, request):
+        self.host = host
+        self.port = port
+        self.thread_id = thread_id
+        self.request = request
+        self.killed = None
+        self.done = False
+        #Held while a KILL is sent so the connection cannot start another statement meanwhile.
+        self.lock = threading.Lock()
+class QueryWatchdog:
+    """
+    Background thread that kills queries past their deadline. KILL QUERY is
+    sent on a dedicated connection per host, never one from the pools.
+    """
+    def __init__(self, grace):
+        self.grace = grace
+        self._cond = threading.Condition()
+        self._heap = []
+        self._kills = []
+        self._counter = itertools.count()
+        self._connections = {}
+        self._thread = None
+        self.timeouts = {}
+        self.kills = 0
+        self.kill_errors = 0
+    def record(self, reason):
+        with self._cond:
+            self.timeouts[reason] = self.timeouts.get(reason, 0) + 1
+    def watch(self, host, port, thread_id, request):
+        query = InFlightQuery(host, port, thread_id, request)
+        with self._cond:
+            request.queries.add(query)
+            heapq.heappush(self._heap, (request.deadline + self.grace, next(self._counter), query))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="query-watchdog", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        if request.cancelled:
+            self.kill(query, request.cancelled)
+        return query
+    def finish(self, query):
+        with query.lock:
+            query.done = True
+        with self._cond:
+            query.request.queries.discard(query)
+    def kill(self, query, reason):
+        """Queue a KILL QUERY for an in-flight query (safe to call from the event loop)."""
+        with self._cond:
+            if query.killed is None:
+                query.killed = reason
+                self._kills.append(query)
+                self._cond.notify()
+    def cancel_request(self, request):
+        with self._cond:
+            queries = list(request.queries)
+        for query in queries:
+            self.kill(query, request.cancelled)
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._kills:
+                    while self._heap and self._heap[0][2].done:
+                        heapq.heappop(self._heap)
+                    if self._heap and self._heap[0][0] <= time.monotonic():
+                        query = heapq.heappop(self._heap)[2]
+                        if query.killed is None:
+                            query.killed = "deadline_kill"
+                            self._kills.append(query)
+                        continue
+                    self._cond.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                kills, self._kills = self._kills, []
+            for query in kills:
+                self._send_kill(query)
+    def _send_kill(self, query):
+        from app.database import get_db_connection
+        with query.lock:
+            if query.done:
+                return
+            key = (query.host, query.port)
+            for attempt in range(2):
+                try:
+                    connection = self._connections.get(key)
+                    if connection is None or not connection.open:
+                        connection = get_db_connection(query.host, query.port, connect_timeout=5)
+                        self._connections[key] = connection
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"KILL QUERY {int(query.thread_id)}")
+                    self.kills += 1
+                    return
+                except Exception as e:
+                    self._connections.pop(key, None)
+                    if attempt:
+                        self.kill_errors += 1
+                        print(f"KILL QUERY {query.thread_id} on {query.host} failed: {str(e)}")
+    def stats(self):
+        with self._cond:
+            return {
+                "in_flight": sum(1 for entry in self._heap if not entry[2].done),
+                "timeouts": dict(self.timeouts),
+                "kills": self.kills,
+                "kill_errors": self.kill_errors
+            }
+watchdog = QueryWatchdog(settings.QUERY_KILL_GRACE_SECONDS)
+class DeadlineMiddleware:
+    """
+    Starts the deadline of each request and, for GET requests, watches the
+    connection so the request's queries are killed when the client disconnects.
+    """
+    def __init__(self, app):
+        self.app = app
+    async def __call__(self, scope, receive, send):
+        seconds = route_deadline(scope["path"]) if scope["type"] == "http" else None
+        if seconds is None:
+            await self.app(scope, receive, send)
+            return
+        request = RequestDeadline(seconds)
+        token = current_deadline.set(request)
+        try:
+            if scope["method"] in ("GET", "HEAD"):
+                await self._call_watching(request, scope, receive, send)
+            else:
+                await self.app(scope, receive, send)
+        finally:
+            current_deadline.reset(token)
+    async def _call_watching(self, request, scope, receive, send):
+        first = await receive()
+        if first["type"] == "http.disconnect":
+            return
+        if first.get("more_body", False):
+            buffered = [first]
+            async def replay():
+                return buffered.pop() if buffered else await receive()
+            await self.app(scope, replay, send)
+            return
+        disconnected = asyncio.Event()
+        async def app_receive():
+            nonlocal first
+            if first is not None:
+                message, first = first, None
+                return message
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+        async def listen():
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    request.cancel("client_disconnect")
+                    disconnected.set()
+                    return
+        listener = asyncio.create_task(listen())
+        try:
+            await self.app(scope, app_receive, send)
+        finally:
+            listener.cancel()
\ No newline at end of file
@@ -0,0 +1,613 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from app.catalogue import CatalogueColumns, GAME_COLUMNS, NO_CODE, bitmap_rows
+from app.changes import Change, change_feed, ensure_change_log, latest_change_id
+from app.config import settings
+from app.database import execute_query
+from app.deadlines import without_deadline
+try:
+    import fcntl
+except ImportError: #Not available on Windows; the shared file is then written without a lock.
+    fcntl = None
+#sort_by value -> (document field, descending)
+SORT_KEYS = {
+    "moby_score": ("overallMobyScore", True),
+    "title": ("Title", False),
+    "critics_score": ("overallCriticsScore", True),
+    "players_score": ("overallPlayersScore", True)
+}
+BASE, OVERLAY = 0, 1
+#Tables whose changes are applied per game; any other change to these, or to Company, triggers a rebuild.
+DOCUMENT_TABLES = frozenset(("game", "gameattributes", "gameplatform", "release"))
+#Every table the store reads.
+STORE_TABLES = DOCUMENT_TABLES | {"company"}
+#Past this many overlay documents (e.g. during a bulk import) a worker rebuilds the base instead of re-reading games.
+_MAX_OVERLAY_GAMES = 5000
+def _fold(title):
+    return (title or "").casefold()
+class GameDocuments:
+    """
+    Denormalized game documents behind the game list, search and filter
+    endpoints and the top-games / top-developers analytics. Each game carries
+    its columns plus its genres, settings, platforms and releases (developer,
+    publisher, year), with bitmaps and postings from every genre / setting /
+    platform / developer / publisher / year to its games, so a filter is an
+    intersection instead of a five-table join.
+    The bulk of the store is a compact, immutable CatalogueColumns base that
+    is written as a snapshot to DOCUMENTS_SHARED_PATH and memory-mapped, so
+    every worker shares one copy. Games touched since the base was built
+    (apply_changes) live in a small overlay of plain dicts that shadows their
+    base row.
+    start() maps the latest snapshot at boot, folds in the games added to the
+    database since it was written, and rebuilds it from a background thread
+    every DOCUMENTS_REBUILD_SECONDS or after invalidate(); a worker maps a
+    snapshot another worker has just written instead of querying again.
+    Between rebuilds, games changed by other processes are re-read one by one
+    from the change feed (apply_changes); a snapshot remembers the ChangeID it
+    was built at, and a worker that maps one re-reads the games changed since
+    (or builds from the database when the log no longer reaches that far).
+    """
+    def __init__(self, rebuild_seconds, shared_path=None):
+        self.rebuild_seconds = rebuild_seconds
+        self.shared_path = shared_path or None
+        self._lock = threading.RLock()
+        self._building = threading.Lock()
+        self._reset()
+        self.built_at = None
+        self.build_seconds = None
+        self.stale = False
+        self.invalidated_at = 0
+        self.delta_rows = 0
+        self.reloaded_games = 0
+        self.change_id = None
+        self.applied_change_id = None
+        self._wake = threading.Event()
+        self._thread = None
+    def _reset(self):
+        self.base = CatalogueColumns.build([], [], [], [], [])
+        self.docs = {}
+        self.shadowed = set()
+        self.companies = {}
+        self._touched = {}
+        self._title_order = None
+    def start(self):
+        """Serve from the latest snapshot right away and keep it current in the background."""
+        if self._thread is None:
+            started = time.monotonic()
+            base, meta = self._map_shared(0)
+            if base is not None:
+                #Only checked here: the change feed starts at the snapshot's ChangeID and replays the rest itself.
+                try:
+                    if self._changes_since(meta) is None:
+                        base = None
+                except Exception as e:
+                    print(f"Game documents snapshot check failed: {str(e)}")
+                    base = None
+            if base is not None:
+                self._swap(base, meta, started)
+                try:
+                    self._apply_deltas(base)
+                except Exception as e:
+                    print(f"Game documents snapshot deltas failed: {str(e)}")
+            self._thread = threading.Thread(target=self._run, name="game-documents", daemon=True)
+            self._thread.start()
+    def _run(self):
+        while True:
+            if self.built_at is not None and not self.stale:
+                self._wake.wait(max(0, self.built_at + self.rebuild_seconds - time.time()))
+            self._wake.clear()
+            try:
+                with self._building:
+                    self.build()
+            except Exception as e:
+                print(f"Game documents rebuild failed: {str(e)}")
+                self._wake.wait(min(60, self.rebuild_seconds))
+    def build(self):
+        """Load the base from the shared snapshot if it is recent enough, otherwise from the database."""
+        started = time.monotonic()
+        since = self.invalidated_at if self.stale else time.time() - self.rebuild_seconds
+        self.stale = False
+        with self._shared_lock():
+            base, meta = self._map_shared(since)
+            changes = None if base is None else self._changes_since(meta)
+            if changes is None:
+                meta = {"database": self._database(), "change_id": self._change_position()}
+                base = self._query()
+                meta["built_at"] = time.time()
+                self._swap(self._write_shared(base, meta), meta, started)
+                return
+        self._swap(base, meta, started)
+        self._apply_deltas(base)
+        #The snapshot may be older than edits this worker had applied; re-read every game changed since.
+        self.apply_changes(changes)
+    def _changes_since(self, meta):
+        """
+        The changes to the store's tables logged after a snapshot was built,
+        one per changed game, or None when the snapshot cannot be brought up to
+        date from the log: it has no ChangeID, the log has been pruned past it,
+        a table-level change needs a rebuild, or more games changed than the
+        overlay holds.
+        """
+        if not settings.CHANGE_FEED_ENABLED:
+            return []
+        change_id = meta.get("change_id")
+        if change_id is None:
+            return None
+        tables = sorted(STORE_TABLES)
+        ensure_change_log()
+        with without_deadline():
+            oldest = execute_query("SELECT MIN(ChangeID) AS ChangeID FROM ChangeLog", fetch_one=True, primary=True, cache=False)
+            if oldest["ChangeID"] is None:
+                #An empty log only proves nothing changed within the retention window.
+                if (meta.get("built_at") or 0) < time.time() - settings.CHANGE_LOG_RETENTION_HOURS * 3600:
+                    return None
+            elif oldest["ChangeID"] > change_id + 1:
+                return None
+            rows = execute_query(
+                f"""
+                SELECT TableName, GameID, MAX(ChangeID) AS ChangeID FROM ChangeLog
+                WHERE ChangeID > %s AND TableName IN ({', '.join(['%s'] * len(tables))})
+                GROUP BY TableName, GameID
+                LIMIT %s
+                """,
+                (change_id, *tables, _MAX_OVERLAY_GAMES + 1),
+                primary=True,
+                cache=False
+            )
+        if len(rows) > _MAX_OVERLAY_GAMES or any(row["GameID"] is None for row in rows):
+            return None
+        return [Change(row["TableName"], game_id=row["GameID"], change_id=row["ChangeID"]) for row in rows]
+    @staticmethod
+    def _change_position():
+        try:
+            return latest_change_id()
+        except Exception as e:
+            print(f"Could not read the change log position: {str(e)}")
+            return None
+    def _swap(self, base, meta, started):
+        with self._lock:
+            #Keep overlay documents written while the base was being built.
+            self.docs = {g: doc for g, doc in self.docs.items() if self._touched[g] > started}
+            self._touched = {g: self._touched[g] for g in self.docs}
+            self.companies = {c: name for c, name in self.companies.items() if base.company_name(c) is None}
+            self.base = base
+            self.shadowed = {row for row in map(base.row_of, self.docs) if row is not None}
+            self._title_order = None
+            self.built_at = meta.get("built_at")
+            self.change_id = meta.get("change_id")
+            if self.change_id is not None and (self.applied_change_id or 0) <= self.change_id:
+                self.applied_change_id = None
+            self.build_seconds = round(time.monotonic() - started, 3)
+    def _query(self):
+        with without_deadline():
+            games = execute_query(f"SELECT {', '.join(GAME_COLUMNS)} FROM Game", cache=False)
+            attributes = execute_query(
+                "SELECT GameID, AttributeType, AttributeName FROM GameAttributes WHERE AttributeType IN ('Genre', 'Setting')",
+                cache=False
+            )
+            platforms = execute_query("SELECT GameID, PlatformName FROM GamePlatform", cache=False)
+            companies = execute_query("SELECT CompanyID, CompanyName, Country FROM Company", cache=False)
+            releases = execute_query(
+                "SELECT GameID, DeveloperCompanyID, PublisherCompanyID, ReleaseDate FROM `Release`",
+                cache=False
+            )
+        return CatalogueColumns.build(games, attributes, platforms, companies, releases)
+    def _apply_deltas(self, base):
+        """
+        Fold games and companies added to the database after a snapshot was
+        written into the overlay (keyed by GameID / CompanyID, so these are
+        primary key range scans that return nothing when the snapshot is current).
+        """
+        last_game = base.game_ids[-1] if len(base) else 0
+        last_company = base.company_ids[-1] if len(base.company_ids) else 0
+        with without_deadline():
+            companies = execute_query(
+                "SELECT CompanyID, CompanyName, Country FROM Company WHERE CompanyID > %s", (last_company,), cache=False
+            )
+            games = execute_query(
+                f"SELECT {', '.join(GAME_COLUMNS)} FROM Game WHERE GameID > %s", (last_game,), cache=False
+            )
+            attributes = execute_query(
+                "SELECT GameID, AttributeType, AttributeName FROM GameAttributes WHERE GameID > %s AND AttributeType IN ('Genre', 'Setting')",
+                (last_game,),
+                cache=False
+            )
+            platforms = execute_query(
+                "SELECT GameID, PlatformName FROM GamePlatform WHERE GameID > %s", (last_game,), cache=False
+            )
+            releases = execute_query(
+                "SELECT GameID, DeveloperCompanyID, PublisherCompanyID, ReleaseDate FROM `Release` WHERE GameID > %s",
+                (last_game,),
+                cache=False
+            )
+        self.apply_rows("Company", companies)
+        self.apply_rows("Game", games)
+        self.apply_rows("GameAttributes", attributes)
+        self.apply_rows("GamePlatform", platforms)
+        self.apply_rows("Release", releases)
+        self.delta_rows = len(companies) + len(games) + len(attributes) + len(platforms) + len(releases)
+    @staticmethod
+    def _database():
+        return f"{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
+    @contextmanager
+    def _shared_lock(self):
+        """Serialize builds across workers so only one of them queries the database."""
+        if self.shared_path is None or fcntl is None:
+            yield
+            return
+        try:
+            lock = open(self.shared_path + ".lock", "a")
+        except OSError:
+            yield
+            return
+        with lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+    def _map_shared(self, since):
+        if self.shared_path is None:
+            return None, None
+        try:
+            if os.path.getmtime(self.shared_path) < since:
+                return None, None
+            base, meta = CatalogueColumns.map(self.shared_path)
+        except (OSError, ValueError):
+            return None, None
+        if meta.get("database") != self._database():
+            return None, None
+        return base, meta
+    def _write_shared(self, base, meta):
+        if self.shared_path is None:
+            return base
+        try:
+            base.write(self.shared_path, meta)
+            return CatalogueColumns.map(self.shared_path)[0]
+        except (OSError, ValueError) as e:
+            print(f"Could not share game documents at {self.shared_path}: {str(e)}")
+            return base
+    def ensure_fresh(self):
+        """
+        Build synchronously on first use; afterwards rebuild in a background
+        thread when stale so requests keep being served from the current store.
+        """
+        if self.built_at is None:
+            with self._building:
+                if self.built_at is None:
+                    self.build()
+            return
+        if self.stale or time.time() - self.built_at > self.rebuild_seconds:
+            if self._building.acquire(blocking=False):
+                threading.Thread(target=self._background_build, daemon=True).start()
+    def _background_build(self):
+        try:
+            self.build()
+        except Exception as e:
+            print(f"Game documents rebuild failed: {str(e)}")
+        finally:
+            self._building.release()
+    def invalidate(self):
+        """Schedule a full rebuild (right away when the background job runs, else on the next request)."""
+        self.invalidated_at = time.time()
+        self.stale = True
+        self._wake.set()
+    def apply_changes(self, changes):
+        """
+        Change feed subscriber: re-read the games other processes changed, rebuild
+        on bulk or company changes, or once the overlay would outgrow _MAX_OVERLAY_GAMES.
+        """
+        game_ids = set()
+        position = None
+        for change in changes:
+            if change.table in STORE_TABLES and change.change_id is not None:
+                position = max(position or 0, change.change_id)
+            if change.table in DOCUMENT_TABLES and change.game_id is not None:
+                game_ids.add(change.game_id)
+            elif change.table in STORE_TABLES:
+                self.invalidate()
+        if len(self.docs) + len(game_ids) > _MAX_OVERLAY_GAMES:
+            self.invalidate()
+        elif game_ids:
+            try:
+                self.reload_games(game_ids)
+            except Exception:
+                #Some of the games may now be out of date; stop labelling the store until it is rebuilt.
+                self.invalidate()
+                raise
+        if position is not None:
+            with self._lock:
+                self.applied_change_id = max(self.applied_change_id or 0, position)
+    def reload_games(self, game_ids):
+        """Replace the documents of the given games with their current rows (dropping deleted games)."""
+        game_ids = sorted(game_ids)
+        for start in range(0, len(game_ids), 500):
+            chunk = tuple(game_ids[start:start + 500])
+            marks = ", ".join(["%s"] * len(chunk))
+            with without_deadline():
+                games = execute_query(
+                    f"SELECT {', '.join(GAME_COLUMNS)} FROM Game WHERE GameID IN ({marks})", chunk, primary=True
+                )
+                attributes = execute_query(
+                    f"SELECT GameID, AttributeType, AttributeName FROM GameAttributes WHERE GameID IN ({marks}) AND AttributeType IN ('Genre', 'Setting')",
+                    chunk,
+                    primary=True
+                )
+                platforms = execute_query(
+                    f"SELECT GameID, PlatformName FROM GamePlatform WHERE GameID IN ({marks})", chunk, primary=True
+                )
+                releases = execute_query(
+                    f"SELECT GameID, DeveloperCompanyID, PublisherCompanyID, ReleaseDate FROM `Release` WHERE GameID IN ({marks})",
+                    chunk,
+                    primary=True
+                )
+            with self._lock:
+                for game_id in chunk:
+                    row = self.base.row_of(game_id)
+                    if row is not None:
+                        self.shadowed.add(row)
+                    self.docs.pop(game_id, None)
+                for game in games:
+                    self.docs[game["GameID"]] = self._new_document(game["GameID"])
+                self.apply_rows("Game", games)
+                self.apply_rows("GameAttributes", attributes)
+                self.apply_rows("GamePlatform", platforms)
+                self.apply_rows("Release", releases)
+                self._title_order = None
+            self.reloaded_games += len(chunk)
+    @staticmethod
+    def _new_document(game_id):
+        doc = dict.fromkeys(GAME_COLUMNS)
+        doc.update(GameID=game_id, Genres=set(), Settings=set(), Platforms=set(), Releases=set())
+        return doc
+    def _document(self, game_id):
+        """The overlay document of a game, copied out of the base on first write."""
+        doc = self.docs.get(game_id)
+        if doc is None:
+            row = self.base.row_of(game_id)
+            if row is not None:
+                doc = self.base.document(row)
+                self.shadowed.add(row)
+            else:
+                doc = self._new_document(game_id)
+            self.docs[game_id] = doc
+        self._touched[game_id] = time.monotonic()
+        self._title_order = None
+        return doc
+    def _company_name(self, company_id):
+        if company_id in self.companies:
+            return self.companies[company_id]
+        return self.base.company_name(company_id)
+    def apply_rows(self, table, rows):
+        """
+        Fold inserted or updated rows of a catalogue table into the documents.
+        Rows of tables the documents do not cover are ignored.
+        """
+        with self._lock:
+            if table == "Game":
+                for row in rows:
+                    self._document(row["GameID"]).update((c, row[c]) for c in GAME_COLUMNS if c in row)
+            elif table == "GameAttributes":
+                for row in rows:
+                    if row["AttributeType"] == "Genre":
+                        self._document(row["GameID"])["Genres"].add(row["AttributeName"])
+                    elif row["AttributeType"] == "Setting":
+                        self._document(row["GameID"])["Settings"].add(row["AttributeName"])
+            elif table == "GamePlatform":
+                for row in rows:
+                    self._document(row["GameID"])["Platforms"].add(row["PlatformName"])
+            elif table == "Company":
+                for row in rows:
+                    if self._company_name(row["CompanyID"]) not in (None, row["CompanyName"]):
+                        self.invalidate() #A rename touches every release of the company.
+                    self.companies[row["CompanyID"]] = row["CompanyName"]
+            elif table == "Release":
+                for row in rows:
+                    released = row.get("ReleaseDate")
+                    if isinstance(released, str):
+                        year = int(released[:4]) if released[:4].isdigit() else None
+                    else:
+                        year = released.year if released is not None else None
+                    self._document(row["GameID"])["Releases"].add((
+                        self._company_name(row.get("DeveloperCompanyID")),
+                        self._company_name(row.get("PublisherCompanyID")),
+                        year
+                    ))
+    def _base_rows(self, rows):
+        return (row for row in rows if row not in self.shadowed)
+    def _sort_value(self, entry, field):
+        kind, ref = entry
+        if kind == BASE:
+            return self.base.sort_value(ref, field)
+        value = self.docs[ref][field]
+        return _fold(value) if field == "Title" else value
+    def _sorted(self, entries, sort_by):
+        field, descending = SORT_KEYS.get(sort_by, SORT_KEYS["moby_score"])
+        if field == "Title":
+            return sorted(entries, key=lambda e: self._sort_value(e, field))
+        #MySQL sorts NULL last in descending order.
+        def key(entry):
+            value = self._sort_value(entry, field)
+            return (value is not None, value or 0)
+        return sorted(entries, key=key, reverse=descending)
+    def _project(self, entry, columns):
+        kind, ref = entry
+        if kind == BASE:
+            return self.base.project(ref, columns)
+        doc = self.docs[ref]
+        return {c: doc[c] for c in columns}
+    def count(self):
+        with self._lock:
+            return len(self.base) - len(self.shadowed) + len(self.docs)
+    def list_games(self, columns, limit):
+        """The first limit games in title order."""
+        with self._lock:
+            if self._title_order is None:
+                self._title_order = sorted(self.docs, key=lambda g: _fold(self.docs[g]["Title"]))
+            folded = self.base.text["folded_title"]
+            merged = heapq.merge(
+                ((folded[row], BASE, row) for row in self._base_rows(self.base.title_order)),
+                ((_fold(self.docs[g]["Title"]), OVERLAY, g) for g in self._title_order)
+            )
+            return [self._project((kind, ref), columns) for _, kind, ref in itertools.islice(merged, limit)]
+    def search(self, text, columns, limit):
+        """Games whose title contains text (case-insensitive), in title order."""
+        needle = text.casefold()
+        with self._lock:
+            matches = [(BASE, row) for row in self._base_rows(self.base.text["folded_title"].find_rows(needle.encode("utf-8")))]
+            matches.extend((OVERLAY, g) for g, doc in self.docs.items() if needle in _fold(doc["Title"]))
+            return [self._project(e, columns) for e in self._sorted(matches, "title")[:limit]]
+    def filter(self, columns, sort_by, limit=None, genre=None, platform=None, publisher=None, developer=None, year=None):
+        """
+        Games matching every given criterion. Developer, publisher and year
+        must all hold for the same release, as in the equivalent SQL join.
+        """
+        with self._lock:
+            ordered = self._sorted(self._matches(genre=genre, platform=platform, publisher=publisher, developer=developer, year=year), sort_by)
+            if limit:
+                ordered = ordered[:limit]
+            return [self._project(e, columns) for e in ordered]
+    def top(self, score_column, count_column, columns, limit, genre=None, setting=None, year=None):
+        """
+        Games with a score_column value, best first (ties broken by
+        count_column when given), optionally within a genre / setting / release year.
+        """
+        with self._lock:
+            scored = []
+            for entry in self._matches(genre=genre, setting=setting, year=year):
+                score = self._sort_value(entry, score_column)
+                if score is not None:
+                    count = self._sort_value(entry, count_column) if count_column else None
+                    scored.append(((score, count is not None, count or 0), entry))
+            scored.sort(key=lambda item: item[0], reverse=True)
+            return [self._project(entry, columns) for _, entry in scored[:limit]]
+    def top_developers(self, genre, limit):
+        """
+        The top-developers ranking, read from the snapshot's pre-aggregated table.
+        The table only holds the leading groups of the base, so once the overlay
+        has changed games or companies the ranking is recomputed in SQL instead
+        (until the next rebuild folds the overlay back into the base).
+        SQL: SUM(critics score * count) / SUM(count) per CompanyName, Country over
+        distinct (GameID, DeveloperCompanyID) releases, optionally within a genre
+        """
+        with self._lock:
+            if not self.docs and not self.shadowed and not self.companies:
+                return self.base.developer_ranking(genre, limit)
+        genre_join = "JOIN GameAttributes ga ON g.GameID = ga.GameID AND ga.AttributeType = 'Genre' AND ga.AttributeName = %s" if genre else ""
+        rows = execute_query(
+            f"""
+            SELECT c.CompanyName, c.Country,
+                SUM(g.overallCriticsScore * g.overallCriticsCount) / SUM(g.overallCriticsCount) AS AvgCriticsScore,
+                COUNT(DISTINCT g.GameID) AS GameCount
+            FROM Game g
+            {genre_join}
+            JOIN (SELECT DISTINCT GameID, DeveloperCompanyID FROM `Release`) r ON g.GameID = r.GameID
+            JOIN Company c ON r.DeveloperCompanyID = c.CompanyID
+            GROUP BY c.CompanyName, c.Country
+            ORDER BY AvgCriticsScore DESC, GameCount DESC
+            LIMIT %s
+            """,
+            (genre, limit) if genre else (limit,)
+        )
+        return [
+            dict(row, AvgCriticsScore=None if row["AvgCriticsScore"] is None else round(row["AvgCriticsScore"], 4))
+            for row in rows
+        ]
+    def _matches(self, genre=None, setting=None, platform=None, publisher=None, developer=None, year=None):
+        entries = [(BASE, row) for row in self._filter_base(genre, setting, platform, publisher, developer, year)]
+        entries.extend(
+            (OVERLAY, g) for g, doc in self.docs.items()
+            if (not genre or genre in doc["Genres"])
+            and (not setting or setting in doc["Settings"])
+            and (not platform or platform in doc["Platforms"])
+            and (not (developer or publisher or year) or self._release_match(doc, developer, publisher, year))
+        )
+        return entries
+    def _filter_base(self, genre, setting, platform, publisher, developer, year):
+        base = self.base
+        mask = None
+        for value, terms, name in ((genre, base.genres, "genre"), (setting, base.settings, "setting"), (platform, base.platforms, "platform")):
+            if value:
+                bitmap = base.bitmaps[name].any_of(terms.codes.get(value, ()))
+                mask = bitmap if mask is None else mask & bitmap
+        if year:
+            code = base.year_codes.get(year)
+            bitmap = base.bitmaps["year"][code] if code is not None else 0
+            mask = bitmap if mask is None else mask & bitmap
+        developers = set(base.companies.codes.get(developer, ())) if developer else None
+        publishers = set(base.companies.codes.get(publisher, ())) if publisher else None
+        postings = []
+        for codes, name in ((developers, "developer_rows"), (publishers, "publisher_rows")):
+            if codes is not None:
+                rows = set()
+                for code in codes:
+                    rows.update(base.postings[name][code])
+                postings.append(rows)
+        if mask is not None:
+            postings.append(bitmap_rows(mask, base.bitmaps["genre"].width))
+        if postings:
+            postings.sort(key=len)
+            matches = sorted(set(postings[0]).intersection(*postings[1:]))
+        else:
+            matches = range(len(base))
+        if developer or publisher or year:
+            matches = [row for row in matches if self._base_release_match(row, developers, publishers, year)]
+        return self._base_rows(matches)
+    def _base_release_match(self, row, developers, publishers, year):
+        for release_developer, release_publisher, release_year in self.base.releases(row):
+            if (developers is not None or publishers is not None) and (release_developer == NO_CODE or release_publisher == NO_CODE):
+                continue
+            if developers is not None and release_developer not in developers:
+                continue
+            if publishers is not None and release_publisher not in publishers:
+                continue
+            if year and release_year != year:
+                continue
+            return True
+        return False
+    @staticmethod
+    def _release_match(doc, developer, publisher, year):
+        for release_developer, release_publisher, release_year in doc["Releases"]:
+            if (developer or publisher) and (release_developer is None or release_publisher is None):
+                continue
+            if developer and release_developer != developer:
+                continue
+            if publisher and release_publisher != publisher:
+                continue
+            if year and release_year != year:
+                continue
+            return True
+        return False
+    def version(self):
+        """
+        Position of the data served, for ETags: the snapshot's build time and
+        ChangeID plus the last ChangeID applied to the overlay. None while the
+        store is not built, is stale, or the change feed may hold changes to
+        its tables that it has not applied yet.
+        """
+        if self.built_at is None or self.stale or not change_feed.settled(STORE_TABLES):
+            return None
+        with self._lock:
+            return self.built_at, self.change_id, self.applied_change_id
+    def stats(self):
+        with self._lock:
+            return {
+                "games": len(self.base) - len(self.shadowed) + len(self.docs),
+                "base_games": len(self.base),
+                "overlay_games": len(self.docs),
+                "snapshot_path": self.shared_path,
+                "delta_rows": self.delta_rows,
+                "reloaded_games": self.reloaded_games,
+                "change_id": self.change_id,
+                "applied_change_id": self.applied_change_id,
+                "genres": len(self.base.genres),
+                "platforms": len(self.base.platforms),
+                "companies": len(self.base.companies),
+                "column_bytes": self.base.nbytes(),
+                "shared": self.base.source is not None,
+                "built_at": self.built_at,
+                "build_seconds": self.build_seconds,
+                "stale": self.stale
+            }
+game_documents = GameDocuments(settings.DOCUMENTS_REBUILD_SECONDS, settings.DOCUMENTS_SHARED_PATH)
\ No newline at end of file
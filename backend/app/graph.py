@@ -0,0 +1,270 @@
+import heapq
+import threading
+import time
+from app.changes import change_feed
+from app.config import settings
+from app.database import execute_query
+from app.deadlines import without_deadline
+GRAPH_TABLES = frozenset(("person", "gamepersoncredits", "game", "release", "company"))
+#Tables whose per-game changes are applied as deltas; Person / Company changes rename nodes and rebuild.
+GAME_EDGE_TABLES = frozenset(("gamepersoncredits", "game", "release"))
+#Past this many changed games in one batch (e.g. a bulk import) a rebuild is cheaper than deltas.
+_MAX_DELTA_GAMES = 5000
+class CreditsGraph:
+    """
+    In-memory person <-> game <-> developer graph behind /top-directors and
+    /top-collaborations.
+    Built once from GamePersonCredits and Release and rebuilt in the
+    background every GRAPH_REBUILD_SECONDS. In between, change feed entries
+    carrying a GameID are applied incrementally: the game's edges are removed
+    and its current credits and releases re-added with add_credit /
+    add_release. Other changes to the graph's tables schedule a rebuild.
+    """
+    def __init__(self, rebuild_seconds):
+        self.rebuild_seconds = rebuild_seconds
+        self._lock = threading.RLock()
+        self._building = threading.Lock()
+        self._reset()
+        self.built_at = None
+        self.build_seconds = None
+        self.stale = False
+        self.applied_change_id = None
+    def _reset(self):
+        self.people = {}
+        self.titles = {}
+        self.developers = {}
+        self.person_games = {}
+        self.game_people = {}
+        self.game_developers = {}
+        self.pair_games = {}
+    def build(self):
+        """Load the whole graph from the database (two queries)."""
+        started = time.monotonic()
+        self.stale = False
+        credits_query = """
+            SELECT p.PersonID, p.Name, g.GameID, g.Title
+            FROM Person p
+            JOIN GamePersonCredits gpc ON p.PersonID = gpc.PersonID
+            JOIN Game g ON gpc.GameID = g.GameID
+        """
+        releases_query = """
+            SELECT DISTINCT r.GameID, c.CompanyID, c.CompanyName
+            FROM `Release` r
+            JOIN Company c ON r.DeveloperCompanyID = c.CompanyID
+        """
+        #The first build can run inside a request; it serves everyone, so it is not cut short by that request's deadline.
+        with without_deadline():
+            credits = execute_query(credits_query, cache=False)
+            releases = execute_query(releases_query, cache=False)
+        graph = CreditsGraph(self.rebuild_seconds)
+        for row in releases:
+            graph.add_release(row['GameID'], row['CompanyID'], row['CompanyName'])
+        for row in credits:
+            graph.add_credit(row['PersonID'], row['Name'], row['GameID'], row['Title'])
+        with self._lock:
+            self.people = graph.people
+            self.titles = graph.titles
+            self.developers = graph.developers
+            self.person_games = graph.person_games
+            self.game_people = graph.game_people
+            self.game_developers = graph.game_developers
+            self.pair_games = graph.pair_games
+            self.built_at = time.time()
+            self.applied_change_id = None
+            self.build_seconds = round(time.monotonic() - started, 3)
+    def ensure_fresh(self):
+        """
+        Build synchronously on first use; afterwards refresh in a background
+        thread when stale so requests keep being served from the old graph.
+        """
+        if self.built_at is None:
+            with self._building:
+                if self.built_at is None:
+                    self.build()
+            return
+        if self.stale or time.time() - self.built_at > self.rebuild_seconds:
+            if self._building.acquire(blocking=False):
+                threading.Thread(target=self._background_build, daemon=True).start()
+    def _background_build(self):
+        try:
+            self.build()
+        except Exception as e:
+            print(f"Credits graph rebuild failed: {str(e)}")
+        finally:
+            self._building.release()
+    def invalidate(self):
+        """Schedule a full rebuild on the next request."""
+        self.stale = True
+    def apply_changes(self, changes):
+        """Change feed subscriber: re-read the games another process changed, rebuild on any other graph table change."""
+        game_ids = set()
+        position = None
+        for change in changes:
+            if change.table in GRAPH_TABLES and change.change_id is not None:
+                position = max(position or 0, change.change_id)
+            if change.table in GAME_EDGE_TABLES and change.game_id is not None:
+                game_ids.add(change.game_id)
+            elif change.table in GRAPH_TABLES:
+                self.invalidate()
+        if not game_ids or self.built_at is None:
+            return
+        if len(game_ids) > _MAX_DELTA_GAMES or self._building.locked():
+            #A build in flight may have read the games before they changed; build again after it.
+            self.invalidate()
+            return
+        try:
+            self.refresh_games(game_ids)
+        except Exception:
+            #Some of the games may now be out of date; stop labelling the graph until it is rebuilt.
+            self.invalidate()
+            raise
+        if position is not None:
+            with self._lock:
+                self.applied_change_id = max(self.applied_change_id or 0, position)
+    def refresh_games(self, game_ids):
+        """Replace the edges of the given games with their current credits and releases (two queries per 500 games)."""
+        game_ids = sorted(game_ids)
+        for start in range(0, len(game_ids), 500):
+            chunk = tuple(game_ids[start:start + 500])
+            marks = ", ".join(["%s"] * len(chunk))
+            with without_deadline():
+                credits = execute_query(
+                    f"""
+                    SELECT p.PersonID, p.Name, g.GameID, g.Title
+                    FROM Person p
+                    JOIN GamePersonCredits gpc ON p.PersonID = gpc.PersonID
+                    JOIN Game g ON gpc.GameID = g.GameID
+                    WHERE gpc.GameID IN ({marks})
+                    """,
+                    chunk,
+                    primary=True,
+                    cache=False
+                )
+                releases = execute_query(
+                    f"""
+                    SELECT DISTINCT r.GameID, c.CompanyID, c.CompanyName
+                    FROM `Release` r
+                    JOIN Company c ON r.DeveloperCompanyID = c.CompanyID
+                    WHERE r.GameID IN ({marks})
+                    """,
+                    chunk,
+                    primary=True,
+                    cache=False
+                )
+            with self._lock:
+                for game_id in chunk:
+                    self.remove_game(game_id)
+                for row in releases:
+                    self.add_release(row['GameID'], row['CompanyID'], row['CompanyName'])
+                for row in credits:
+                    self.add_credit(row['PersonID'], row['Name'], row['GameID'], row['Title'])
+    def add_credit(self, person_id, name, game_id, title):
+        with self._lock:
+            self.people[person_id] = name
+            self.titles[game_id] = title
+            self.person_games.setdefault(person_id, set()).add(game_id)
+            self.game_people.setdefault(game_id, set()).add(person_id)
+            for company_id in self.game_developers.get(game_id, ()):
+                self.pair_games.setdefault((name, self.developers[company_id]), set()).add(game_id)
+    def add_release(self, game_id, company_id, company_name):
+        with self._lock:
+            self.developers[company_id] = company_name
+            self.game_developers.setdefault(game_id, set()).add(company_id)
+            for person_id in self.game_people.get(game_id, ()):
+                self.pair_games.setdefault((self.people[person_id], company_name), set()).add(game_id)
+    def remove_game(self, game_id):
+        """Drop a game and all its credit, release and collaboration edges."""
+        with self._lock:
+            people = self.game_people.pop(game_id, set())
+            companies = self.game_developers.pop(game_id, set())
+            self.titles.pop(game_id, None)
+            for person_id in people:
+                games = self.person_games.get(person_id)
+                if games is not None:
+                    games.discard(game_id)
+                    if not games:
+                        del self.person_games[person_id]
+                for company_id in companies:
+                    pair = (self.people[person_id], self.developers[company_id])
+                    games = self.pair_games.get(pair)
+                    if games is not None:
+                        games.discard(game_id)
+                        if not games:
+                            del self.pair_games[pair]
+    def _titles(self, game_ids, offset, limit):
+        titles = sorted({self.titles[g] for g in game_ids if g in self.titles})
+        return titles[offset:offset + limit], len(titles)
+    def top_directors(self, k, games_limit):
+        """Top k people by number of distinct games, with the first page of titles."""
+        with self._lock:
+            top = heapq.nlargest(
+                k,
+                self.person_games.items(),
+                key=lambda item: len(item[1])
+            )
+            rows = []
+            for person_id, games in top:
+                titles, total = self._titles(games, 0, games_limit)
+                rows.append({
+                    "PersonID": person_id,
+                    "DirectorName": self.people[person_id],
+                    "GameCount": len(games),
+                    "Games": titles,
+                    "GamesTotal": total
+                })
+            return rows
+    def top_collaborations(self, k, games_limit):
+        """Top k (director, developer) pairs by number of games made together."""
+        with self._lock:
+            top = heapq.nlargest(
+                k,
+                self.pair_games.items(),
+                key=lambda item: len(item[1])
+            )
+            rows = []
+            for (director, developer), games in top:
+                titles, total = self._titles(games, 0, games_limit)
+                rows.append({
+                    "DirectorName": director,
+                    "DeveloperName": developer,
+                    "CollaborationCount": len(games),
+                    "Games": titles,
+                    "GamesTotal": total
+                })
+            return rows
+    def person_titles(self, person_id, offset, limit):
+        """A page of a person's game titles, or None if the person has no credits."""
+        with self._lock:
+            games = self.person_games.get(person_id)
+            if games is None:
+                return None
+            return self._titles(games, offset, limit)
+    def pair_titles(self, director, developer, offset, limit):
+        """A page of titles for a director/developer pair, or None if they never worked together."""
+        with self._lock:
+            games = self.pair_games.get((director, developer))
+            if games is None:
+                return None
+            return self._titles(games, offset, limit)
+    def version(self):
+        """
+        Position of the graph served, for ETags: its build time plus the last
+        ChangeID applied since. None while it is not built, is stale, or the
+        change feed may hold changes to its tables that it has not applied yet.
+        """
+        if self.built_at is None or self.stale or not change_feed.settled(GRAPH_TABLES):
+            return None
+        with self._lock:
+            return self.built_at, self.applied_change_id
+    def stats(self):
+        with self._lock:
+            return {
+                "people": len(self.person_games),
+                "games": len(self.titles),
+                "pairs": len(self.pair_games),
+                "built_at": self.built_at,
+                "build_seconds": self.build_seconds,
+                "applied_change_id": self.applied_change_id,
+                "stale": self.stale
+            }
+credits_graph = CreditsGraph(settings.GRAPH_REBUILD_SECONDS)
\ No newline at end of file
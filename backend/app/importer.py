@@ -0,0 +1,276 @@
+"""
+Bulk catalogue import.
+Streams CSV / JSON dumps into the catalogue tables in fixed-size chunks, one
+transaction per chunk, checkpointing after every commit so an interrupted
+run resumes where it stopped. Tables are loaded in dependency tiers; tables
+within a tier load in parallel on their own connections.
+Usage:
+    python -m app.importer Game=dumps/game.csv Release=dumps/release.jsonl
+    python -m app.importer --load-data --parallel 4 Company=company.csv Person=person.csv
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.cache import invalidate_tables
+from app.changes import Change, ensure_change_log, record_changes
+from app.database import get_db_connection
+#Tables are loaded tier by tier so foreign keys always point at rows that already exist.
+IMPORT_TIERS = (
+    ("Company", "Person", "Game"),
+    ("GamePlatform", "GameAttributes", "GamePersonCredits"),
+    ("Release", "MaturityRating_GamePlatform")
+)
+IMPORT_TABLES = tuple(table for tier in IMPORT_TIERS for table in tier)
+_IDENTIFIER = re.compile(r"^\w+$")
+_JSON_CHUNK = 1 << 16
+def _iter_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            yield {key: (value if value != "" else None) for key, value in row.items()}
+def _iter_json(path):
+    """
+    Stream objects from a JSON Lines file or a top-level JSON array without loading it whole.
+    Objects are decoded in place at a position in the buffer; consumed text is
+    dropped only when the next chunk is read, so each character is copied once.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buffer = ""
+        pos = 0
+        started = False
+        while True:
+            chunk = f.read(_JSON_CHUNK)
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            while True:
+                while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                    pos += 1
+                if not started and buffer.startswith("[", pos):
+                    pos += 1
+                    started = True
+                    continue
+                if pos == len(buffer) or buffer.startswith("]", pos):
+                    break
+                try:
+                    obj, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if not chunk:
+                        raise
+                    break
+                yield obj
+                pos = end
+            if not chunk:
+                return
+def iter_rows(path):
+    """Rows of a dump file as dicts, by extension: .csv, .json, .jsonl or .ndjson."""
+    if path.lower().endswith(".csv"):
+        return _iter_csv(path)
+    return _iter_json(path)
+class Checkpoint:
+    """
+    JSON file recording how many rows of each (table, file) were committed.
+    A checkpoint only applies while the file keeps the same size and mtime.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._state = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._state = json.load(f)
+    @staticmethod
+    def _key(table, source):
+        return f"{table}:{os.path.abspath(source)}"
+    @staticmethod
+    def _signature(source):
+        stat = os.stat(source)
+        return [stat.st_size, int(stat.st_mtime)]
+    def committed(self, table, source):
+        entry = self._state.get(self._key(table, source))
+        if entry and entry["signature"] == self._signature(source):
+            return entry["rows"]
+        return 0
+    def save(self, table, source, rows):
+        if not self.path:
+            return
+        with self._lock:
+            self._state[self._key(table, source)] = {"rows": rows, "signature": self._signature(source)}
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix=".checkpoint-")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._state, f)
+            os.replace(tmp, self.path)
+def _columns(row, table):
+    columns = list(row.keys())
+    bad = [c for c in columns if not _IDENTIFIER.match(c or "")]
+    if bad:
+        raise ValueError(f"Invalid column names for {table}: {', '.join(map(str, bad))}")
+    return columns
+def _upsert_statement(table, columns):
+    names = ", ".join(f"`{c}`" for c in columns)
+    placeholders = ", ".join(["%s"] * len(columns))
+    updates = ", ".join(f"`{c}` = VALUES(`{c}`)" for c in columns)
+    return f"INSERT INTO `{table}` ({names}) VALUES ({placeholders}) ON DUPLICATE KEY UPDATE {updates}"
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+def import_file(table, source, checkpoint, batch_size=1000, transaction_rows=10000, load_data=False):
+    """
+    Load one dump file into a table and return the number of rows written.
+    Every transaction_rows rows are committed (sent as executemany batches of
+    batch_size, or as one LOAD DATA LOCAL INFILE per chunk for CSV with
+    load_data=True) and recorded in the checkpoint.
+    """
+    if table not in IMPORT_TABLES:
+        raise ValueError(f"Unsupported table {table}. Allowed: {', '.join(IMPORT_TABLES)}")
+    skip = checkpoint.committed(table, source)
+    done = skip
+    rows = iter_rows(source)
+    for _ in range(skip):
+        if next(rows, None) is None:
+            break
+    use_load_data = load_data and source.lower().endswith(".csv")
+    connection = get_db_connection(local_infile=use_load_data)
+    started = time.monotonic()
+    try:
+        statement = None
+        columns = None
+        with connection.cursor() as cursor:
+            for chunk in _chunks(rows, transaction_rows):
+                if columns is None:
+                    columns = _columns(chunk[0], table)
+                    statement = _upsert_statement(table, columns)
+                connection.begin()
+                if use_load_data:
+                    _load_chunk(cursor, table, columns, chunk)
+                else:
+                    for batch in _chunks(chunk, batch_size):
+                        cursor.executemany(statement, [tuple(row.get(c) for c in columns) for row in batch])
+                record_changes(cursor, chunk_changes(table, chunk))
+                connection.commit()
+                done += len(chunk)
+                checkpoint.save(table, source, done)
+                print(f"{table}: {done} rows committed ({time.monotonic() - started:.1f}s)")
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    return done - skip
+def _csv_field(value):
+    if value is None:
+        return "NULL"
+    return '"' + str(value).replace('"', '""') + '"'
+def _load_chunk(cursor, table, columns, chunk):
+    """
+    Bulk load a chunk with LOAD DATA LOCAL INFILE into a temporary staging
+    table, then upsert it into the real table. Staging avoids REPLACE, which
+    would delete (and cascade) existing rows instead of updating them.
+    """
+    staging = f"import_{table}"
+    names = ", ".join(f"`{c}`" for c in columns)
+    updates = ", ".join(f"`{c}` = VALUES(`{c}`)" for c in columns)
+    fd, path = tempfile.mkstemp(suffix=".csv", prefix=f"import-{table}-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for row in chunk:
+                f.write(",".join(_csv_field(row.get(c)) for c in columns) + "\n")
+        cursor.execute(f"CREATE TEMPORARY TABLE IF NOT EXISTS `{staging}` LIKE `{table}`")
+        cursor.execute(f"DELETE FROM `{staging}`")
+        cursor.execute(
+            f"""
+            LOAD DATA LOCAL INFILE %s INTO TABLE `{staging}`
+            CHARACTER SET utf8mb4
+            FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"' ESCAPED BY ''
+            LINES TERMINATED BY '\\n'
+            ({names})
+            """,
+            (path,)
+        )
+        cursor.execute(f"INSERT INTO `{table}` ({names}) SELECT {names} FROM `{staging}` ON DUPLICATE KEY UPDATE {updates}")
+    finally:
+        os.remove(path)
+def chunk_changes(table, chunk):
+    """ChangeLog entries for an imported chunk: one per game for tables keyed by GameID, else one for the table."""
+    game_ids = {int(row["GameID"]) for row in chunk if row.get("GameID") is not None}
+    if not game_ids:
+        return [Change(table)]
+    return [Change(table, game_id=game_id) for game_id in sorted(game_ids)]
+def after_import(tables):
+    """
+    Drop everything derived from the imported tables in this process: cached
+    query results, the credits graph, the game documents and the
+    recommendation index. Serving workers pick the import up from the
+    ChangeLog rows written with every chunk.
+    """
+    from app.documents import game_documents
+    from app.graph import credits_graph
+    from app.recommendations import recommender
+    invalidate_tables(*tables)
+    credits_graph.invalidate()
+    game_documents.invalidate()
+    recommender.refresh_soon()
+def run_import(sources, checkpoint_path=None, parallel=4, batch_size=1000, transaction_rows=10000, load_data=False):
+    """
+    Import {table: [files]} tier by tier, tables within a tier in parallel.
+    Returns {table: rows written}.
+    """
+    unknown = sorted(set(sources).difference(IMPORT_TABLES))
+    if unknown:
+        raise ValueError(f"Unsupported tables: {', '.join(unknown)}. Allowed: {', '.join(IMPORT_TABLES)}")
+    ensure_change_log()
+    checkpoint = Checkpoint(checkpoint_path)
+    written = {}
+    def load_table(table):
+        total = 0
+        for source in sources[table]:
+            total += import_file(table, source, checkpoint, batch_size, transaction_rows, load_data)
+        return table, total
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+        for tier in IMPORT_TIERS:
+            tables = [table for table in tier if table in sources]
+            for table, total in executor.map(load_table, tables):
+                written[table] = total
+    after_import(list(written))
+    return written
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import catalogue dumps into the FaresGames database")
+    parser.add_argument("sources", nargs="+", metavar="TABLE=FILE", help=f"Dump files; tables: {', '.join(IMPORT_TABLES)}")
+    parser.add_argument("--checkpoint", default="import.checkpoint.json", help="Checkpoint file used to resume (default: %(default)s)")
+    parser.add_argument("--parallel", type=int, default=4, help="Tables loaded concurrently within a tier")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per executemany batch")
+    parser.add_argument("--transaction-rows", type=int, default=10000, help="Rows per transaction / checkpoint")
+    parser.add_argument("--load-data", action="store_true", help="Use LOAD DATA LOCAL INFILE for CSV files")
+    args = parser.parse_args(argv)
+    sources = {}
+    for item in args.sources:
+        table, sep, path = item.partition("=")
+        if not sep or not path:
+            parser.error(f"Expected TABLE=FILE, got {item}")
+        sources.setdefault(table, []).append(path)
+    started = time.monotonic()
+    written = run_import(
+        sources,
+        checkpoint_path=args.checkpoint,
+        parallel=args.parallel,
+        batch_size=args.batch_size,
+        transaction_rows=args.transaction_rows,
+        load_data=args.load_data
+    )
+    for table, total in written.items():
+        print(f"{table}: {total} rows")
+    print(f"Import finished in {time.monotonic() - started:.1f}s")
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,340 @@
+import asyncio
+import gzip
+import hashlib
+import time
+from urllib.parse import parse_qsl
+from app.cache import dataset_version
+from app.config import settings
+from app.database import StickySession, current_session, replicas
+from app.documents import game_documents
+from app.graph import credits_graph
+from app.ratelimit import ADMISSION_RELEASE, BATCH_SUBREQUEST, admission
+from app.security import read_token, sign_payload
+try:
+    import brotli
+except ImportError:
+    brotli = None
+CATALOGUE_TABLES = (
+    "game", "gameplatform", "gameattributes", "gameplatformattributes_specs", "release",
+    "company", "person", "gamepersoncredits", "platform", "attribute", "maturityrating_gameplatform"
+)
+#Route prefixes whose GET responses get ETags, and the tables their data comes from
+#(the longest matching prefix wins).
+ETAG_ROUTES = {
+    "/api/games": CATALOGUE_TABLES,
+    "/api/metadata": CATALOGUE_TABLES,
+    "/api/analytics": CATALOGUE_TABLES,
+    "/api/analytics/rating-activity": ("ratingactivityhourly", "ratingactivitydaily")
+}
+#Routes whose window defaults to "now" unless this parameter is given (matched like ETAG_ROUTES):
+#without it the body moves with the clock, so it gets no ETag.
+CLOCK_PARAMS = {
+    "/api/analytics/rating-activity": "end"
+}
+#Routes served from an in-memory store (matched like ETAG_ROUTES, checked first): their ETags
+#follow the store's own position, which only moves once the store has applied a change.
+STORE_ROUTES = {
+    "/api/games/": game_documents,
+    "/api/games/search": game_documents,
+    "/api/games/filter/by-criteria": game_documents,
+    "/api/analytics/top-games": game_documents,
+    "/api/analytics/top-games-by-moby": game_documents,
+    "/api/analytics/top-developers": game_documents,
+    "/api/analytics/top-directors": credits_graph,
+    "/api/analytics/top-collaborations": credits_graph
+}
+_COMPRESSIBLE_TYPES = ("application/json", "text/")
+_ENCODING_SUFFIXES = ("-br", "-gzip")
+def _header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+def _accepted_encodings(accept_encoding):
+    """Parse Accept-Encoding into the set of codings with a non-zero q-value."""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding and q > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+class ConditionalGetMiddleware:
+    """
+    Strong ETags for read-only catalogue routes, derived from the dataset
+    version (the last ChangeID of each table plus the cache TTL epoch) and the
+    request URL rather than from the response body. A matching If-None-Match
+    is answered with 304 before the route runs, so revalidation costs no
+    database work. The version is shared by every worker, so any of them can
+    revalidate a tag another one issued; while it is unknown (the change feed
+    is off or catching up) responses carry no ETag.
+    Routes served from the game documents or the credits graph use the
+    store's version() instead, so a tag never outruns the data it labels.
+    Routes listed in CLOCK_PARAMS only get an ETag for a fixed window.
+    """
+    def __init__(self, app):
+        self.app = app
+    @staticmethod
+    def _match(routes, path):
+        matches = [prefix for prefix in routes if path == prefix or path.startswith(prefix + "/")]
+        return routes[max(matches, key=len)] if matches else None
+    def _version(self, scope):
+        path = scope["path"]
+        clock_param = self._match(CLOCK_PARAMS, path)
+        if clock_param is not None:
+            params = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True))
+            if not params.get(clock_param):
+                return None
+        store = self._match(STORE_ROUTES, path)
+        if store is not None:
+            return store.version()
+        tables = self._match(ETAG_ROUTES, path)
+        return None if tables is None else dataset_version(tables)
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        version = self._version(scope)
+        if version is None:
+            await self.app(scope, receive, send)
+            return
+        digest = hashlib.blake2b(digest_size=10)
+        digest.update(repr(version).encode())
+        digest.update(scope["path"].encode())
+        digest.update(b"?" + scope.get("query_string", b""))
+        etag = f'"{digest.hexdigest()}"'
+        if_none_match = _header(scope, b"if-none-match")
+        if if_none_match:
+            for candidate in if_none_match.split(","):
+                candidate = candidate.strip()
+                if candidate.startswith("W/"):
+                    candidate = candidate[2:]
+                base = candidate
+                for suffix in _ENCODING_SUFFIXES:
+                    if candidate.endswith(suffix + '"'):
+                        base = candidate[:-len(suffix) - 1] + '"'
+                if candidate == "*" or base == etag:
+                    await send({
+                        "type": "http.response.start",
+                        "status": 304,
+                        "headers": [
+                            (b"etag", (etag if candidate == "*" else candidate).encode()),
+                            (b"cache-control", b"no-cache"),
+                            (b"vary", b"Accept-Encoding")
+                        ]
+                    })
+                    await send({"type": "http.response.body", "body": b""})
+                    return
+        async def send_with_etag(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                headers = [(k, v) for k, v in message.get("headers", []) if k != b"etag"]
+                headers.append((b"etag", etag.encode()))
+                headers.append((b"cache-control", b"no-cache"))
+                message = {**message, "headers": headers}
+            await send(message)
+        await self.app(scope, receive, send_with_etag)
+class CompressionMiddleware:
+    """
+    Negotiates brotli (when the brotli package is installed) or gzip for
+    responses of at least COMPRESSION_MIN_SIZE bytes. Strong ETags get a
+    coding suffix so each representation keeps its own validator.
+    """
+    def __init__(self, app, minimum_size=None):
+        self.app = app
+        self.minimum_size = settings.COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accepted = _accepted_encodings(_header(scope, b"accept-encoding"))
+        if brotli is not None and "br" in accepted:
+            coding = "br"
+        elif "gzip" in accepted:
+            coding = "gzip"
+        else:
+            await self.app(scope, receive, send)
+            return
+        start = None
+        passthrough = False
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            body = message.get("body", b"")
+            headers = start.get("headers", [])
+            content_type = next((v.decode("latin-1") for k, v in headers if k == b"content-type"), "")
+            if (message.get("more_body", False)
+                    or len(body) < self.minimum_size
+                    or any(k == b"content-encoding" for k, v in headers)
+                    or not content_type.startswith(_COMPRESSIBLE_TYPES)):
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+            if coding == "br":
+                body = brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)
+            else:
+                body = gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL)
+            new_headers = []
+            for key, value in headers:
+                if key == b"content-length":
+                    continue
+                if key == b"etag" and value.endswith(b'"') and not value.startswith(b"W/"):
+                    value = value[:-1] + f'-{coding}"'.encode()
+                new_headers.append((key, value))
+            new_headers.append((b"content-encoding", coding.encode()))
+            new_headers.append((b"content-length", str(len(body)).encode()))
+            new_headers.append((b"vary", b"Accept-Encoding"))
+            await send({**start, "headers": new_headers})
+            await send({"type": "http.response.body", "body": body})
+        await self.app(scope, receive, send_compressed)
+READ_YOUR_WRITES_HEADER = "X-Read-Your-Writes"
+class ReadYourWritesMiddleware:
+    """
+    Carries read-your-writes across workers. A request that writes under a
+    sticky key gets back a signed X-Read-Your-Writes token naming the key,
+    valid for DB_STICKY_SECONDS; the client sends it with its next requests,
+    and whichever worker serves them reads that key from the primary. Only
+    active when read replicas are configured.
+    """
+    def __init__(self, app):
+        self.app = app
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not replicas.replicas:
+            await self.app(scope, receive, send)
+            return
+        payload = read_token(_header(scope, READ_YOUR_WRITES_HEADER.lower().encode()))
+        session = StickySession(payload.get("rw") if payload else None)
+        async def send_with_token(message):
+            if message["type"] == "http.response.start" and session.written is not None:
+                token = sign_payload({"rw": session.written, "exp": int(time.time() + settings.DB_STICKY_SECONDS)})
+                message = {**message, "headers": [*message.get("headers", []), (READ_YOUR_WRITES_HEADER.lower().encode(), token.encode())]}
+            await send(message)
+        reset = current_session.set(session)
+        try:
+            await self.app(scope, receive, send_with_token)
+        finally:
+            current_session.reset(reset)
+#GET routes whose responses depend only on path and query string, safe to share between clients.
+COALESCE_ROUTES = tuple(ETAG_ROUTES) + ("/api/recommendations/games",)
+class _Flight:
+    """One shared run: its result, the clients still waiting for it, and whether they all left."""
+    def __init__(self):
+        self.future = asyncio.get_running_loop().create_future()
+        self.waiters = 0
+        self.abandoned = asyncio.Event()
+class SingleFlightMiddleware:
+    """
+    Coalesces identical concurrent GET requests: the first request for a
+    (path, normalized query) key runs the route, later ones arriving while it
+    is in flight wait for it and receive a copy of the same response. The
+    shared run is detached from the first client, so its disconnect does not
+    cancel the work the others are waiting for; once every waiting client has
+    disconnected, the run sees a disconnect itself and the deadline
+    middleware inside it kills its queries.
+    Sits in front of admission control: only the shared run takes a
+    concurrency slot. Requests that join it are charged rate tokens but only
+    wait (a batch sub-request gives back the slot its batch took for it).
+    """
+    def __init__(self, app):
+        self.app = app
+        self._in_flight = {}
+        self.requests = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.abandoned = 0
+        single_flight.middleware = self
+    @staticmethod
+    def _key(scope):
+        params = parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)
+        return scope["path"].rstrip("/"), tuple(sorted(params))
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] != "GET"
+                or not any(scope["path"] == p or scope["path"].startswith(p + "/") for p in COALESCE_ROUTES)):
+            await self.app(scope, receive, send)
+            return
+        key = self._key(scope)
+        self.requests += 1
+        flight = self._in_flight.get(key)
+        if flight is None or flight.abandoned.is_set():
+            self.executions += 1
+            flight = _Flight()
+            self._in_flight[key] = flight
+            asyncio.create_task(self._run(scope, key, flight))
+        elif scope.get(BATCH_SUBREQUEST):
+            self.coalesced += 1
+            release = scope.get(ADMISSION_RELEASE)
+            if release is not None:
+                release()
+        else:
+            if await admission.throttle(scope, send):
+                return
+            self.coalesced += 1
+        flight.waiters += 1
+        async def watch():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.future.done():
+                self.abandoned += 1
+                flight.abandoned.set()
+        watcher = asyncio.create_task(watch())
+        try:
+            start, body = await asyncio.shield(flight.future)
+        finally:
+            watcher.cancel()
+        await send(dict(start))
+        await send({"type": "http.response.body", "body": body})
+    async def _run(self, scope, key, flight):
+        start = None
+        chunks = []
+        request_sent = False
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await flight.abandoned.wait()
+            return {"type": "http.disconnect"}
+        async def capture(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+        try:
+            await self.app(scope, receive, capture)
+            flight.future.set_result((start, b"".join(chunks)))
+        except BaseException as e:
+            #Resolve the future even when the run is cancelled, so waiters never hang on it.
+            flight.future.set_exception(e if isinstance(e, Exception) else RuntimeError("The shared request was cancelled"))
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            if self._in_flight.get(key) is flight:
+                del self._in_flight[key]
+    def stats(self):
+        return {
+            "in_flight": len(self._in_flight),
+            "requests": self.requests,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+            "coalesce_ratio": round(self.coalesced / self.requests, 4) if self.requests else None
+        }
+class _SingleFlight:
+    """Handle on the installed middleware, for diagnostics."""
+    middleware = None
+    def stats(self):
+        return self.middleware.stats() if self.middleware is not None else {"enabled": False}
+single_flight = _SingleFlight()
\ No newline at end of file
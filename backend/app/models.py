@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from datetime import date
 from decimal import Decimal
 class UserRegister(BaseModel):
@@ -14,7 +14,7 @@ class UserResponse(BaseModel):
     birthdate: Optional[date]
     country: Optional[str]
 class RatingCreate(BaseModel):
-    user_email: EmailStr
+    user_email: Optional[EmailStr] = None
     game_id: int
     platform_name: str
     rating: float = Field(..., ge=0.0, le=5.0)
@@ -35,4 +35,10 @@ class GameFilter(BaseModel):
     platform: Optional[str] = None
     publisher: Optional[str] = None
     developer: Optional[str] = None
-    year: Optional[int] = None
\ No newline at end of file
+    year: Optional[int] = None
+class BatchItem(BaseModel):
+    id: Optional[str] = None
+    path: str
+    params: Dict[str, Any] = {}
+class BatchRequest(BaseModel):
+    requests: List[BatchItem]
\ No newline at end of file
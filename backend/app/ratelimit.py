@@ -0,0 +1,310 @@
+"""
+Rate limiting and admission control.
+Every /api request is classified into an endpoint class. A request must take a
+token from its client's bucket and from the class-wide route bucket (429 with
+Retry-After when either is empty), then a concurrency slot for the class; when
+all slots are busy it waits in a bounded queue until its deadline (503 with
+Retry-After when the queue is full or the deadline passes).
+Buckets live in process memory, or in Redis when RATE_LIMIT_REDIS_URL is set
+so every worker shares them. Concurrency slots are always per process.
+Batch sub-requests are charged by the batch route on behalf of the batch
+(one set of tokens and one slot per sub-request, one heavy slot for its
+heavy ones) and marked with BATCH_SUBREQUEST, so the middleware lets them
+through. The batch request itself only takes tokens: holding a slot while
+its sub-requests wait for theirs could deadlock a busy worker.
+Requests that join an identical request already running (request
+coalescing, which sits in front of this middleware) are charged tokens but
+take no slot; a batch sub-request that joins one gives its slot back through
+the callable its batch put in the scope under ADMISSION_RELEASE.
+"""
+import asyncio
+import math
+import time
+from urllib.parse import parse_qs
+from app.config import settings
+try:
+    import redis.asyncio as redis
+except ImportError:
+    redis = None
+#Unbounded or fan-out heavy queries that can hold a database connection for seconds.
+HEAVY_ROUTES = ("/api/analytics/dream-game", "/api/analytics/top-collaborations")
+_UNBOUNDED_ROUTES = ("/api/games/filter/by-criteria",)
+_EXEMPT_PREFIXES = ("/api/health",)
+#Charged tokens but given no slot: their sub-requests take the slots.
+_SLOTLESS_ROUTES = ("/api/batch",)
+#Scope key set on sub-requests already admitted by their batch.
+BATCH_SUBREQUEST = "batch_subrequest"
+#Scope key holding a callable that gives a batch sub-request's concurrency slot back early.
+ADMISSION_RELEASE = "admission_release"
+def release_once(release):
+    """Wrap a slot release so it runs at most once, however many times it is called."""
+    released = False
+    def release_slot():
+        nonlocal released
+        if not released:
+            released = True
+            release()
+    return release_slot
+def classify(scope):
+    """Endpoint class of a request: "heavy", "default", or None for exempt paths."""
+    path = scope["path"].rstrip("/")
+    if not path.startswith("/api") or path.startswith(_EXEMPT_PREFIXES):
+        return None
+    if path in HEAVY_ROUTES:
+        return "heavy"
+    if path in _UNBOUNDED_ROUTES and not parse_qs(scope.get("query_string", b"").decode("latin-1")).get("limit"):
+        return "heavy"
+    return "default"
+class EndpointClass:
+    """Limits for one endpoint class."""
+    def __init__(self, name, client_rate, client_burst, route_rate, route_burst, concurrency):
+        self.name = name
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.route_rate = route_rate
+        self.route_burst = route_burst
+        self.concurrency = concurrency
+class MemoryBuckets:
+    """
+    Token buckets in a dict: key -> (tokens, updated_at).
+    All access happens on the event loop, so no lock is needed.
+    """
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = {}
+    async def take(self, key, rate, burst):
+        """Take one token; return 0 if allowed, else seconds until a token is available."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+            return 0.0
+        self._buckets[key] = (tokens, now)
+        return (1 - tokens) / rate
+    def _prune(self, now):
+        #Buckets idle long enough to have refilled carry no state worth keeping.
+        idle = [key for key, (tokens, updated) in self._buckets.items() if now - updated > 60]
+        for key in idle:
+            del self._buckets[key]
+    def stats(self):
+        return {"backend": "memory", "buckets": len(self._buckets)}
+_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 't', 'u')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'u', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+class RedisBuckets:
+    """Token buckets shared by all workers, updated atomically with a Lua script."""
+    def __init__(self, url, prefix="ratelimit:"):
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+        self._take = self.client.register_script(_TAKE_SCRIPT)
+        self.errors = 0
+    async def take(self, key, rate, burst):
+        try:
+            wait = await self._take(keys=[self.prefix + key], args=[rate, burst, time.time()])
+        except Exception:
+            #Fail open: an unreachable Redis must not take the API down with it.
+            self.errors += 1
+            return 0.0
+        return float(wait)
+    def stats(self):
+        return {"backend": "redis", "errors": self.errors}
+class ConcurrencyLimiter:
+    """Per-process concurrency slots with a bounded wait queue."""
+    def __init__(self, limit, max_queue):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._waiters = []
+    async def acquire(self, timeout):
+        """Take a slot, waiting up to timeout seconds. Returns False on rejection or timeout."""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+            return True
+        except asyncio.TimeoutError:
+            if waiter.done():
+                #The slot was handed over just as the deadline passed.
+                return True
+            self.timed_out += 1
+            return False
+        except asyncio.CancelledError:
+            if waiter.done():
+                self.release()
+            raise
+        finally:
+            self.queued -= 1
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+    def release(self):
+        #Hand the slot straight to the oldest waiter so newcomers cannot jump the queue.
+        while self._waiters:
+            waiter = self._waiters.pop(0)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out
+        }
+def _route_key(name, path):
+    """Heavy routes are limited one by one; other routes per /api/<section>."""
+    path = path.rstrip("/")
+    if name == "heavy":
+        return path
+    return "/".join(path.split("/")[:3])
+def _client_id(scope):
+    if settings.RATE_LIMIT_TRUST_FORWARDED:
+        for key, value in scope["headers"]:
+            if key == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+class AdmissionMiddleware:
+    """ASGI middleware applying the limits of each request's endpoint class."""
+    def __init__(self, app, classes=None, buckets=None):
+        self.app = app
+        self.classes = classes or {
+            "default": EndpointClass(
+                "default",
+                settings.RATE_LIMIT_RATE,
+                settings.RATE_LIMIT_BURST,
+                settings.RATE_LIMIT_ROUTE_RATE,
+                settings.RATE_LIMIT_ROUTE_BURST,
+                settings.ADMISSION_CONCURRENCY
+            ),
+            "heavy": EndpointClass(
+                "heavy",
+                settings.RATE_LIMIT_HEAVY_RATE,
+                settings.RATE_LIMIT_HEAVY_BURST,
+                settings.RATE_LIMIT_HEAVY_ROUTE_RATE,
+                settings.RATE_LIMIT_HEAVY_ROUTE_BURST,
+                settings.ADMISSION_HEAVY_CONCURRENCY
+            )
+        }
+        if buckets is None:
+            if settings.RATE_LIMIT_REDIS_URL and redis is not None:
+                buckets = RedisBuckets(settings.RATE_LIMIT_REDIS_URL)
+            else:
+                if settings.RATE_LIMIT_REDIS_URL:
+                    print("RATE_LIMIT_REDIS_URL is set but the redis package is not installed; using in-memory rate limits")
+                buckets = MemoryBuckets()
+        self.buckets = buckets
+        self.limiters = {
+            name: ConcurrencyLimiter(endpoint.concurrency, settings.ADMISSION_QUEUE_SIZE)
+            for name, endpoint in self.classes.items()
+        }
+        self.throttled = 0
+        admission.middleware = self
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.RATE_LIMIT_ENABLED or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        name = classify(scope)
+        if name is None or scope.get(BATCH_SUBREQUEST):
+            await self.app(scope, receive, send)
+            return
+        wait = await self.charge(name, scope)
+        if wait > 0:
+            await _reject(send, 429, "Too many requests, slow down", wait)
+            return
+        if scope["path"].rstrip("/") in _SLOTLESS_ROUTES:
+            await self.app(scope, receive, send)
+            return
+        limiter = self.limiters[name]
+        if not await limiter.acquire(settings.ADMISSION_QUEUE_TIMEOUT):
+            await _reject(send, 503, "Server busy, try again shortly", settings.ADMISSION_QUEUE_TIMEOUT)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+    async def charge(self, name, scope):
+        """Take a request's tokens; returns 0, or the seconds to wait when a bucket is empty."""
+        endpoint = self.classes[name]
+        #The route bucket is only charged for requests the client's own bucket lets through.
+        wait = await self.buckets.take(f"{name}:client:{_client_id(scope)}", endpoint.client_rate, endpoint.client_burst)
+        if wait == 0:
+            wait = await self.buckets.take(f"{name}:route:{_route_key(name, scope['path'])}", endpoint.route_rate, endpoint.route_burst)
+        if wait > 0:
+            self.throttled += 1
+        return wait
+    def stats(self):
+        return {
+            "enabled": settings.RATE_LIMIT_ENABLED,
+            "buckets": self.buckets.stats(),
+            "throttled": self.throttled,
+            "classes": {name: limiter.stats() for name, limiter in self.limiters.items()}
+        }
+async def _reject(send, status_code, detail, retry_after):
+    body = ('{"detail":"%s"}' % detail).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode())
+        ]
+    })
+    await send({"type": "http.response.body", "body": body})
+class _Admission:
+    """Handle on the installed middleware, for diagnostics and for admitting batch sub-requests."""
+    middleware = None
+    def _active(self):
+        return self.middleware is not None and settings.RATE_LIMIT_ENABLED
+    async def charge(self, scope):
+        """Endpoint class of a sub-request and the seconds to wait (0 when its tokens were taken)."""
+        name = classify(scope)
+        if name is None or not self._active():
+            return name, 0
+        return name, await self.middleware.charge(name, scope)
+    async def throttle(self, scope, send):
+        """Charge a request that bypasses the middleware; True when it was out of tokens and got a 429."""
+        name, wait = await self.charge(scope)
+        if wait > 0:
+            await _reject(send, 429, "Too many requests, slow down", wait)
+            return True
+        return False
+    async def acquire(self, name, timeout):
+        """Take a concurrency slot of an endpoint class; False on rejection or timeout."""
+        return await self.middleware.limiters[name].acquire(timeout) if self._active() else True
+    def release(self, name):
+        if self._active():
+            self.middleware.limiters[name].release()
+    def stats(self):
+        return self.middleware.stats() if self.middleware is not None else {"enabled": False}
+admission = _Admission()
\ No newline at end of file
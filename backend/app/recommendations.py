@@ -0,0 +1,286 @@
+import heapq
+import json
+import math
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from app.config import settings
+from app.database import execute_query
+#Attributes carried by more games than this (e.g. a catch-all genre) say little about
+#similarity and would make the pairwise overlap count quadratic in catalogue size.
+_MAX_ATTRIBUTE_GAMES = 1000
+class SimilarityIndex:
+    """
+    Item-item similarity over the user x game rating matrix and game attributes.
+    Both matrices are kept sparse (dicts keyed by the non-zero cells):
+        dots[i][j]          co-rating dot product of games i and j (R^T R)
+        shared_attrs[i][j]  number of attributes games i and j have in common
+    similarity = weight * cosine(ratings) + (1 - weight) * jaccard(attributes).
+    Every game keeps its top-k neighbours so lookups are a slice of a list.
+    """
+    def __init__(self, weight, k):
+        self.weight = weight
+        self.k = k
+        self.user_ratings = {}
+        self.dots = {}
+        self.sq_norms = {}
+        self.shared_attrs = {}
+        self.attr_counts = {}
+        self.neighbors = {}
+    def _rating(self, user, game):
+        platforms = self.user_ratings.get(user, {}).get(game)
+        if not platforms:
+            return 0.0
+        return sum(platforms.values()) / len(platforms)
+    def load_ratings(self, rows):
+        for row in rows:
+            self.user_ratings.setdefault(row['User_Email_Address'], {}).setdefault(row['GameID'], {})[row['PlatformName']] = float(row['Rating'])
+        for user, games in self.user_ratings.items():
+            rated = [(game, self._rating(user, game)) for game in games]
+            for i, (game, rating) in enumerate(rated):
+                self.sq_norms[game] = self.sq_norms.get(game, 0.0) + rating * rating
+                row = self.dots.setdefault(game, {})
+                for other, other_rating in rated[i + 1:]:
+                    value = rating * other_rating
+                    row[other] = row.get(other, 0.0) + value
+                    other_row = self.dots.setdefault(other, {})
+                    other_row[game] = other_row.get(game, 0.0) + value
+    def load_attributes(self, rows):
+        by_attribute = {}
+        for row in rows:
+            by_attribute.setdefault((row['AttributeType'], row['AttributeName']), set()).add(row['GameID'])
+        for games in by_attribute.values():
+            for game in games:
+                self.attr_counts[game] = self.attr_counts.get(game, 0) + 1
+            if len(games) > _MAX_ATTRIBUTE_GAMES:
+                continue
+            games = sorted(games)
+            for i, game in enumerate(games):
+                row = self.shared_attrs.setdefault(game, {})
+                for other in games[i + 1:]:
+                    row[other] = row.get(other, 0) + 1
+                    other_row = self.shared_attrs.setdefault(other, {})
+                    other_row[game] = other_row.get(game, 0) + 1
+    def similarity(self, i, j):
+        cosine = 0.0
+        dot = self.dots.get(i, {}).get(j)
+        norms = self.sq_norms.get(i, 0.0) * self.sq_norms.get(j, 0.0)
+        if dot and norms > 0:
+            cosine = dot / math.sqrt(norms)
+        jaccard = 0.0
+        shared = self.shared_attrs.get(i, {}).get(j)
+        if shared:
+            jaccard = shared / (self.attr_counts[i] + self.attr_counts[j] - shared)
+        return self.weight * cosine + (1 - self.weight) * jaccard
+    def _compute_neighbors(self, game):
+        candidates = set(self.dots.get(game, ())).union(self.shared_attrs.get(game, ()))
+        scored = ((self.similarity(game, other), other) for other in candidates if other != game)
+        self.neighbors[game] = [pair for pair in heapq.nlargest(self.k, scored) if pair[0] > 0]
+    def compute_all_neighbors(self):
+        for game in set(self.dots).union(self.shared_attrs):
+            self._compute_neighbors(game)
+    def set_rating(self, user, game, platform, rating):
+        """
+        Apply one rating change incrementally: adjust the co-rating row of the
+        game, then refresh its neighbour list and its entry in its neighbours' lists.
+        rating=None removes the user's rating for that platform. Lists of games
+        not touched by the change stay approximate until the next full rebuild.
+        """
+        old = self._rating(user, game)
+        games = self.user_ratings.setdefault(user, {})
+        platforms = games.setdefault(game, {})
+        if rating is None:
+            platforms.pop(platform, None)
+            if not platforms:
+                del games[game]
+        else:
+            platforms[platform] = float(rating)
+        new = self._rating(user, game)
+        if new == old:
+            return
+        self.sq_norms[game] = max(self.sq_norms.get(game, 0.0) + new * new - old * old, 0.0)
+        row = self.dots.setdefault(game, {})
+        for other in games:
+            if other == game:
+                continue
+            delta = (new - old) * self._rating(user, other)
+            row[other] = row.get(other, 0.0) + delta
+            other_row = self.dots.setdefault(other, {})
+            other_row[game] = other_row.get(game, 0.0) + delta
+        affected = {other for score, other in self.neighbors.get(game, ())}
+        self._compute_neighbors(game)
+        affected.update(other for score, other in self.neighbors[game])
+        affected.update(games)
+        affected.discard(game)
+        for other in affected:
+            self._update_neighbor(other, game)
+    def _update_neighbor(self, game, other):
+        current = [pair for pair in self.neighbors.get(game, []) if pair[1] != other]
+        score = self.similarity(game, other)
+        if score > 0:
+            current.append((score, other))
+        current.sort(reverse=True)
+        self.neighbors[game] = current[:self.k]
+    def similar(self, game, limit):
+        return self.neighbors.get(game, [])[:limit]
+    def recommend(self, user, limit):
+        """Score unrated games by similarity-weighted ratings of the user's games."""
+        rated = self.user_ratings.get(user)
+        if not rated:
+            return []
+        scores = {}
+        weights = {}
+        for game in rated:
+            rating = self._rating(user, game)
+            for score, other in self.neighbors.get(game, ()):
+                if other in rated:
+                    continue
+                scores[other] = scores.get(other, 0.0) + score * rating
+                weights[other] = weights.get(other, 0.0) + score
+        return heapq.nlargest(limit, ((scores[g] / weights[g], g) for g in scores))
+def compute_index(rating_rows, attribute_rows, weight, k):
+    """Build a SimilarityIndex from raw rows. Runs in the worker process."""
+    index = SimilarityIndex(weight, k)
+    index.load_ratings(rating_rows)
+    index.load_attributes(attribute_rows)
+    index.compute_all_neighbors()
+    return index
+class Recommender:
+    """
+    Holds the current SimilarityIndex in memory and recomputes it every
+    RECOMMEND_REFRESH_SECONDS in a separate process, so the CPU-heavy batch
+    job never holds the GIL of the serving process. Ratings written in between
+    are applied incrementally and replayed onto a freshly built index.
+    """
+    def __init__(self, refresh_seconds, weight, k):
+        self.refresh_seconds = refresh_seconds
+        self.weight = weight
+        self.k = k
+        self.index = None
+        self.titles = {}
+        self.built_at = None
+        self.build_seconds = None
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._pending = None
+        self._executor = None
+        self._thread = None
+        self._wake = threading.Event()
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="recommender", daemon=True)
+            self._thread.start()
+    def refresh_soon(self):
+        """Ask the background job to rebuild now (e.g. after a catalogue import)."""
+        self._wake.set()
+    def _run(self):
+        while True:
+            wait = self.refresh_seconds
+            try:
+                self.rebuild()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Recommendation index rebuild failed: {str(e)}")
+                #Retry soon instead of serving a missing or stale index for a whole refresh period.
+                wait = min(60, self.refresh_seconds)
+            self._wake.wait(wait)
+            self._wake.clear()
+    def rebuild(self):
+        started = time.monotonic()
+        with self._lock:
+            self._pending = []
+        try:
+            ratings = execute_query(
+                "SELECT User_Email_Address, GameID, PlatformName, Rating FROM UserGamePlatform",
+                cache=False
+            )
+            attributes = execute_query(
+                "SELECT GameID, AttributeType, AttributeName FROM GameAttributes",
+                cache=False
+            )
+            games = execute_query("SELECT GameID, Title, CoverPhoto FROM Game", cache=False)
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+            index = self._executor.submit(compute_index, ratings, attributes, self.weight, self.k).result()
+            with self._lock:
+                for user, game, platform, rating in self._pending:
+                    index.set_rating(user, game, platform, rating)
+                self.index = index
+                self.titles = {g['GameID']: g for g in games}
+                self.built_at = time.time()
+                self.build_seconds = round(time.monotonic() - started, 3)
+                self.last_error = None
+        finally:
+            with self._lock:
+                self._pending = None
+    def record_rating(self, user, game, platform, rating):
+        """Apply a rating write (rating=None for a delete) to the live index."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((user, game, platform, rating))
+            if self.index is not None:
+                self.index.set_rating(user, game, platform, rating)
+    def apply_changes(self, changes):
+        """
+        Change feed subscriber: re-read ratings written by other processes and
+        apply them to the live index; rebuild soon after bulk rating or game
+        attribute changes.
+        """
+        keys = set()
+        for change in changes:
+            if change.table == "usergameplatform" and change.key is not None:
+                keys.add(tuple(json.loads(change.key)))
+            elif change.table in ("usergameplatform", "gameattributes", "game"):
+                self.refresh_soon()
+        if not keys:
+            return
+        keys = sorted(keys)
+        ratings = execute_query(
+            f"""
+                SELECT User_Email_Address, GameID, PlatformName, Rating FROM UserGamePlatform
+                WHERE (User_Email_Address, GameID, PlatformName) IN ({', '.join(['(%s, %s, %s)'] * len(keys))})
+            """,
+            tuple(part for key in keys for part in key),
+            primary=True
+        )
+        current = {(r['User_Email_Address'], r['GameID'], r['PlatformName']): r['Rating'] for r in ratings}
+        for user, game, platform in keys:
+            self.record_rating(user, game, platform, current.get((user, game, platform)))
+    @property
+    def ready(self):
+        return self.index is not None
+    def _describe(self, pairs):
+        games = []
+        for score, game in pairs:
+            info = self.titles.get(game)
+            if info is None:
+                continue
+            games.append({
+                "GameID": game,
+                "Title": info['Title'],
+                "CoverPhoto": info['CoverPhoto'],
+                "Score": round(score, 4)
+            })
+        return games
+    def similar(self, game, limit):
+        with self._lock:
+            return self._describe(self.index.similar(game, limit))
+    def recommend(self, user, limit):
+        with self._lock:
+            return self._describe(self.index.recommend(user, limit))
+    def stats(self):
+        with self._lock:
+            return {
+                "ready": self.index is not None,
+                "games": len(self.index.neighbors) if self.index is not None else 0,
+                "users": len(self.index.user_ratings) if self.index is not None else 0,
+                "built_at": self.built_at,
+                "build_seconds": self.build_seconds,
+                "last_error": self.last_error
+            }
+recommender = Recommender(
+    settings.RECOMMEND_REFRESH_SECONDS,
+    weight=settings.RECOMMEND_RATING_WEIGHT,
+    k=settings.RECOMMEND_NEIGHBORS
+)
\ No newline at end of file
@@ -0,0 +1,34 @@
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from fastapi.responses import JSONResponse
+try:
+    import orjson
+except ImportError:
+    orjson = None
+def _default(value):
+    """Encode the column types the MySQL driver can still hand back."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", errors="replace")
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+def dumps(content):
+    """Serialize content to compact JSON bytes (orjson when installed)."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered straight from query rows.
+    Returning it from a route skips FastAPI's jsonable_encoder pass, so large
+    result sets are encoded in one C-level call instead of value by value.
+    """
+    def render(self, content):
+        return dumps(content)
\ No newline at end of file
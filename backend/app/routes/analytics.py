@@ -1,5 +1,10 @@
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, HTTPException, Query
+from app.activity import rating_activity
+from app.catalogue import RANKING_SIZE
 from app.database import execute_query
+from app.documents import game_documents
+from app.graph import credits_graph
+from datetime import datetime
 from typing import Optional
 router = APIRouter()
 @router.get("/top-games")    
@@ -11,44 +16,33 @@ def get_top_rated_games(
 ):
     """
     View the top rated games by the critics and players in each genre / year
-    SQL: Complex query with JOIN, GROUP BY, ORDER BY
+    SQL: none per request, served from the game document store's genre and year bitmaps
+    (SELECT ... FROM Game JOIN GameAttributes / Release ... ORDER BY Score DESC, RatingCount DESC)
     """
     if rating_type == "critics":
-        score_field = "g.overallCriticsScore"
-        count_field = "g.overallCriticsCount"
+        score_field = "overallCriticsScore"
+        count_field = "overallCriticsCount"
     else:
-        score_field = "g.overallPlayersScore"
-        count_field = "g.overallPlayersCount"
-    query = f"""
-        SELECT DISTINCT
-            g.GameID,
-            g.Title,
-            g.CoverPhoto,
-            {score_field} as Score,
-            {count_field} as RatingCount
-        FROM Game g
-    """
-    joins = []
-    conditions = [f"{score_field} IS NOT NULL"]
-    params = []
-    if genre:
-        joins.append("""
-            JOIN GameAttributes ga ON g.GameID = ga.GameID
-        """)
-        conditions.append("ga.AttributeType = 'Genre' AND ga.AttributeName = %s")
-        params.append(genre)
-    if year:
-        joins.append("""
-            JOIN `Release` r ON g.GameID = r.GameID
-        """)
-        conditions.append("YEAR(r.ReleaseDate) = %s")
-        params.append(year)
-    query += " ".join(joins)
-    query += " WHERE " + " AND ".join(conditions)
-    query += f" ORDER BY {score_field} DESC, {count_field} DESC"
-    query += " LIMIT %s"
-    params.append(limit)
-    games = execute_query(query, tuple(params))
+        score_field = "overallPlayersScore"
+        count_field = "overallPlayersCount"
+    game_documents.ensure_fresh()
+    games = [
+        {
+            "GameID": game["GameID"],
+            "Title": game["Title"],
+            "CoverPhoto": game["CoverPhoto"],
+            "Score": game[score_field],
+            "RatingCount": game[count_field]
+        }
+        for game in game_documents.top(
+            score_field,
+            count_field,
+            ("GameID", "Title", "CoverPhoto", score_field, count_field),
+            limit,
+            genre=genre,
+            year=year
+        )
+    ]
     return {
         "games": games,
         "rating_type": rating_type,
@@ -64,38 +58,18 @@ def get_top_games_by_moby_score(
 ):
     """
     Show the top 5 video games in each genre / setting by moby score
-    SQL: SELECT with JOIN on GameAttributes, ORDER BY overallMobyScore
-    """
-    query = """
-        SELECT DISTINCT
-            g.GameID,
-            g.Title,
-            g.Description,
-            g.CoverPhoto,
-            g.overallMobyScore
-        FROM Game g
+    SQL: none per request, served from the game document store's genre and setting bitmaps
+    (SELECT ... FROM Game JOIN GameAttributes ... ORDER BY overallMobyScore DESC)
     """
-    joins = []
-    conditions = ["g.overallMobyScore IS NOT NULL"]
-    params = []
-    if genre:
-        joins.append("""
-            JOIN GameAttributes ga_genre ON g.GameID = ga_genre.GameID
-        """)
-        conditions.append("ga_genre.AttributeType = 'Genre' AND ga_genre.AttributeName = %s")
-        params.append(genre)
-    if setting:
-        joins.append("""
-            JOIN GameAttributes ga_setting ON g.GameID = ga_setting.GameID
-        """)
-        conditions.append("ga_setting.AttributeType = 'Setting' AND ga_setting.AttributeName = %s")
-        params.append(setting)
-    query += " ".join(joins)
-    query += " WHERE " + " AND ".join(conditions)
-    query += " ORDER BY g.overallMobyScore DESC"
-    query += " LIMIT %s"
-    params.append(limit)
-    games = execute_query(query, tuple(params))
+    game_documents.ensure_fresh()
+    games = game_documents.top(
+        "overallMobyScore",
+        None,
+        ("GameID", "Title", "Description", "CoverPhoto", "overallMobyScore"),
+        limit,
+        genre=genre,
+        setting=setting
+    )
     return {
         "games": games,
         "genre": genre,
@@ -105,49 +79,17 @@ def get_top_games_by_moby_score(
 @router.get("/top-developers")
 def get_top_developers(
     genre: Optional[str] = None,
-    limit: int = Query(5, ge=1, le=20)
+    limit: int = Query(5, ge=1, le=RANKING_SIZE)
 ):
     """
     Show the top development companies by critics rating in each genre
-    SQL: Complex JOIN with GROUP BY and AVG aggregation using subquery to avoid duplicates
+    SQL: none per request, read from the developer ranking pre-aggregated into the
+    game documents snapshot (SUM(critics score * count) / SUM(count) per CompanyName,
+    Country over distinct (GameID, DeveloperCompanyID) releases, overall and per genre);
+    the ranking query itself while games changed since the snapshot sit in the overlay
     """
-    if genre:
-        query = """
-            SELECT DISTINCT
-                c.CompanyName,
-                c.Country,
-                SUM(g.overallCriticsScore*g.overallCriticsCount)/SUM(g.overallCriticsCount) AS AvgCriticsScore,
-                COUNT(DISTINCT g.GameID) AS GameCount
-            FROM Game g
-            JOIN GameAttributes ga ON g.GameID = ga.GameID
-            JOIN (
-                SELECT DISTINCT GameID, DeveloperCompanyID FROM `Release`
-            ) r ON g.GameID = r.GameID
-            JOIN Company c ON r.DeveloperCompanyID = c.CompanyID
-            WHERE ga.AttributeType = 'Genre' AND ga.AttributeName = %s
-            GROUP BY c.CompanyName, c.Country
-            ORDER BY AvgCriticsScore DESC, GameCount DESC
-            LIMIT %s
-        """ #I used subquery just to ensure that there will be no duplicates as Release table can have multiple releases for the same game.
-        params = (genre, limit)
-    else:
-        query = """
-            SELECT DISTINCT
-                c.CompanyName,
-                c.Country,
-                SUM(g.overallCriticsScore*g.overallCriticsCount)/SUM(g.overallCriticsCount) AS AvgCriticsScore,
-                COUNT(DISTINCT g.GameID) AS GameCount
-            FROM Game g
-            JOIN (
-                SELECT DISTINCT GameID, DeveloperCompanyID FROM `Release`
-            ) r ON g.GameID = r.GameID
-            JOIN Company c ON r.DeveloperCompanyID = c.CompanyID
-            GROUP BY c.CompanyName, c.Country
-            ORDER BY AvgCriticsScore DESC, GameCount DESC
-            LIMIT %s
-        """#I used subquery just to ensure that there will be no duplicates as Release table can have multiple releases for the same game.
-        params = (limit,)
-    developers = execute_query(query, params)
+    game_documents.ensure_fresh()
+    developers = game_documents.top_developers(genre or None, limit)
     return {
         "developers": developers,
         "genre": genre,
@@ -340,59 +282,82 @@ def get_dream_game():
         "note": "Dream game based on highest average player ratings across all game attributes"
     }
 @router.get("/top-directors")
-def get_top_directors(limit: int = Query(5, ge=1, le=20)):
+def get_top_directors(
+    limit: int = Query(5, ge=1, le=20),
+    games_limit: int = Query(10, ge=1, le=100)
+):
     """
     Show the best 5 game directors based on the volume of games
-    SQL: SELECT with GROUP BY, COUNT, ORDER BY
+    Served from the in-memory credits graph (top-k with a heap); Games holds the
+    first games_limit titles, the rest via /top-directors/{person_id}/games
     """
-    query = """
-        SELECT 
-            p.PersonID,
-            p.Name as DirectorName,
-            COUNT(DISTINCT gpc.GameID) as GameCount,
-            GROUP_CONCAT(DISTINCT g.Title SEPARATOR ', ') as Games
-        FROM Person p
-        JOIN GamePersonCredits gpc ON p.PersonID = gpc.PersonID
-        JOIN Game g ON gpc.GameID = g.GameID
-        GROUP BY p.PersonID, DirectorName
-        ORDER BY GameCount DESC
-        LIMIT %s
-    """
-    directors = execute_query(query, (limit,))
+    credits_graph.ensure_fresh()
+    directors = credits_graph.top_directors(limit, games_limit)
     return {
         "directors": directors,
         "count": len(directors)
     }
+@router.get("/top-directors/{person_id}/games")
+def get_director_games(
+    person_id: int,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """
+    Page through the game titles of a director
+    """
+    credits_graph.ensure_fresh()
+    page = credits_graph.person_titles(person_id, offset, limit)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Director not found")
+    titles, total = page
+    return {
+        "person_id": person_id,
+        "games": titles,
+        "total": total,
+        "offset": offset,
+        "limit": limit
+    }
 @router.get("/top-collaborations")
-def get_top_collaborations(limit: int = Query(5, ge=1, le=20)):
+def get_top_collaborations(
+    limit: int = Query(5, ge=1, le=20),
+    games_limit: int = Query(10, ge=1, le=100)
+):
     """
     Show the top 5 collaborations between directors and development companies
     based on the number of games they worked on together
-    SQL: Complex JOIN with GROUP BY on multiple tables
+    Served from the in-memory credits graph (top-k with a heap); Games holds the
+    first games_limit titles, the rest via /top-collaborations/games
     """
-    query = """
-        SELECT 
-            p.Name as DirectorName,
-            dc.CompanyName as DeveloperName,
-            COUNT(DISTINCT g.GameID) as CollaborationCount,
-            GROUP_CONCAT(DISTINCT g.Title SEPARATOR ', ') as Games
-        FROM Person p
-        JOIN GamePersonCredits gpc ON p.PersonID = gpc.PersonID
-        JOIN Game g ON gpc.GameID = g.GameID
-        JOIN (
-            SELECT DISTINCT GameID, DeveloperCompanyID
-            FROM `Release`
-        ) r ON g.GameID = r.GameID
-        JOIN Company dc ON r.DeveloperCompanyID = dc.CompanyID
-        GROUP BY DirectorName, DeveloperName
-        ORDER BY CollaborationCount DESC
-        LIMIT %s
-    """#I used subquery just to ensure that there will be no duplicates as Release table can have multiple releases for the same game.
-    collaborations = execute_query(query, (limit,))
+    credits_graph.ensure_fresh()
+    collaborations = credits_graph.top_collaborations(limit, games_limit)
     return {
         "collaborations": collaborations,
         "count": len(collaborations)
     }
+@router.get("/top-collaborations/games")
+def get_collaboration_games(
+    director: str,
+    developer: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """
+    Page through the game titles a director and a developer made together
+    """
+    credits_graph.ensure_fresh()
+    page = credits_graph.pair_titles(director, developer, offset, limit)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Collaboration not found")
+    titles, total = page
+    return {
+        "director": director,
+        "developer": developer,
+        "games": titles,
+        "total": total,
+        "offset": offset,
+        "limit": limit
+    }
 @router.get("/platform-stats")
 def get_platform_statistics():
     """
@@ -415,4 +380,22 @@ def get_platform_statistics():
     return {
         "platforms": platforms,
         "count": len(platforms)
-    }
\ No newline at end of file
+    }
+@router.get("/rating-activity")
+def get_rating_activity(
+    dimension: str = Query("all", regex="^(all|game|platform|genre)$"),
+    key: Optional[str] = Query(None, description="GameID, PlatformName or genre name (not used for dimension=all)"),
+    granularity: str = Query("auto", regex="^(auto|hour|day)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """
+    Rating volume and average rating per hour / day for all ratings, a game, a platform or a genre
+    SQL: SELECT BucketStart, Ratings, NewRatings, Removed, RatingSum FROM RatingActivityHourly / RatingActivityDaily
+    WHERE Dimension = %s AND DimensionKey = %s AND BucketStart >= %s AND BucketStart < %s
+    (a primary-key range over the pre-aggregated buckets; times are UTC, empty buckets are filled with zeros)
+    """
+    try:
+        return rating_activity.series(dimension, key, granularity, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,131 @@
+import asyncio
+import math
+from urllib.parse import parse_qsl, urlencode
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import Response
+from app.config import settings
+from app.models import BatchRequest
+from app.ratelimit import ADMISSION_RELEASE, BATCH_SUBREQUEST, admission, release_once
+from app.responses import dumps
+router = APIRouter()
+#Headers of the batch request passed on to every sub-request.
+_FORWARDED_HEADERS = (b"authorization", b"x-forwarded-for", b"user-agent", b"x-read-your-writes")
+@router.post("/")
+async def run_batch(batch: BatchRequest, request: Request):
+    """
+    Run several GET requests in one round trip.
+    Body: {"requests": [{"id": "genres", "path": "/metadata/genres", "params": {}}, ...]}
+    Sub-requests run concurrently inside this process through the whole API
+    stack, so they share the connection pools, the query cache and request
+    coalescing. Each result carries its own status; one failing sub-request
+    does not fail the batch.
+    The batch is charged rate tokens for every sub-request but holds no
+    admission slot itself: each default sub-request takes a default slot
+    (503 when none frees up in time), and the heavy ones run one after another
+    on a single heavy slot, so a batch runs no more queries at once than the
+    same requests sent separately.
+    """
+    if len(batch.requests) > settings.BATCH_MAX_REQUESTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch can hold at most {settings.BATCH_MAX_REQUESTS} requests"
+        )
+    results = [None] * len(batch.requests)
+    default = []
+    heavy = []
+    for i, item in enumerate(batch.requests):
+        scope = _scope(request, item)
+        if scope is None:
+            results[i] = _result(item, 400, dumps({"detail": "Batches cannot be nested"}))
+            continue
+        name, wait = await admission.charge(scope)
+        if wait > 0:
+            results[i] = _result(item, 429, dumps({"detail": "Too many requests, slow down", "retry_after": max(1, math.ceil(wait))}))
+        elif name == "heavy":
+            heavy.append((i, item, scope))
+        else:
+            default.append((i, item, scope))
+    async def run(i, item, scope):
+        results[i] = await _dispatch(request, item, scope)
+    async def run_default(i, item, scope):
+        if not await admission.acquire("default", settings.ADMISSION_QUEUE_TIMEOUT):
+            results[i] = _result(item, 503, dumps({"detail": "Server busy, try again shortly"}))
+            return
+        release = release_once(lambda: admission.release("default"))
+        scope[ADMISSION_RELEASE] = release
+        try:
+            await run(i, item, scope)
+        finally:
+            release()
+    async def run_heavy():
+        if not heavy:
+            return
+        if not await admission.acquire("heavy", settings.ADMISSION_QUEUE_TIMEOUT):
+            for i, item, _ in heavy:
+                results[i] = _result(item, 503, dumps({"detail": "Server busy, try again shortly"}))
+            return
+        try:
+            for entry in heavy:
+                await run(*entry)
+        finally:
+            admission.release("heavy")
+    await asyncio.gather(run_heavy(), *(run_default(*entry) for entry in default))
+    return Response(content=b'{"responses":[' + b",".join(results) + b"]}", media_type="application/json")
+def _result(item, status_code, body):
+    return b'{"id":' + dumps(item.id) + b',"status":' + str(status_code).encode() + b',"body":' + body + b"}"
+def _scope(request, item):
+    """
+    ASGI scope of one sub-request (already admitted by the batch), or None for a
+    nested batch. A query string in the path is kept; params override its keys.
+    """
+    path, _, query = item.path.partition("?")
+    if not path.startswith("/api/"):
+        path = "/api" + (path if path.startswith("/") else "/" + path)
+    if path.startswith("/api/batch"):
+        return None
+    params = [(key, value) for key, value in parse_qsl(query, keep_blank_values=True) if item.params.get(key) is None]
+    params.extend((key, value) for key, value in item.params.items() if value is not None)
+    return {
+        "type": "http",
+        "asgi": request.scope.get("asgi", {"version": "3.0"}),
+        "http_version": request.scope.get("http_version", "1.1"),
+        "method": "GET",
+        "scheme": request.scope.get("scheme", "http"),
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": urlencode(params, doseq=True).encode(),
+        "headers": [(key, value) for key, value in request.scope["headers"] if key in _FORWARDED_HEADERS],
+        "client": request.scope.get("client"),
+        "server": request.scope.get("server"),
+        BATCH_SUBREQUEST: True
+    }
+async def _dispatch(request, item, scope):
+    """Run one sub-request through the ASGI app and return its result as JSON bytes."""
+    start = None
+    chunks = []
+    request_sent = False
+    never = asyncio.Event()
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await never.wait()
+    async def send(message):
+        nonlocal start
+        if message["type"] == "http.response.start":
+            start = message
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+    try:
+        await request.app(scope, receive, send)
+    except Exception as e:
+        return _result(item, 500, dumps({"detail": str(e)}))
+    body = b"".join(chunks)
+    content_type = next((v for k, v in start.get("headers", []) if k == b"content-type"), b"")
+    if not body:
+        body = b"null"
+    elif not content_type.startswith(b"application/json"):
+        body = dumps(body.decode("utf-8", errors="replace"))
+    return _result(item, start["status"], body)
@@ -1,62 +1,72 @@
 from fastapi import APIRouter, HTTPException, Query
 from typing import List, Optional
+from app.catalogue import GAME_COLUMNS
 from app.database import execute_query
+from app.documents import game_documents
+from app.responses import FastJSONResponse
 router = APIRouter()
-@router.get("/")
+#Selectable fields: the Game columns the document store holds.
+GAME_FIELDS = GAME_COLUMNS
+FIELD_PRESETS = {
+    "card": ("GameID", "Title", "CoverPhoto", "overallMobyScore")
+}
+FIELDS_DESCRIPTION = "Comma separated Game columns to return, or a preset: " + ", ".join(FIELD_PRESETS)
+def resolve_fields(fields, default, required=()):
+    """
+    Validate a fields= parameter against GAME_FIELDS and return the columns to select.
+    Accepts a comma separated list of column names or a preset name such as "card".
+    GameID and any required columns (e.g. the ORDER BY column) are always included.
+    """
+    if not fields:
+        return default
+    if fields in FIELD_PRESETS:
+        selected = set(FIELD_PRESETS[fields])
+    else:
+        selected = {f.strip() for f in fields.split(",") if f.strip()}
+        unknown = sorted(selected.difference(GAME_FIELDS))
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(GAME_FIELDS)} or presets: {', '.join(FIELD_PRESETS)}"
+            )
+    selected.update(("GameID",) + tuple(required))
+    return tuple(f for f in GAME_FIELDS if f in selected)
+@router.get("/", response_class=FastJSONResponse)
 def get_all_games(
-    limit: int = Query(252, ge=1, le=500)
+    limit: int = Query(252, ge=1, le=500),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)
 ):
     """
     Get all games
-    SQL: SELECT * FROM Game LIMIT %s 
+    SQL: none per request, served from the game document store
+    (SELECT <fields> FROM Game ORDER BY Title LIMIT %s)
     """
-    query = """
-        SELECT 
-            GameID,
-            Title,
-            Description,
-            CoverPhoto,
-            overallCriticsCount,
-            overallCriticsScore,
-            overallPlayersCount,
-            overallPlayersScore,
-            overallMobyScore
-        FROM Game
-        ORDER BY Title
-        LIMIT %s 
-    """
-    games = execute_query(query, (limit,))
-    count_query = "SELECT COUNT(*) as total FROM Game"
-    total = execute_query(count_query, fetch_one=True)
-    return {
+    columns = resolve_fields(fields, GAME_FIELDS)
+    game_documents.ensure_fresh()
+    games = game_documents.list_games(columns, limit)
+    return FastJSONResponse({
         "games": games,
-        "total": total['total'], 
+        "total": game_documents.count(), 
         "limit": limit,
-    }
-@router.get("/search")
-def search_games(q: str = Query(..., min_length=1)):
+    })
+@router.get("/search", response_class=FastJSONResponse)
+def search_games(
+    q: str = Query(..., min_length=1),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)
+):
     """
     Search games by title
-    SQL: SELECT * FROM Game WHERE Title LIKE %s
+    SQL: none per request, a substring scan of the game document store's packed title column
+    (SELECT <fields> FROM Game WHERE Title LIKE %s ORDER BY Title LIMIT 50)
     """
-    query = """
-        SELECT 
-            GameID,
-            Title,
-            Description,
-            CoverPhoto,
-            overallMobyScore
-        FROM Game
-        WHERE Title LIKE %s
-        ORDER BY Title
-        LIMIT 50
-    """
-    games = execute_query(query, (f"%{q}%",))
-    return {
+    columns = resolve_fields(fields, ("GameID", "Title", "Description", "CoverPhoto", "overallMobyScore"))
+    game_documents.ensure_fresh()
+    games = game_documents.search(q, columns, 50)
+    return FastJSONResponse({
         "games": games,
         "count": len(games)
-    }
-@router.get("/{game_id}")
+    })
+@router.get("/{game_id}", response_class=FastJSONResponse)
 def get_game_details(game_id: int):
     """
     Get detailed game information
@@ -109,13 +119,13 @@ def get_game_details(game_id: int):
         WHERE r.GameID = %s
     """
     releases = execute_query(release_query, (game_id,))
-    return {
+    return FastJSONResponse({
         "game": game,
         "platforms": platforms,
         "attributes": attributes,
         "releases": releases
-    }
-@router.get("/filter/by-criteria")
+    })
+@router.get("/filter/by-criteria", response_class=FastJSONResponse)
 def get_games_by_filter(
     genre: Optional[str] = None,
     platform: Optional[str] = None,
@@ -123,71 +133,37 @@ def get_games_by_filter(
     developer: Optional[str] = None,
     year: Optional[int] = None,
     sort_by: Optional[str] = Query("moby_score", regex="^(moby_score|title|critics_score|players_score)$"),
-    limit: Optional[int] = Query(None, ge=1, le=1000)
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)
 ):
     """
     Show all the games for a specific genre / platform / publisher / developer
-    SQL: Complex JOIN query with WHERE conditions
-    """
-    query = """
-        SELECT DISTINCT
-            g.GameID,
-            g.Title,
-            g.Description,
-            g.CoverPhoto,
-            g.overallMobyScore,
-            g.overallCriticsScore,
-            g.overallPlayersScore
-        FROM Game g
-    """
-    joins = []
-    conditions = []
-    params = []
-    if genre:
-        joins.append("""
-            JOIN GameAttributes ga ON g.GameID = ga.GameID
-        """)
-        conditions.append("ga.AttributeType = 'Genre' AND ga.AttributeName = %s")
-        params.append(genre)
-    if platform:
-        joins.append("""
-            JOIN GamePlatform gp ON g.GameID = gp.GameID
-        """)
-        conditions.append("gp.PlatformName = %s")
-        params.append(platform)
-    if publisher or developer:
-        joins.append("""
-            JOIN `Release` r ON g.GameID = r.GameID
-            JOIN Company dc ON r.DeveloperCompanyID = dc.CompanyID
-            JOIN Company pc ON r.PublisherCompanyID = pc.CompanyID
-        """)
-        if developer:
-            conditions.append("dc.CompanyName = %s")
-            params.append(developer)
-        if publisher:
-            conditions.append("pc.CompanyName = %s")
-            params.append(publisher)
-    if year:
-        if "Release" not in " ".join(joins): 
-            joins.append("""
-                JOIN `Release` r ON g.GameID = r.GameID
-            """)
-        conditions.append("YEAR(r.ReleaseDate) = %s")
-        params.append(year)
-    query += " ".join(joins)
-    if conditions:
-        query += " WHERE " + " AND ".join(conditions)    
-    sort_mapping = {
-        "moby_score": "g.overallMobyScore DESC",
-        "title": "g.Title ASC",
-        "critics_score": "g.overallCriticsScore DESC",
-        "players_score": "g.overallPlayersScore DESC"
+    SQL: none per request; an intersection of the game document store's inverted
+    indexes replaces the Game / GameAttributes / GamePlatform / Release / Company join
+    """
+    sort_columns = {
+        "moby_score": "overallMobyScore",
+        "title": "Title",
+        "critics_score": "overallCriticsScore",
+        "players_score": "overallPlayersScore"
     }
-    query += f" ORDER BY {sort_mapping.get(sort_by, 'g.overallMobyScore DESC')}"
-    if limit:
-        query += f" LIMIT {limit}"
-    games = execute_query(query, tuple(params) if params else None)
-    return {
+    columns = resolve_fields(
+        fields,
+        ("GameID", "Title", "Description", "CoverPhoto", "overallMobyScore", "overallCriticsScore", "overallPlayersScore"),
+        required=(sort_columns.get(sort_by, "overallMobyScore"),)
+    )
+    game_documents.ensure_fresh()
+    games = game_documents.filter(
+        columns,
+        sort_by,
+        limit=limit,
+        genre=genre,
+        platform=platform,
+        publisher=publisher,
+        developer=developer,
+        year=year
+    )
+    return FastJSONResponse({
         "games": games,
         "count": len(games),
         "filters": {
@@ -197,10 +173,11 @@ def get_games_by_filter(
             "developer": developer,
             "year": year,
             "sort_by": sort_by,
-            "limit": limit
+            "limit": limit,
+            "fields": fields
         }
-    }
-@router.get("/{game_id}/platforms")
+    })
+@router.get("/{game_id}/platforms", response_class=FastJSONResponse)
 def get_game_platforms(game_id: int):
     """
     Get all platforms where a specific game is available
@@ -218,8 +195,8 @@ def get_game_platforms(game_id: int):
             status_code=404, 
             detail="No platforms found for this game"
         )
-    return {
+    return FastJSONResponse({
         "game_id": game_id,
         "platforms": [p['PlatformName'] for p in platforms],
         "count": len(platforms)
-    }
\ No newline at end of file
+    })
\ No newline at end of file
@@ -0,0 +1,115 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import JSONResponse
+from app.activity import rating_activity
+from app.config import settings
+from app.cache import query_cache
+from app.changes import change_feed
+from app.database import ping_database, pool_stats, replicas
+from app.deadlines import watchdog
+from app.documents import game_documents
+from app.graph import credits_graph
+from app.middleware import single_flight
+from app.ratelimit import admission
+from app.recommendations import recommender
+from app.security import password_hasher
+router = APIRouter()
+_probe_lock = threading.Lock()
+_probe_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="health-probe")
+_probe_future = None
+_probe_state = {
+    "ok": False,
+    "error": "not checked yet",
+    "latency_ms": None,
+    "checked_at": None,
+    "last_ok_at": None
+}
+_probe_checked = 0.0
+def check_readiness():
+    """
+    Cached readiness probe.
+    At most one SELECT 1 ping runs per HEALTH_CACHE_SECONDS window; concurrent
+    callers inside the window share the cached result or the in-flight ping.
+    """
+    global _probe_future, _probe_checked
+    with _probe_lock:
+        if time.monotonic() - _probe_checked < settings.HEALTH_CACHE_SECONDS:
+            return dict(_probe_state)
+        if _probe_future is None or _probe_future.done():
+            _probe_future = _probe_executor.submit(ping_database, settings.HEALTH_CHECK_TIMEOUT)
+        future = _probe_future
+    try:
+        latency = future.result(timeout=settings.HEALTH_CHECK_TIMEOUT)
+        ok, error = True, None
+    except FutureTimeout:
+        latency, ok, error = None, False, f"ping timed out after {settings.HEALTH_CHECK_TIMEOUT}s"
+    except Exception as e:
+        latency, ok, error = None, False, str(e)
+    with _probe_lock:
+        _probe_checked = time.monotonic()
+        _probe_state["ok"] = ok
+        _probe_state["error"] = error
+        _probe_state["latency_ms"] = latency
+        _probe_state["checked_at"] = time.time()
+        if ok:
+            _probe_state["last_ok_at"] = _probe_state["checked_at"]
+        return dict(_probe_state)
+@router.get("/live")
+def liveness():
+    """
+    Liveness probe: the process is up and serving requests.
+    Never touches the database.
+    """
+    return {"status": "alive"}
+@router.get("/ready")
+def readiness():
+    """
+    Readiness probe: the primary database answers a pooled SELECT 1.
+    SQL: SELECT 1 (result cached for HEALTH_CACHE_SECONDS)
+    """
+    probe = check_readiness()
+    body = {
+        "status": "ready" if probe["ok"] else "unavailable",
+        "database": "connected" if probe["ok"] else "unreachable",
+        "latency_ms": probe["latency_ms"],
+        "checked_at": probe["checked_at"]
+    }
+    if not probe["ok"]:
+        body["error"] = probe["error"]
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=body)
+    return body
+@router.get("/details")
+def diagnostics():
+    """
+    Detailed diagnostics: pool saturation, cache hit rates and refresh lag.
+    Disabled with HEALTH_DETAILS_ENABLED=false.
+    """
+    if not settings.HEALTH_DETAILS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    probe = check_readiness()
+    now = time.time()
+    return {
+        "readiness": probe,
+        "pools": pool_stats(),
+        "replicas": replicas.stats(),
+        "query_cache": query_cache.stats(),
+        "credits_graph": credits_graph.stats(),
+        "game_documents": game_documents.stats(),
+        "recommendations": recommender.stats(),
+        "password_hashing": password_hasher.stats(),
+        "admission": admission.stats(),
+        "query_deadlines": watchdog.stats(),
+        "single_flight": single_flight.stats(),
+        "change_feed": change_feed.stats(),
+        "rating_activity": rating_activity.stats(),
+        "refresh_lag_seconds": {
+            "readiness_probe": round(now - probe["last_ok_at"], 3) if probe["last_ok_at"] else None,
+            "credits_graph": round(now - credits_graph.built_at, 3) if credits_graph.built_at else None,
+            "game_documents": round(now - game_documents.built_at, 3) if game_documents.built_at else None,
+            "recommendations": round(now - recommender.built_at, 3) if recommender.built_at else None,
+            "change_feed": round(now - change_feed.last_poll_at, 3) if change_feed.last_poll_at else None,
+            "rating_activity": round(now - rating_activity.last_rollup_at, 3) if rating_activity.last_rollup_at else None
+        }
+    }
\ No newline at end of file
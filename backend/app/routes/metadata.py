@@ -1,7 +1,8 @@
 from fastapi import APIRouter
 from app.database import execute_query
+from app.responses import FastJSONResponse
 router = APIRouter()
-@router.get("/platforms")
+@router.get("/platforms", response_class=FastJSONResponse)
 def get_all_platforms():
     """
     Get all available platforms from database
@@ -13,11 +14,11 @@ def get_all_platforms():
         ORDER BY PlatformName
     """
     platforms = execute_query(query)
-    return {
+    return FastJSONResponse({
         "platforms": [p['PlatformName'] for p in platforms],
         "count": len(platforms)
-    }
-@router.get("/genres")
+    })
+@router.get("/genres", response_class=FastJSONResponse)
 def get_all_genres():
     """
     Get all available genres from database
@@ -30,11 +31,11 @@ def get_all_genres():
         ORDER BY Name
     """
     genres = execute_query(query)
-    return {
+    return FastJSONResponse({
         "genres": [g['Name'] for g in genres],
         "count": len(genres)
-    }
-@router.get("/settings")
+    })
+@router.get("/settings", response_class=FastJSONResponse)
 def get_all_settings():
     """
     Get all available settings from database
@@ -47,11 +48,11 @@ def get_all_settings():
         ORDER BY Name
     """
     settings = execute_query(query)
-    return {
+    return FastJSONResponse({
         "settings": [s['Name'] for s in settings],
         "count": len(settings)
-    }
-@router.get("/developers")
+    })
+@router.get("/developers", response_class=FastJSONResponse)
 def get_all_developers():
     """
     Get all development companies from database
@@ -64,11 +65,11 @@ def get_all_developers():
         ORDER BY c.CompanyName
     """
     developers = execute_query(query)
-    return {
+    return FastJSONResponse({
         "developers": [d['CompanyName'] for d in developers],
         "count": len(developers)
-    }
-@router.get("/publishers")
+    })
+@router.get("/publishers", response_class=FastJSONResponse)
 def get_all_publishers():
     """
     Get all publishing companies from database
@@ -81,11 +82,11 @@ def get_all_publishers():
         ORDER BY c.CompanyName
     """
     publishers = execute_query(query)
-    return {
+    return FastJSONResponse({
         "publishers": [p['CompanyName'] for p in publishers],
         "count": len(publishers)
-    }
-@router.get("/games")
+    })
+@router.get("/games", response_class=FastJSONResponse)
 def get_all_games_list():
     """
     Get all games (simplified list for dropdowns)
@@ -97,11 +98,11 @@ def get_all_games_list():
         ORDER BY Title
     """
     games = execute_query(query)
-    return {
+    return FastJSONResponse({
         "games": games,
         "count": len(games)
-    }
-@router.get("/years")
+    })
+@router.get("/years", response_class=FastJSONResponse)
 def get_release_years():
     """
     Get all available release years
@@ -114,7 +115,7 @@ def get_release_years():
         ORDER BY Year DESC
     """
     years = execute_query(query)
-    return {
+    return FastJSONResponse({
         "years": [y['Year'] for y in years if y['Year']],
         "count": len(years)
-    }
\ No newline at end of file
+    })
\ No newline at end of file
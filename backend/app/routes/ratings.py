@@ -1,22 +1,24 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from app.models import RatingCreate, RatingResponse
+from app.activity import rating_events
+from app.changes import Change, row_key
 from app.database import execute_query
-from typing import List
+from app.recommendations import recommender
+from app.security import current_user
+from typing import List, Optional
 router = APIRouter()
 @router.post("/", response_model=RatingResponse, status_code=status.HTTP_201_CREATED)
-def add_rating(rating: RatingCreate):
+def add_rating(rating: RatingCreate, user_email: str = Depends(current_user)):
     """
     Add a new user rating for an existing video game
     SQL: INSERT INTO UserGamePlatform (User_Email_Address, GameID, PlatformName, Rating)
+    plus a RatingEvent row in the same transaction for the activity rollups.
+    The user comes from the session token, so the User table is not queried.
     """
-    user_check = """
-        SELECT EmailAddress FROM `User` WHERE EmailAddress = %s 
-    """
-    user = execute_query(user_check, (rating.user_email,), fetch_one=True) 
-    if not user:
+    if rating.user_email and rating.user_email != user_email:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found. Please register first."
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can only add ratings for your own account"
         )
     game_check = """
         SELECT GameID, PlatformName 
@@ -41,8 +43,9 @@ def add_rating(rating: RatingCreate):
     """
     existing = execute_query(
         existing_check,
-        (rating.user_email, rating.game_id, rating.platform_name),
-        fetch_one=True
+        (user_email, rating.game_id, rating.platform_name),
+        fetch_one=True,
+        primary=True
     )
     if existing:
         update_query = """
@@ -54,8 +57,11 @@ def add_rating(rating: RatingCreate):
         """
         execute_query(
             update_query,
-            (rating.rating, rating.user_email, rating.game_id, rating.platform_name),
-            commit=True
+            (rating.rating, user_email, rating.game_id, rating.platform_name),
+            commit=True,
+            sticky_key=user_email,
+            changes=[Change("UserGamePlatform", row_key(user_email, rating.game_id, rating.platform_name), rating.game_id, "U")],
+            statements=rating_events(user_email, rating.game_id, rating.platform_name, rating.rating, "U")
         )
     else:
         insert_query = """
@@ -65,13 +71,17 @@ def add_rating(rating: RatingCreate):
         """
         execute_query(
             insert_query,
-            (rating.user_email, rating.game_id, rating.platform_name, rating.rating),
-            commit=True
+            (user_email, rating.game_id, rating.platform_name, rating.rating),
+            commit=True,
+            sticky_key=user_email,
+            changes=[Change("UserGamePlatform", row_key(user_email, rating.game_id, rating.platform_name), rating.game_id, "I")],
+            statements=rating_events(user_email, rating.game_id, rating.platform_name, rating.rating, "I")
         )
+    recommender.record_rating(user_email, rating.game_id, rating.platform_name, rating.rating)
     game_title_query = "SELECT Title FROM Game WHERE GameID = %s"
     game_title = execute_query(game_title_query, (rating.game_id,), fetch_one=True)
     return RatingResponse(
-        user_email=rating.user_email,
+        user_email=user_email,
         game_id=rating.game_id,
         game_title=game_title['Title'],
         platform_name=rating.platform_name,
@@ -95,7 +105,7 @@ def get_user_ratings(email: str):
         WHERE ugp.User_Email_Address = %s
         ORDER BY g.Title
     """
-    ratings = execute_query(query, (email,))
+    ratings = execute_query(query, (email,), sticky_key=email)
     return [
         RatingResponse(
             user_email=r['User_Email_Address'],
@@ -107,11 +117,24 @@ def get_user_ratings(email: str):
         for r in ratings
     ]
 @router.delete("/")
-def delete_rating(user_email: str, game_id: int, platform_name: str):
+def delete_rating(
+    game_id: int,
+    platform_name: str,
+    user_email: Optional[str] = None,
+    token_email: str = Depends(current_user)
+):
     """
     Delete a user rating
     SQL: DELETE FROM UserGamePlatform WHERE User_Email_Address = %s AND GameID = %s AND PlatformName = %s
+    plus a RatingEvent row in the same transaction when a rating was removed.
+    The user comes from the session token.
     """
+    if user_email and user_email != token_email:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can only delete your own ratings"
+        )
+    user_email = token_email
     delete_query = """
         DELETE FROM UserGamePlatform 
         WHERE User_Email_Address = %s 
@@ -122,8 +145,12 @@ def delete_rating(user_email: str, game_id: int, platform_name: str):
         execute_query(
             delete_query,
             (user_email, game_id, platform_name),
-            commit=True
+            commit=True,
+            sticky_key=user_email,
+            changes=[Change("UserGamePlatform", row_key(user_email, game_id, platform_name), game_id, "D")],
+            statements=rating_events(user_email, game_id, platform_name, None, "D")
         )
+        recommender.record_rating(user_email, game_id, platform_name, None)
         return {"message": "Rating deleted successfully"}
     except Exception as e:
         raise HTTPException(
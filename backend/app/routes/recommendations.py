@@ -0,0 +1,32 @@
+from fastapi import APIRouter, HTTPException, Query
+from app.recommendations import recommender
+router = APIRouter()
+def _require_index():
+    if not recommender.ready:
+        raise HTTPException(status_code=503, detail="Recommendation index is still being built, try again shortly")
+@router.get("/users/{email}")
+def get_recommendations_for_user(email: str, limit: int = Query(10, ge=1, le=50)):
+    """
+    Games you may like: unrated games scored by their similarity to the games the user rated
+    Served from the in-memory item-item similarity index, no SQL per request
+    """
+    _require_index()
+    games = recommender.recommend(email, limit)
+    return {
+        "email": email,
+        "games": games,
+        "count": len(games)
+    }
+@router.get("/games/{game_id}/similar")
+def get_similar_games(game_id: int, limit: int = Query(10, ge=1, le=50)):
+    """
+    Games most similar to a game, by co-ratings and shared attributes
+    Served from the in-memory item-item similarity index, no SQL per request
+    """
+    _require_index()
+    games = recommender.similar(game_id, limit)
+    return {
+        "game_id": game_id,
+        "games": games,
+        "count": len(games)
+    }
\ No newline at end of file
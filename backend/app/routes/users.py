@@ -1,18 +1,23 @@
 from fastapi import APIRouter, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from app.config import settings
 from app.models import UserRegister, UserResponse
+from app.changes import Change, row_key
 from app.database import execute_query
+from app.security import HashingBusy, password_hasher, needs_rehash, issue_token
 router = APIRouter()
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register_user(user: UserRegister):
+async def register_user(user: UserRegister):
     """
     Register a new user
     SQL: INSERT INTO User (EmailAddress, UserName, Birthdate, Country, Password)
+    The password is stored as an scrypt hash computed on the bounded hashing pool.
     """
     check_query = """
         SELECT EmailAddress FROM `User` 
         WHERE EmailAddress = %s OR UserName = %s
     """
-    existing = execute_query(check_query, (user.email, user.username), fetch_one=True)
+    existing = await run_in_threadpool(execute_query, check_query, (user.email, user.username), fetch_one=True, primary=True)
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -22,11 +27,15 @@ def register_user(user: UserRegister):
         INSERT INTO `User` (EmailAddress, UserName, Birthdate, Country, Password)
         VALUES (%s, %s, %s, %s, %s)
     """
+    password_hash = await _hash_or_busy(user.password)
     try:
-        execute_query(
+        await run_in_threadpool(
+            execute_query,
             insert_query,
-            (user.email, user.username, user.birthdate, user.country, user.password),
-            commit=True
+            (user.email, user.username, user.birthdate, user.country, password_hash),
+            commit=True,
+            sticky_key=user.email,
+            changes=[Change("User", row_key(user.email), operation="I")]
         )
         return UserResponse(
             email=user.email,
@@ -50,7 +59,7 @@ def get_user(email: str):
         FROM `User` 
         WHERE EmailAddress = %s
     """
-    user = execute_query(query, (email,), fetch_one=True)
+    user = execute_query(query, (email,), fetch_one=True, sticky_key=email)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -62,24 +71,56 @@ def get_user(email: str):
         birthdate=user['Birthdate'],
         country=user['Country']
     )
+async def _hash_or_busy(password):
+    try:
+        return await password_hasher.hash(password)
+    except HashingBusy as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={"Retry-After": "1"})
 @router.post("/verify-password")
-def verify_password(email: str, password: str):
+async def verify_password(email: str, password: str):
     """
     Verify user email and password
     SQL: SELECT with password verification
+    Returns a session token to send as "Authorization: Bearer <token>".
+    The hash check runs on the bounded hashing pool; legacy plaintext rows and
+    hashes with outdated cost parameters are rehashed on success.
     """
     query = """
         SELECT EmailAddress, Password, UserName
         FROM `User`
         WHERE EmailAddress = %s
     """
-    user = execute_query(query, (email,), fetch_one=True)
+    user = await run_in_threadpool(execute_query, query, (email,), fetch_one=True, sticky_key=email, cache=False)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    if user['Password'] != password:
+    try:
+        valid = await password_hasher.check(password, user['Password'])
+    except HashingBusy as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={"Retry-After": "1"})
+    if not valid:
         raise HTTPException(status_code=401, detail="Incorrect password")
+    if needs_rehash(user['Password']):
+        rehash_query = """
+            UPDATE `User` SET Password = %s
+            WHERE EmailAddress = %s AND Password = %s
+        """
+        try:
+            password_hash = await password_hasher.hash(password)
+            await run_in_threadpool(
+                execute_query,
+                rehash_query,
+                (password_hash, email, user['Password']),
+                commit=True,
+                sticky_key=email,
+                changes=[Change("User", row_key(email))]
+            )
+        except Exception as e:
+            print(f"Password rehash failed: {str(e)}")
     return {
         "email": user['EmailAddress'],
         "username": user['UserName'],
-        "message": "Authentication successful"
+        "message": "Authentication successful",
+        "token": issue_token(user['EmailAddress'], user['UserName']),
+        "token_type": "bearer",
+        "expires_in": settings.SESSION_TTL_SECONDS
     }
\ No newline at end of file
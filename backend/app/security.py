@@ -0,0 +1,252 @@
+"""
+Password hashing and session tokens.
+Passwords are stored as scrypt hashes in the form
+    scrypt$<n>$<r>$<p>$<salt>$<hash>
+and verified off the request path on a small bounded executor, so a burst of
+logins queues behind PASSWORD_HASH_WORKERS instead of occupying every
+request thread. Rows still holding a plaintext password keep working and are
+rehashed on the next successful login, or all at once with:
+    python -m app.security migrate-passwords
+A successful login returns a signed, stateless session token
+    <base64 payload>.<base64 HMAC-SHA256 signature>
+that later requests send as "Authorization: Bearer <token>"; it is checked in
+memory, without a database round trip.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+from fastapi import Header, HTTPException, status
+from app.config import settings
+SCHEME = "scrypt"
+_SALT_BYTES = 16
+_KEY_BYTES = 32
+class HashingBusy(Exception):
+    """Raised when more password hashes are queued than PASSWORD_HASH_MAX_PENDING."""
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(
+        password.encode("utf-8"),
+        salt=salt,
+        n=n,
+        r=r,
+        p=p,
+        maxmem=128 * r * (n + p + 2) + 1024 * 1024,
+        dklen=_KEY_BYTES
+    )
+def hash_password(password, n=None, r=None, p=None):
+    """Hash a password with scrypt using the configured (or given) cost parameters."""
+    n = n or settings.PASSWORD_SCRYPT_N
+    r = r or settings.PASSWORD_SCRYPT_R
+    p = p or settings.PASSWORD_SCRYPT_P
+    salt = os.urandom(_SALT_BYTES)
+    return f"{SCHEME}${n}${r}${p}${_b64encode(salt)}${_b64encode(_scrypt(password, salt, n, r, p))}"
+def is_hashed(stored):
+    return bool(stored) and stored.startswith(SCHEME + "$")
+def check_password(password, stored):
+    """
+    Check a password against a stored hash.
+    Stored values that are not hashes are legacy plaintext rows and are compared
+    in constant time.
+    """
+    if not stored:
+        return False
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8"))
+    try:
+        scheme, n, r, p, salt, expected = stored.split("$")
+        actual = _scrypt(password, _b64decode(salt), int(n), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, _b64decode(expected))
+def needs_rehash(stored):
+    """True for plaintext rows and hashes made with other cost parameters."""
+    if not is_hashed(stored):
+        return True
+    parts = stored.split("$")
+    return parts[1:4] != [str(settings.PASSWORD_SCRYPT_N), str(settings.PASSWORD_SCRYPT_R), str(settings.PASSWORD_SCRYPT_P)]
+class PasswordHasher:
+    """
+    Bounded executor for hashing work. Uses threads by default (hashlib.scrypt
+    releases the GIL) or a process pool with PASSWORD_HASH_EXECUTOR=process.
+    """
+    def __init__(self, workers, max_pending, executor_type):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor_type = executor_type
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.rejected = 0
+    def _get_executor(self):
+        if self._executor is None:
+            if self.executor_type == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+    async def run(self, func, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HashingBusy("Too many concurrent logins, try again shortly")
+            self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+    async def hash(self, password):
+        return await self.run(hash_password, password)
+    async def check(self, password, stored):
+        return await self.run(check_password, password, stored)
+    def stats(self):
+        return {
+            "executor": self.executor_type,
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected
+        }
+password_hasher = PasswordHasher(
+    settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+    executor_type=settings.PASSWORD_HASH_EXECUTOR
+)
+def _shared_session_key(path):
+    """
+    Read the session key from path, creating it with a random key first if it
+    does not exist. The file is linked into place complete, so every worker on
+    the host (and every restart) reads the same key.
+    """
+    if not os.path.exists(path):
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".session-key-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(os.urandom(32))
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+    with open(path, "rb") as f:
+        key = f.read()
+    if len(key) < 32:
+        raise RuntimeError(f"Session key file {path} is truncated; delete it or set SESSION_SECRET")
+    return key
+if settings.SESSION_SECRET:
+    _session_key = settings.SESSION_SECRET.encode("utf-8")
+elif settings.SESSION_SECRET_FILE:
+    _session_key = _shared_session_key(settings.SESSION_SECRET_FILE)
+else:
+    raise RuntimeError("Set SESSION_SECRET (or SESSION_SECRET_FILE) so that every worker accepts the same session tokens")
+def _sign(body):
+    return _b64encode(hmac.new(_session_key, body.encode("ascii"), hashlib.sha256).digest())
+def sign_payload(payload):
+    """A signed token carrying a JSON payload (give it an "exp" so read_token accepts it)."""
+    body = _b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    return f"{body}.{_sign(body)}"
+def issue_token(email, username):
+    """Create a signed session token for a user, valid for SESSION_TTL_SECONDS."""
+    return sign_payload({"sub": email, "name": username, "exp": int(time.time() + settings.SESSION_TTL_SECONDS)})
+def read_token(token):
+    """Return the payload of a valid, unexpired token, or None."""
+    body, sep, signature = (token or "").partition(".")
+    if not sep or not hmac.compare_digest(signature, _sign(body)):
+        return None
+    try:
+        payload = json.loads(_b64decode(body))
+    except ValueError:
+        return None
+    if payload.get("exp", 0) < time.time():
+        return None
+    return payload
+def current_user(authorization: Optional[str] = Header(None)):
+    """
+    FastAPI dependency: the email of the user identified by the bearer token.
+    Raises 401 when the token is missing, forged or expired, or is not a session token.
+    """
+    scheme, _, token = (authorization or "").partition(" ")
+    payload = read_token(token.strip()) if scheme.lower() == "bearer" else None
+    if payload is None or "sub" not in payload:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated. Please log in again.",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    return payload["sub"]
+def ensure_password_column():
+    """
+    Widen User.Password to VARCHAR(255) if it is too short to hold a hash (run
+    at startup, so registrations never write a truncated hash).
+    Raises RuntimeError when the column is too short and cannot be widened.
+    """
+    from app.database import execute_query
+    column = execute_query(
+        """
+            SELECT CHARACTER_MAXIMUM_LENGTH AS Length, IS_NULLABLE AS Nullable
+            FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'User' AND COLUMN_NAME = 'Password'
+        """,
+        fetch_one=True,
+        primary=True
+    )
+    if column and column['Length'] is not None and column['Length'] < 255:
+        null = "NULL" if column['Nullable'] == "YES" else "NOT NULL"
+        try:
+            execute_query(f"ALTER TABLE `User` MODIFY `Password` VARCHAR(255) {null}", commit=True)
+        except Exception as e:
+            raise RuntimeError(
+                f"User.Password is VARCHAR({column['Length']}), too short for password hashes, and could not be widened "
+                f"({str(e)}); run python -m app.security migrate-passwords as a user allowed to ALTER the table"
+            ) from e
+        print("Widened User.Password to VARCHAR(255)")
+def migrate_passwords(batch_size=500):
+    """
+    Hash every plaintext password in the User table.
+    Widens the Password column first if it is too short to hold a hash.
+    Returns the number of rows migrated.
+    """
+    from app.database import execute_query
+    ensure_password_column()
+    migrated = 0
+    while True:
+        rows = execute_query(
+            "SELECT EmailAddress, Password FROM `User` WHERE Password NOT LIKE %s LIMIT %s",
+            (SCHEME + "$%", batch_size),
+            primary=True
+        )
+        if not rows:
+            return migrated
+        for row in rows:
+            execute_query(
+                "UPDATE `User` SET Password = %s WHERE EmailAddress = %s AND Password = %s",
+                (hash_password(row['Password'] or ""), row['EmailAddress'], row['Password']),
+                commit=True
+            )
+            migrated += 1
+        print(f"{migrated} passwords hashed")
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Password storage maintenance")
+    parser.add_argument("command", choices=["migrate-passwords"])
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args(argv)
+    migrated = migrate_passwords(args.batch_size)
+    print(f"Done: {migrated} passwords migrated")
+if __name__ == "__main__":
+    main()
\ No newline at end of file
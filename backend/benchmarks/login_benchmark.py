@@ -0,0 +1,67 @@
+"""
+Login throughput benchmark.
+Fires a burst of concurrent password verifications through the bounded
+hashing pool and reports logins/second plus how responsive the event loop
+and request threadpool stay meanwhile. No database is needed.
+Usage (from the backend folder):
+    python -m benchmarks.login_benchmark --logins 200 --workers 2
+    PASSWORD_SCRYPT_N=32768 python -m benchmarks.login_benchmark
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+#app.config reads the database settings at import time; the benchmark never connects.
+for name, value in (("DB_HOST", "localhost"), ("DB_PORT", "3306"), ("DB_USER", "bench"), ("DB_PASSWORD", ""), ("DB_NAME", "bench")):
+    os.environ.setdefault(name, value)
+from fastapi.concurrency import run_in_threadpool
+from app.config import settings
+from app.security import PasswordHasher, check_password, hash_password
+async def _ticker(stop, interval, lags):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+async def _light_requests(stop, latencies):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await run_in_threadpool(sum, range(1000))
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.005)
+async def run(logins, workers, executor):
+    stored = hash_password("correct horse battery staple")
+    started = time.perf_counter()
+    check_password("correct horse battery staple", stored)
+    single = time.perf_counter() - started
+    hasher = PasswordHasher(workers, max_pending=logins, executor_type=executor)
+    await hasher.check("warm up", stored)
+    stop = asyncio.Event()
+    lags = []
+    latencies = []
+    background = [
+        asyncio.create_task(_ticker(stop, 0.01, lags)),
+        asyncio.create_task(_light_requests(stop, latencies))
+    ]
+    started = time.perf_counter()
+    results = await asyncio.gather(*(hasher.check("correct horse battery staple", stored) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await asyncio.gather(*background)
+    assert all(results)
+    print(f"scrypt n={settings.PASSWORD_SCRYPT_N} r={settings.PASSWORD_SCRYPT_R} p={settings.PASSWORD_SCRYPT_P}, {executor} pool x{workers}")
+    print(f"single verification:   {single * 1000:.1f} ms")
+    print(f"burst of {logins} logins:   {elapsed:.2f} s ({logins / elapsed:.1f} logins/s)")
+    print(f"event loop lag:        p50 {statistics.median(lags) * 1000:.2f} ms, max {max(lags) * 1000:.2f} ms")
+    if latencies:
+        latencies.sort()
+        print(f"light request latency: p50 {statistics.median(latencies) * 1000:.2f} ms, p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f} ms")
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark login throughput on the password hashing pool")
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=settings.PASSWORD_HASH_WORKERS)
+    parser.add_argument("--executor", choices=["thread", "process"], default=settings.PASSWORD_HASH_EXECUTOR)
+    args = parser.parse_args()
+    asyncio.run(run(args.logins, args.workers, args.executor))
+if __name__ == "__main__":
+    main()
\ No newline at end of file
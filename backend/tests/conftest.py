@@ -0,0 +1,8 @@
+import os
+import sys
+#app.config reads these at import time; the tests never connect to MySQL.
+for key, value in (("DB_HOST", "localhost"), ("DB_PORT", "3306"), ("DB_USER", "test"), ("DB_PASSWORD", "test"), ("DB_NAME", "faresgames_test")):
+    os.environ.setdefault(key, value)
+os.environ.setdefault("SESSION_SECRET", "test")
+os.environ["CHANGE_FEED_ENABLED"] = "false"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
\ No newline at end of file
@@ -0,0 +1,320 @@
+"""
+Round trip of the game document store: build a catalogue snapshot from a
+database, map it in a second store, and check list / search / filter /
+top-games / top-developers against the SQL the routes ran before the store.
+The database is an in-memory SQLite copy of the catalogue tables, queried
+through a stand-in for execute_query.
+"""
+import datetime
+import random
+import sqlite3
+import pytest
+from app import documents
+from app.catalogue import CatalogueColumns
+from app.documents import GameDocuments
+GENRES = ("Action", "RPG", "Puzzle")
+SETTINGS = ("Space", "Fantasy")
+PLATFORMS = ("PC", "PS2", "Switch")
+#Scores are exact in float32, so values survive the packed columns unchanged.
+CRITICS_SCORES = (None, 55.0, 70.5, 88.0, 91.25)
+PLAYERS_SCORES = (None, 3.5, 4.25)
+MOBY_SCORES = (None, 6.5, 7.25, 8.0, 9.75)
+COUNTS = (None, 0, 5, 12)
+sqlite3.register_converter("DATE", lambda value: datetime.date.fromisoformat(value.decode()))
+def _catalogue(seed=7, games=400):
+    rng = random.Random(seed)
+    db = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+    db.row_factory = lambda cursor, row: {c[0]: v for c, v in zip(cursor.description, row)}
+    db.executescript("""
+        CREATE TABLE Game (
+            GameID INTEGER PRIMARY KEY, Title TEXT, Description TEXT, CoverPhoto TEXT,
+            overallCriticsCount INTEGER, overallCriticsScore REAL, overallPlayersCount INTEGER,
+            overallPlayersScore REAL, overallMobyScore REAL
+        );
+        CREATE TABLE GameAttributes (GameID INTEGER, AttributeType TEXT, AttributeName TEXT);
+        CREATE TABLE GamePlatform (GameID INTEGER, PlatformName TEXT);
+        CREATE TABLE Company (CompanyID INTEGER PRIMARY KEY, CompanyName TEXT, Country TEXT);
+        CREATE TABLE `Release` (GameID INTEGER, DeveloperCompanyID INTEGER, PublisherCompanyID INTEGER, ReleaseDate DATE);
+    """)
+    for company_id in range(1, 41):
+        #Company names repeat, as they do in the real catalogue.
+        db.execute("INSERT INTO Company VALUES (?, ?, ?)", (company_id, f"Studio {company_id % 15}", rng.choice(("US", "JP", None))))
+    for i in range(games):
+        game_id = i * 3 + 1
+        db.execute(
+            "INSERT INTO Game VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                game_id,
+                f"{rng.choice(('Zelda', 'mario', 'Halo', 'Doom'))} {i}",
+                rng.choice((None, "A game")),
+                None,
+                rng.choice(COUNTS),
+                rng.choice(CRITICS_SCORES),
+                rng.choice(COUNTS),
+                rng.choice(PLAYERS_SCORES),
+                rng.choice(MOBY_SCORES)
+            )
+        )
+        for genre in set(rng.sample(GENRES, rng.randint(0, 2))):
+            db.execute("INSERT INTO GameAttributes VALUES (?, 'Genre', ?)", (game_id, genre))
+        if rng.random() < 0.7:
+            db.execute("INSERT INTO GameAttributes VALUES (?, 'Setting', ?)", (game_id, rng.choice(SETTINGS)))
+        db.execute("INSERT INTO GameAttributes VALUES (?, 'Perspective', '1st-person')", (game_id,))
+        for platform in set(rng.sample(PLATFORMS, rng.randint(1, 2))):
+            db.execute("INSERT INTO GamePlatform VALUES (?, ?)", (game_id, platform))
+        for _ in range(rng.randint(0, 3)):
+            db.execute(
+                "INSERT INTO `Release` VALUES (?, ?, ?, ?)",
+                (game_id, rng.randint(1, 40), rng.randint(1, 40), rng.choice((None, "1999-04-01", "2005-11-20", "2012-06-30")))
+            )
+    return db
+class Database:
+    """The SQLite catalogue, with the MySQL-style queries the store sent to it."""
+    def __init__(self, connection):
+        self.connection = connection
+        self.queries = []
+    def execute_query(self, query, params=None, fetch_one=False, **options):
+        self.queries.append(query)
+        rows = self.connection.execute(query.replace("%s", "?"), params or ()).fetchall()
+        return (rows[0] if rows else None) if fetch_one else rows
+    def execute(self, query, params=()):
+        return self.connection.execute(query, params)
+@pytest.fixture
+def database(monkeypatch):
+    db = Database(_catalogue())
+    monkeypatch.setattr(documents, "execute_query", db.execute_query)
+    return db
+@pytest.fixture
+def stores(database, tmp_path):
+    """A store that built and wrote the snapshot, and a second one that only mapped it."""
+    path = str(tmp_path / "catalogue.bin")
+    builder = GameDocuments(3600, path)
+    builder.ensure_fresh()
+    database.queries.clear()
+    mapped = GameDocuments(3600, path)
+    mapped.ensure_fresh()
+    return builder, mapped
+def _sql(db, query, params=()):
+    return db.execute(query, params).fetchall()
+def test_mapped_store_reads_the_snapshot(database, stores):
+    builder, mapped = stores
+    #Only the primary-key range queries for rows added since the snapshot; no full table scans.
+    assert database.queries
+    assert all("> %s" in query for query in database.queries)
+    assert mapped.count() == builder.count() == _sql(database, "SELECT COUNT(*) AS total FROM Game")[0]["total"]
+def test_list_and_search_match_sql(database, stores):
+    columns = ("GameID", "Title", "overallMobyScore")
+    listed = _sql(database, "SELECT GameID, Title, overallMobyScore FROM Game ORDER BY Title COLLATE NOCASE LIMIT 100")
+    assert len(listed) == 100
+    for store in stores:
+        assert store.list_games(columns, 100) == listed
+        for q in ("zel", "MARIO 1", "o 3", "nothing"):
+            found = _sql(
+                database,
+                "SELECT GameID, Title, overallMobyScore FROM Game WHERE Title LIKE ? ORDER BY Title COLLATE NOCASE LIMIT 50",
+                (f"%{q}%",)
+            )
+            assert store.search(q, columns, 50) == found
+FILTERS = (
+    {},
+    {"genre": "RPG"},
+    {"platform": "PS2"},
+    {"developer": "Studio 3"},
+    {"publisher": "Studio 4", "year": 2005},
+    {"genre": "Action", "platform": "PC", "year": 1999},
+    {"developer": "Studio 1", "publisher": "Studio 2"},
+    {"genre": "Strategy"}
+)
+SORT_COLUMNS = {
+    "moby_score": ("overallMobyScore", "DESC"),
+    "title": ("Title", "ASC"),
+    "critics_score": ("overallCriticsScore", "DESC"),
+    "players_score": ("overallPlayersScore", "DESC")
+}
+def _filter_sql(db, sort_by, genre=None, platform=None, publisher=None, developer=None, year=None):
+    column, direction = SORT_COLUMNS[sort_by]
+    joins = []
+    conditions = []
+    params = []
+    if genre:
+        joins.append("JOIN GameAttributes ga ON g.GameID = ga.GameID")
+        conditions.append("ga.AttributeType = 'Genre' AND ga.AttributeName = ?")
+        params.append(genre)
+    if platform:
+        joins.append("JOIN GamePlatform gp ON g.GameID = gp.GameID")
+        conditions.append("gp.PlatformName = ?")
+        params.append(platform)
+    if publisher or developer or year:
+        joins.append("JOIN `Release` r ON g.GameID = r.GameID")
+    if publisher or developer:
+        joins.append("JOIN Company dc ON r.DeveloperCompanyID = dc.CompanyID JOIN Company pc ON r.PublisherCompanyID = pc.CompanyID")
+        if developer:
+            conditions.append("dc.CompanyName = ?")
+            params.append(developer)
+        if publisher:
+            conditions.append("pc.CompanyName = ?")
+            params.append(publisher)
+    if year:
+        conditions.append("CAST(strftime('%Y', r.ReleaseDate) AS INTEGER) = ?")
+        params.append(year)
+    query = f"SELECT DISTINCT g.GameID, g.{column} FROM Game g {' '.join(joins)}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return _sql(db, query + f" ORDER BY g.{column} {'COLLATE NOCASE ' if column == 'Title' else ''}{direction}", tuple(params))
+@pytest.mark.parametrize("sort_by", sorted(SORT_COLUMNS))
+@pytest.mark.parametrize("criteria", FILTERS)
+def test_filter_matches_sql(database, stores, sort_by, criteria):
+    column = SORT_COLUMNS[sort_by][0]
+    expected = _filter_sql(database, sort_by, **criteria)
+    for store in stores:
+        games = store.filter(("GameID", column), sort_by, **criteria)
+        #Ties may come back in any order, as they may from MySQL.
+        assert sorted(game["GameID"] for game in games) == sorted(row["GameID"] for row in expected)
+        assert [game[column] for game in games] == [row[column] for row in expected]
+@pytest.mark.parametrize("criteria", ({}, {"genre": "RPG"}, {"year": 2012}, {"genre": "Puzzle", "year": 1999}))
+def test_top_games_match_sql(database, stores, criteria):
+    joins = []
+    conditions = ["g.overallCriticsScore IS NOT NULL"]
+    params = []
+    if "genre" in criteria:
+        joins.append("JOIN GameAttributes ga ON g.GameID = ga.GameID")
+        conditions.append("ga.AttributeType = 'Genre' AND ga.AttributeName = ?")
+        params.append(criteria["genre"])
+    if "year" in criteria:
+        joins.append("JOIN `Release` r ON g.GameID = r.GameID")
+        conditions.append("CAST(strftime('%Y', r.ReleaseDate) AS INTEGER) = ?")
+        params.append(criteria["year"])
+    expected = _sql(
+        database,
+        f"""
+        SELECT DISTINCT g.GameID, g.overallCriticsScore, g.overallCriticsCount FROM Game g {' '.join(joins)}
+        WHERE {' AND '.join(conditions)}
+        ORDER BY g.overallCriticsScore DESC, g.overallCriticsCount DESC
+        """,
+        tuple(params)
+    )
+    columns = ("GameID", "overallCriticsScore", "overallCriticsCount")
+    for store in stores:
+        games = store.top("overallCriticsScore", "overallCriticsCount", columns, 1000, **criteria)
+        assert sorted(game["GameID"] for game in games) == sorted(row["GameID"] for row in expected)
+        assert [(g["overallCriticsScore"], g["overallCriticsCount"]) for g in games] == [
+            (row["overallCriticsScore"], row["overallCriticsCount"]) for row in expected
+        ]
+@pytest.mark.parametrize("criteria", ({"genre": "Action"}, {"setting": "Space"}, {"genre": "RPG", "setting": "Fantasy"}))
+def test_top_games_by_moby_match_sql(database, stores, criteria):
+    joins = []
+    conditions = ["g.overallMobyScore IS NOT NULL"]
+    params = []
+    for attribute_type, name in (("Genre", criteria.get("genre")), ("Setting", criteria.get("setting"))):
+        if name:
+            alias = f"ga_{attribute_type.lower()}"
+            joins.append(f"JOIN GameAttributes {alias} ON g.GameID = {alias}.GameID")
+            conditions.append(f"{alias}.AttributeType = '{attribute_type}' AND {alias}.AttributeName = ?")
+            params.append(name)
+    expected = _sql(
+        database,
+        f"SELECT DISTINCT g.GameID, g.overallMobyScore FROM Game g {' '.join(joins)} WHERE {' AND '.join(conditions)} ORDER BY g.overallMobyScore DESC",
+        tuple(params)
+    )
+    for store in stores:
+        games = store.top("overallMobyScore", None, ("GameID", "overallMobyScore"), 1000, **criteria)
+        assert sorted(game["GameID"] for game in games) == sorted(row["GameID"] for row in expected)
+        assert [game["overallMobyScore"] for game in games] == [row["overallMobyScore"] for row in expected]
+def _top_developers_sql(database, genre):
+    genre_join = "JOIN GameAttributes ga ON g.GameID = ga.GameID AND ga.AttributeType = 'Genre' AND ga.AttributeName = ?" if genre else ""
+    return _sql(
+        database,
+        f"""
+        SELECT c.CompanyName, c.Country,
+            SUM(g.overallCriticsScore * g.overallCriticsCount) * 1.0 / SUM(g.overallCriticsCount) AS AvgCriticsScore,
+            COUNT(DISTINCT g.GameID) AS GameCount
+        FROM Game g
+        {genre_join}
+        JOIN (SELECT DISTINCT GameID, DeveloperCompanyID FROM `Release`) r ON g.GameID = r.GameID
+        JOIN Company c ON r.DeveloperCompanyID = c.CompanyID
+        GROUP BY c.CompanyName, c.Country
+        ORDER BY AvgCriticsScore DESC, GameCount DESC
+        LIMIT 20
+        """,
+        (genre,) if genre else ()
+    )
+def _assert_ranking(developers, expected):
+    assert [(d["AvgCriticsScore"], d["GameCount"]) for d in developers] == [
+        (None if row["AvgCriticsScore"] is None else round(row["AvgCriticsScore"], 4), row["GameCount"]) for row in expected
+    ]
+    assert {(d["CompanyName"], d["Country"]) for d in developers} == {(row["CompanyName"], row["Country"]) for row in expected}
+@pytest.mark.parametrize("genre", (None, "RPG", "Puzzle", "Strategy"))
+def test_top_developers_match_sql(database, stores, genre):
+    expected = _top_developers_sql(database, genre)
+    for store in stores:
+        _assert_ranking(store.top_developers(genre, 20), expected)
+def test_top_developers_follow_overlay_edits(database, stores):
+    #Lift a lowly ranked developer's game to the top; the snapshot ranking no longer holds.
+    game_id = _sql(database, "SELECT r.GameID FROM `Release` r JOIN Game g ON g.GameID = r.GameID ORDER BY g.overallCriticsScore LIMIT 1")[0]["GameID"]
+    database.execute("UPDATE Game SET overallCriticsScore = 99.5, overallCriticsCount = 500 WHERE GameID = ?", (game_id,))
+    for store in stores:
+        store.reload_games([game_id])
+        for genre in (None, "RPG"):
+            _assert_ranking(store.top_developers(genre, 20), _top_developers_sql(database, genre))
+def test_corrupted_snapshot_is_rejected(stores, tmp_path):
+    path = stores[1].shared_path
+    CatalogueColumns.map(path)
+    data = bytearray(open(path, "rb").read())
+    data[len(data) // 2] ^= 0xFF
+    corrupted = tmp_path / "corrupted.bin"
+    corrupted.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="checksum"):
+        CatalogueColumns.map(str(corrupted))
+    truncated = tmp_path / "truncated.bin"
+    truncated.write_bytes(bytes(data[:len(data) // 3]))
+    with pytest.raises(ValueError):
+        CatalogueColumns.map(str(truncated))
+def test_rebuild_replaces_a_corrupted_snapshot(database, stores):
+    path = stores[1].shared_path
+    data = bytearray(open(path, "rb").read())
+    data[len(data) // 2] ^= 0xFF
+    with open(path, "wb") as f:
+        f.write(data)
+    database.queries.clear()
+    store = GameDocuments(3600, path)
+    store.ensure_fresh()
+    #The damaged file is ignored: the store is rebuilt from the database and the snapshot rewritten.
+    assert any(query.startswith("SELECT GameID, Title") and "WHERE" not in query for query in database.queries)
+    assert store.count() == stores[0].count()
+    CatalogueColumns.map(path)
+@pytest.fixture
+def change_log(database, monkeypatch):
+    """A ChangeLog in the catalogue database, with the change feed switched on for the store."""
+    database.execute("CREATE TABLE ChangeLog (ChangeID INTEGER PRIMARY KEY, TableName TEXT, GameID INTEGER)")
+    monkeypatch.setattr(documents.settings, "CHANGE_FEED_ENABLED", True)
+    monkeypatch.setattr(documents, "ensure_change_log", lambda: None)
+    monkeypatch.setattr(documents, "latest_change_id", lambda: database.execute("SELECT COALESCE(MAX(ChangeID), 0) AS ChangeID FROM ChangeLog").fetchone()["ChangeID"])
+    return database
+def _edit_title(database, change_id):
+    game_id = _sql(database, "SELECT MIN(GameID) AS GameID FROM Game")[0]["GameID"]
+    database.execute("UPDATE Game SET Title = 'Renamed' WHERE GameID = ?", (game_id,))
+    database.execute("INSERT INTO ChangeLog VALUES (?, 'game', ?)", (change_id, game_id))
+    return game_id
+def test_mapping_an_older_snapshot_replays_the_change_log(change_log, tmp_path):
+    path = str(tmp_path / "catalogue.bin")
+    change_log.execute("INSERT INTO ChangeLog VALUES (1, 'game', 1)")
+    builder = GameDocuments(3600, path)
+    builder.ensure_fresh()
+    worker = GameDocuments(3600, path)
+    worker.ensure_fresh()
+    game_id = _edit_title(change_log, 2)
+    worker.reload_games([game_id])
+    #A rebuild maps the snapshot written before the edit; the edit must survive it.
+    worker.build()
+    assert worker.change_id == 1
+    assert [game["GameID"] for game in worker.search("renamed", ("GameID",), 10)] == [game_id]
+def test_snapshot_behind_a_pruned_log_is_rebuilt(change_log, tmp_path):
+    path = str(tmp_path / "catalogue.bin")
+    change_log.execute("INSERT INTO ChangeLog VALUES (1, 'game', 1)")
+    GameDocuments(3600, path).ensure_fresh()
+    change_log.execute("DELETE FROM ChangeLog")
+    game_id = _edit_title(change_log, 5)
+    worker = GameDocuments(3600, path)
+    worker.ensure_fresh()
+    assert worker.change_id == 5
+    assert [game["GameID"] for game in worker.search("renamed", ("GameID",), 10)] == [game_id]
\ No newline at end of file
@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { addRating, verifyPassword, getPlatforms, getGamesList, getGamePlatforms } from '../services/api';
+import { addRating, verifyPassword, batchGet, getGamePlatforms } from '../services/api';
 function AddRating() {
   const [credentials, setCredentials] = useState({
     email: '',
@@ -30,9 +30,9 @@ function AddRating() {
   const fetchMetadata = async () => {
     setMetadataLoading(true);
     try {
-      const [platformsData, gamesData] = await Promise.all([
-        getPlatforms(),
-        getGamesList()
+      const [platformsData, gamesData] = await batchGet([
+        { path: '/metadata/platforms' },
+        { path: '/metadata/games' }
       ]);
       setAllPlatforms(platformsData.platforms || []);
       setAvailablePlatforms(platformsData.platforms || []); 
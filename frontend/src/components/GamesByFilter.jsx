@@ -1,11 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { 
   getGamesByFilter, 
-  getGenres, 
-  getPlatforms, 
-  getDevelopers, 
-  getPublishers,
-  getReleaseYears 
+  batchGet
 } from '../services/api';
 function GamesByFilter() {
   const [filters, setFilters] = useState({
@@ -32,12 +28,12 @@ function GamesByFilter() {
   const fetchAllMetadata = async () => {
     setMetadataLoading(true);
     try {
-      const [genresData, platformsData, developersData, publishersData, yearsData] = await Promise.all([
-        getGenres(),
-        getPlatforms(),
-        getDevelopers(),
-        getPublishers(),
-        getReleaseYears()
+      const [genresData, platformsData, developersData, publishersData, yearsData] = await batchGet([
+        { path: '/metadata/genres' },
+        { path: '/metadata/platforms' },
+        { path: '/metadata/developers' },
+        { path: '/metadata/publishers' },
+        { path: '/metadata/years' }
       ]);
       setGenres(genresData.genres || []);
       setPlatforms(platformsData.platforms || []);
@@ -12,8 +12,8 @@ function Home() {
     const fetchData = async () => {
       try {
         const health = await healthCheck();
-        setStats(health);
         const gamesData = await getAllGames(6, 0);
+        setStats({ ...health, games_count: gamesData.total });
         setFeaturedGames(gamesData.games || []);
         setLoading(false);
       } catch (error) {
@@ -94,8 +94,8 @@ function TopCollaborations() {
                       </span>
                     </td>
                     <td style={{ maxWidth: '300px', fontSize: '0.9rem', color: '#666' }}>
-                      {collab.Games ? collab.Games.split(', ').slice(0, 2).join(', ') : 'N/A'}
-                      {collab.Games && collab.Games.split(', ').length > 2 && '...'}
+                      {collab.Games && collab.Games.length > 0 ? collab.Games.slice(0, 2).join(', ') : 'N/A'}
+                      {collab.GamesTotal > 2 && '...'}
                     </td>
                   </tr>
                 ))}
@@ -92,8 +92,8 @@ function TopDirectors() {
                       </span>
                     </td>
                     <td style={{ maxWidth: '400px', fontSize: '0.9rem', color: '#666' }}>
-                      {director.Games ? director.Games.split(', ').slice(0, 3).join(', ') : 'N/A'}
-                      {director.Games && director.Games.split(', ').length > 3 && '...'}
+                      {director.Games && director.Games.length > 0 ? director.Games.slice(0, 3).join(', ') : 'N/A'}
+                      {director.GamesTotal > 3 && '...'}
                     </td>
                   </tr>
                 ))}
@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { getTopGames, getGenres, getReleaseYears } from '../services/api';
+import { getTopGames, batchGet } from '../services/api';
 function TopGames() {
   const [filters, setFilters] = useState({
     genre: '',
@@ -19,9 +19,9 @@ function TopGames() {
   }, []);
   const fetchMetadata = async () => {
     try {
-      const [genresData, yearsData] = await Promise.all([
-        getGenres(),
-        getReleaseYears()
+      const [genresData, yearsData] = await batchGet([
+        { path: '/metadata/genres' },
+        { path: '/metadata/years' }
       ]);
       setGenres(genresData.genres || []);
       setYears(yearsData.years || []);
@@ -13,6 +13,24 @@ const api = axios.create({
     'Content-Type': 'application/json',
   },
 });
+api.interceptors.request.use((config) => {
+  const token = sessionStorage.getItem('sessionToken');
+  if (token) {
+    config.headers.Authorization = `Bearer ${token}`;
+  }
+  const readYourWrites = sessionStorage.getItem('readYourWrites');
+  if (readYourWrites) {
+    config.headers['X-Read-Your-Writes'] = readYourWrites;
+  }
+  return config;
+});
+api.interceptors.response.use((response) => {
+  const readYourWrites = response.headers['x-read-your-writes'];
+  if (readYourWrites) {
+    sessionStorage.setItem('readYourWrites', readYourWrites);
+  }
+  return response;
+});
 export const registerUser = async (userData) => {
   const response = await api.post('/users/register', userData);
   return response.data;
@@ -25,6 +43,9 @@ export const verifyPassword = async (email, password) => {
   const response = await api.post('/users/verify-password', null, {
     params: { email, password }
   });
+  if (response.data.token) {
+    sessionStorage.setItem('sessionToken', response.data.token);
+  }
   return response.data;
 };
 export const getAllGames = async (limit = 252, offset = 0) => {
@@ -123,4 +144,17 @@ export const getGamePlatforms = async (gameId) => {
   const response = await api.get(`/games/${gameId}/platforms`);
   return response.data;
 };
+export const batchGet = async (requests) => {
+  const response = await api.post('/batch/', {
+    requests: requests.map(({ path, params }) => ({ path, params: params || {} })),
+  });
+  return response.data.responses.map((result, index) => {
+    if (result.status >= 400) {
+      const error = new Error(`Request to ${requests[index].path} failed with status ${result.status}`);
+      error.response = { status: result.status, data: result.body };
+      throw error;
+    }
+    return result.body;
+  });
+};
 export default api;
\ No newline at end of file